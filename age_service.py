@@ -0,0 +1,89 @@
+"""حساب الأعمار والفئات العمرية مع ذاكرة مؤقتة وساعة قابلة للحقن"""
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+
+def fixed_clock(day):
+    """ساعة ثابتة لتقرير قابل لإعادة الإنتاج: جميع الحسابات بنفس تاريخ المرجع"""
+    return lambda: day
+
+
+class AgeService:
+    """العمر (سنة، شهر، يوم) والفئة العمرية مخزنة حسب (تاريخ الميلاد، تاريخ المرجع)"""
+
+    def __init__(self, age_thresholds, oldest_category, clock=None, cache_size=65536):
+        self.age_thresholds = age_thresholds
+        self.oldest_category = oldest_category
+        # حدود الفئات مرتبة للبحث الثنائي: الفئة رقم i لما قبل الحد رقم i، والأخيرة لما بعد آخر حد
+        self.limits = [limit for limit, category in age_thresholds]
+        self.category_list = [category for limit, category in age_thresholds] + [oldest_category]
+        self.clock = clock or date.today
+        # ذاكرة لكل نسخة حتى لا تختلط جداول الفئات المختلفة
+        self.cached_exact_age = lru_cache(maxsize=cache_size)(self.compute_exact_age)
+        self.cached_category = lru_cache(maxsize=cache_size)(self.compute_category)
+
+    def today(self):
+        """تاريخ المرجع الحالي من الساعة المحقونة"""
+        today = self.clock()
+        return today.date() if isinstance(today, datetime) else today
+
+    def exact_age(self, birth_date, today=None):
+        """حساب العمر بالضبط (سنة، شهر، يوم)؛ birth_date نص أو date"""
+        return self.cached_exact_age(birth_date, reference_date(today) or self.today())
+
+    def age_category(self, birth_date, today=None):
+        """الفئة العمرية لتاريخ ميلاد"""
+        return self.cached_category(birth_date, reference_date(today) or self.today())
+
+    def categories(self, birth_dates, today=None):
+        """الفئات العمرية لقائمة تواريخ ميلاد بتاريخ مرجع واحد"""
+        today = reference_date(today) or self.today()
+        category = self.cached_category
+        return [category(birth_date, today) for birth_date in birth_dates]
+
+    def total_months(self, birth_date, today=None):
+        """العمر بالأشهر الكاملة"""
+        years, months, days = self.exact_age(birth_date, today)
+        return years * 12 + months
+
+    def category_for_months(self, total_months):
+        """الفئة العمرية لعدد أشهر معين"""
+        return self.category_list[bisect_right(self.limits, total_months)]
+
+    def compute_category(self, birth_date, today):
+        years, months, days = self.cached_exact_age(birth_date, today)
+        return self.category_for_months(years * 12 + months)
+
+    def compute_exact_age(self, birth_date, today):
+        try:
+            birth = birth_date if isinstance(birth_date, date) else datetime.strptime(birth_date, "%Y-%m-%d").date()
+        except (ValueError, TypeError):
+            return 0, 0, 0
+
+        # حساب الفرق
+        years = today.year - birth.year
+        months = today.month - birth.month
+        days = today.day - birth.day
+
+        # تعديل إذا كانت الأيام سالبة
+        if days < 0:
+            months -= 1
+            # حساب أيام الشهر السابق (اليوم الأخير قبل بداية الشهر الحالي)
+            days_in_prev_month = (date(today.year, today.month, 1) - timedelta(days=1)).day
+            # يوم الميلاد بعد نهاية الشهر السابق (31 يناير ← فبراير) يُحسب من آخر يوم فيه
+            days = days_in_prev_month - min(birth.day, days_in_prev_month) + today.day
+
+        # تعديل إذا كانت الأشهر سالبة
+        if months < 0:
+            years -= 1
+            months += 12
+
+        return years, months, days
+
+
+def reference_date(value):
+    """توحيد تاريخ المرجع إلى date (أو None)"""
+    if isinstance(value, datetime):
+        return value.date()
+    return value
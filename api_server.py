@@ -0,0 +1,319 @@
+"""خادم HTTP محلي يعرض السجل وقواعد التطعيم لتطبيقات أخرى (asyncio بدون مكتبات خارجية)
+
+المسارات:
+    GET    /children?national_id=...|passport=...|family_paper=...|registration_no=...|mother_name=...|name=...
+    GET    /children/{child_id}
+    GET    /children/{child_id}/vaccinations
+    POST   /children/{child_id}/vaccinations        {"date", "vaccine_code", "dose", "notes", "age_category"}
+    DELETE /children/{child_id}/vaccinations/{position}
+    GET    /children/{child_id}/due[?date=YYYY-MM-DD]
+"""
+import asyncio
+import json
+import queue
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from rules import parse_date
+from schedules import ScheduleError
+from search_index import NameIndex
+from storage import ConflictError, StorageError
+
+# معاملات البحث ← الحقول المفهرسة في المخزن
+LOOKUP_FIELDS = {
+    "national_id": "entry_national_id",
+    "passport": "entry_passport",
+    "family_paper": "entry_family_paper",
+    "registration_no": "entry_registration_no",
+    "mother_name": "entry_mother_name",
+    "birth_date": "birth_date",
+}
+
+STATUS_TEXT = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+MAX_BODY = 64 * 1024
+# فحص ملفات جدول التطعيمات أثناء تشغيل الخادم (بالثواني)
+SCHEDULE_POLL_SECONDS = 60
+# فحص تغيرات السجل من المحطات الأخرى لإعادة بناء فهرس الأسماء (بالثواني)
+NAME_INDEX_POLL_SECONDS = 60
+
+
+class HTTPError(Exception):
+    """خطأ يُعاد للعميل برمز HTTP ورسالة"""
+
+    def __init__(self, status, message):
+        self.status = status
+        super().__init__(message)
+
+
+class StorePool:
+    """مجموعة اتصالات بالمخزن تُستعار لكل طلب وتُنفذ عملياتها في خيوط منفصلة
+
+    مع SQLite لكل خيط اتصال خاص (قراءات متوازية بفضل WAL)، ومع مخزن JSON
+    يكفي مخزن واحد في الذاكرة محمي بقفله.
+    """
+
+    def __init__(self, stores):
+        self.stores = stores
+        self.idle = queue.Queue()
+        for store in stores:
+            self.idle.put(store)
+        self.executor = ThreadPoolExecutor(max_workers=len(stores), thread_name_prefix="store")
+
+    def call(self, fn, *args):
+        store = self.idle.get()
+        try:
+            return fn(store, *args)
+        finally:
+            self.idle.put(store)
+
+    async def run(self, fn, *args):
+        """تنفيذ fn(store, *args) دون إيقاف حلقة asyncio"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.call, fn, *args)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for store in {id(store): store for store in self.stores}.values():
+            store.close()
+
+
+class ApiServer:
+    """خادم HTTP/1.1 بسيط مع keep-alive يوجه الطلبات إلى دوال المسارات"""
+
+    def __init__(self, pool, rules):
+        self.pool = pool
+        self.rules = rules
+        self.name_index = NameIndex()
+        self.name_stamp = None
+        self.routes = [
+            ("GET", re.compile(r"^/children$"), self.lookup),
+            ("GET", re.compile(r"^/children/(?P<child_id>[^/]+)$"), self.get_child),
+            ("GET", re.compile(r"^/children/(?P<child_id>[^/]+)/vaccinations$"), self.history),
+            ("POST", re.compile(r"^/children/(?P<child_id>[^/]+)/vaccinations$"), self.add_dose),
+            ("DELETE", re.compile(r"^/children/(?P<child_id>[^/]+)/vaccinations/(?P<position>\d+)$"),
+             self.delete_dose),
+            ("GET", re.compile(r"^/children/(?P<child_id>[^/]+)/due$"), self.due),
+        ]
+
+    async def start(self, host, port):
+        """بناء فهرس الأسماء ثم بدء الاستماع"""
+        await self.refresh_names()
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def refresh_names(self):
+        """إعادة بناء فهرس الأسماء إن تغير السجل (إضافات الواجهة والمحطات الأخرى والمزامنة)"""
+        stamp = await self.pool.run(lambda store: store.change_stamp())
+        if stamp == self.name_stamp:
+            return
+
+        def build(store):
+            index = NameIndex()
+            index.build(store.iter_children())
+            return index
+
+        # الفهرس الجديد يُبنى في خيط المخزن ويحل محل القديم دفعة واحدة
+        self.name_index = await self.pool.run(build)
+        self.name_stamp = stamp
+
+    async def watch_names(self):
+        while True:
+            await asyncio.sleep(NAME_INDEX_POLL_SECONDS)
+            try:
+                await self.refresh_names()
+            except StorageError as e:
+                print(f"تعذر تحديث فهرس الأسماء: {e}")
+
+    # ---------------- بروتوكول HTTP ----------------
+
+    async def handle_connection(self, reader, writer):
+        """قراءة الطلبات المتتالية على نفس الاتصال"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                # بعض العملاء يرسلون العربية في الرابط دون ترميز %
+                lines = head.decode("utf-8", errors="replace").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "طلب غير صالح"}, keep_alive=False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {"error": "حجم الطلب كبير"}, keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version == "HTTP/1.1")
+                status, payload = await self.dispatch(method, target, body)
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+        )
+        await writer.drain()
+
+    async def dispatch(self, method, target, body):
+        """توجيه الطلب إلى المسار المناسب وتحويل الأخطاء إلى ردود JSON"""
+        url = urlsplit(target)
+        path = unquote(url.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            try:
+                payload = json.loads(body.decode("utf-8")) if body else {}
+                if not isinstance(payload, dict):
+                    raise HTTPError(400, "محتوى الطلب يجب أن يكون كائن JSON")
+                return await handler(query=query, payload=payload, **match.groupdict())
+            except HTTPError as e:
+                return e.status, {"error": str(e)}
+            except ConflictError as e:
+                return 409, {"error": str(e), "fields": e.fields}
+            except (ValueError, StorageError) as e:
+                return 400, {"error": str(e)}
+            except Exception as e:  # خطأ غير متوقع: لا نوقف الخادم
+                return 500, {"error": str(e)}
+        if allowed:
+            return 405, {"error": "الطريقة غير مسموحة"}
+        return 404, {"error": "المسار غير موجود"}
+
+    # ---------------- المسارات ----------------
+
+    async def load_child(self, child_id):
+        child = await self.pool.run(lambda store: store.get(child_id))
+        if child is None:
+            raise HTTPError(404, "الطفل غير موجود")
+        return child
+
+    async def lookup(self, query, payload):
+        """البحث عن طفل برقم وثيقة أو بالاسم"""
+        if query.get("name"):
+            matches = self.name_index.search(query["name"], limit=int(query.get("limit", 20)))
+            children = await self.pool.run(lambda store: [store.get(child_id) for child_id, score in matches])
+            return 200, {"children": [child for child in children if child is not None]}
+        for param, field in LOOKUP_FIELDS.items():
+            value = query.get(param)
+            if value:
+                if field == "entry_passport":
+                    value = value.upper()
+                children = await self.pool.run(lambda store: store.find(field, value))
+                return 200, {"children": children}
+        raise HTTPError(400, "يرجى تحديد معيار البحث")
+
+    async def get_child(self, query, payload, child_id):
+        return 200, await self.load_child(child_id)
+
+    async def history(self, query, payload, child_id):
+        """سجل التطعيمات بترتيب إدخاله"""
+        child = await self.load_child(child_id)
+        return 200, {"child_id": child_id, "vaccinations": child.get("vaccinations", [])}
+
+    async def add_dose(self, query, payload, child_id):
+        """إضافة جرعة بعد التحقق من الفترة بين الجرعات والقيود"""
+        code = payload.get("vaccine_code")
+        dose_date = payload.get("date") or self.rules.ages.today().isoformat()
+        given_on = parse_date(dose_date)
+        # قواعد إصدار الجدول الساري في تاريخ الجرعة
+        rules = self.rules.for_date(given_on)
+        rule = rules.vaccines.get(code)
+        if rule is None:
+            raise HTTPError(400, f"تطعيم غير معروف: {code}")
+        dose = payload.get("dose")
+        if dose not in rule.dose_index:
+            raise HTTPError(400, f"جرعة غير صالحة للتطعيم {code}: {dose}")
+
+        child = await self.load_child(child_id)
+        vaccinations = child.get("vaccinations", [])
+        can_combine, message = rules.check_vaccine_restrictions(code, rules.get_existing_vaccines(vaccinations))
+        if can_combine and not payload.get("force"):
+            can_combine, message = rules.check_vaccine_interval(
+                code, dose, rules.get_last_vaccination_date(vaccinations, code), given_on)
+        if not can_combine:
+            raise HTTPError(409, message)
+
+        row = [dose_date, f"{code} - {rule.name}", dose, payload.get("notes", ""), "مكتمل",
+               payload.get("age_category") or child.get("age_category", "")]
+        updated = dict(child, vaccinations=vaccinations + [row])
+        saved = await self.pool.run(lambda store: store.save(updated, child))
+        return 201, {"child_id": child_id, "version": saved["version"], "vaccinations": saved["vaccinations"]}
+
+    async def delete_dose(self, query, payload, child_id, position):
+        """حذف جرعة حسب موقعها في سجل التطعيمات"""
+        child = await self.load_child(child_id)
+        vaccinations = list(child.get("vaccinations", []))
+        position = int(position)
+        if position >= len(vaccinations):
+            raise HTTPError(404, "الجرعة غير موجودة")
+        del vaccinations[position]
+        saved = await self.pool.run(lambda store: store.save(dict(child, vaccinations=vaccinations), child))
+        return 200, {"child_id": child_id, "version": saved["version"], "vaccinations": saved["vaccinations"]}
+
+    async def due(self, query, payload, child_id):
+        """التطعيمات المستحقة حسب العمر والجرعات السابقة"""
+        today = parse_date(query["date"]) if query.get("date") else None
+        child = await self.load_child(child_id)
+        due = self.rules.due_vaccines(child.get("birth_date"), child.get("vaccinations", []), today)
+        return 200, {"child_id": child_id, "due": due}
+
+
+def serve(open_store, rules, host="127.0.0.1", port=8765, pool_size=4):
+    """تشغيل الخادم حتى الإيقاف بـ Ctrl+C"""
+    pool = StorePool([open_store() for _ in range(pool_size)])
+    server = ApiServer(pool, rules)
+
+    async def watch_schedules():
+        # الطلبات الجارية تكمل بالإصدارات السابقة والجديدة تستخدم ما أُعيد تحميله
+        while True:
+            await asyncio.sleep(SCHEDULE_POLL_SECONDS)
+            try:
+                if rules.reload_if_changed():
+                    print(f"تم تحميل جدول التطعيمات (الإصدار {rules.version})")
+            except ScheduleError as e:
+                print(f"جدول التطعيمات غير صالح، يستمر العمل بالإصدار السابق: {e}")
+
+    async def main():
+        listener = await server.start(host, port)
+        print(f"الخادم يعمل على http://{host}:{port}")
+        # مهام الخلفية تُلغى عند إيقاف الخادم
+        tasks = {asyncio.create_task(server.watch_names())}
+        if hasattr(rules, "reload_if_changed"):
+            tasks.add(asyncio.create_task(watch_schedules()))
+        try:
+            async with listener:
+                await listener.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
@@ -0,0 +1,139 @@
+"""تشكيل الحروف العربية (أشكال العرض) وترتيبها المرئي من اليمين لليسار للطباعة"""
+import unicodedata
+
+# الحرف ← (منفصل، نهائي، ابتدائي، وسطي)؛ None للحروف التي لا تتصل بما بعدها
+FORMS = {
+    0x0621: (0xFE80, None, None, None),
+    0x0622: (0xFE81, 0xFE82, None, None),
+    0x0623: (0xFE83, 0xFE84, None, None),
+    0x0624: (0xFE85, 0xFE86, None, None),
+    0x0625: (0xFE87, 0xFE88, None, None),
+    0x0626: (0xFE89, 0xFE8A, 0xFE8B, 0xFE8C),
+    0x0627: (0xFE8D, 0xFE8E, None, None),
+    0x0628: (0xFE8F, 0xFE90, 0xFE91, 0xFE92),
+    0x0629: (0xFE93, 0xFE94, None, None),
+    0x062A: (0xFE95, 0xFE96, 0xFE97, 0xFE98),
+    0x062B: (0xFE99, 0xFE9A, 0xFE9B, 0xFE9C),
+    0x062C: (0xFE9D, 0xFE9E, 0xFE9F, 0xFEA0),
+    0x062D: (0xFEA1, 0xFEA2, 0xFEA3, 0xFEA4),
+    0x062E: (0xFEA5, 0xFEA6, 0xFEA7, 0xFEA8),
+    0x062F: (0xFEA9, 0xFEAA, None, None),
+    0x0630: (0xFEAB, 0xFEAC, None, None),
+    0x0631: (0xFEAD, 0xFEAE, None, None),
+    0x0632: (0xFEAF, 0xFEB0, None, None),
+    0x0633: (0xFEB1, 0xFEB2, 0xFEB3, 0xFEB4),
+    0x0634: (0xFEB5, 0xFEB6, 0xFEB7, 0xFEB8),
+    0x0635: (0xFEB9, 0xFEBA, 0xFEBB, 0xFEBC),
+    0x0636: (0xFEBD, 0xFEBE, 0xFEBF, 0xFEC0),
+    0x0637: (0xFEC1, 0xFEC2, 0xFEC3, 0xFEC4),
+    0x0638: (0xFEC5, 0xFEC6, 0xFEC7, 0xFEC8),
+    0x0639: (0xFEC9, 0xFECA, 0xFECB, 0xFECC),
+    0x063A: (0xFECD, 0xFECE, 0xFECF, 0xFED0),
+    0x0641: (0xFED1, 0xFED2, 0xFED3, 0xFED4),
+    0x0642: (0xFED5, 0xFED6, 0xFED7, 0xFED8),
+    0x0643: (0xFED9, 0xFEDA, 0xFEDB, 0xFEDC),
+    0x0644: (0xFEDD, 0xFEDE, 0xFEDF, 0xFEE0),
+    0x0645: (0xFEE1, 0xFEE2, 0xFEE3, 0xFEE4),
+    0x0646: (0xFEE5, 0xFEE6, 0xFEE7, 0xFEE8),
+    0x0647: (0xFEE9, 0xFEEA, 0xFEEB, 0xFEEC),
+    0x0648: (0xFEED, 0xFEEE, None, None),
+    0x0649: (0xFEEF, 0xFEF0, None, None),
+    0x064A: (0xFEF1, 0xFEF2, 0xFEF3, 0xFEF4),
+}
+
+# لام + ألف ← (منفصل، نهائي)
+LAM_ALEF = {0x0622: (0xFEF5, 0xFEF6), 0x0623: (0xFEF7, 0xFEF8), 0x0625: (0xFEF9, 0xFEFA), 0x0627: (0xFEFB, 0xFEFC)}
+LAM = 0x0644
+TATWEEL = 0x0640
+
+MIRRORED = str.maketrans("()[]{}<>", ")(][}{><")
+
+
+def is_transparent(code):
+    """علامات التشكيل لا تقطع الاتصال بين الحروف"""
+    return unicodedata.category(chr(code)) == "Mn"
+
+
+def joins_forward(code):
+    """هل يتصل الحرف بالحرف الذي يليه"""
+    return code == TATWEEL or (code in FORMS and FORMS[code][2] is not None)
+
+
+def joins_backward(code):
+    """هل يقبل الحرف الاتصال بالحرف الذي قبله"""
+    return code == TATWEEL or (code in FORMS and FORMS[code][1] is not None)
+
+
+def shape(text):
+    """استبدال الحروف العربية بأشكال العرض المناسبة لموقعها (بالترتيب المنطقي)"""
+    codes = [ord(ch) for ch in text]
+    letters = [i for i, code in enumerate(codes) if not is_transparent(code)]
+    result = []
+    skip = set()
+    for position, i in enumerate(letters):
+        if i in skip:
+            continue
+        # علامات التشكيل بعد الحرف تُنسخ كما هي
+        marks = "".join(chr(code) for code in codes[i + 1:letters[position + 1] if position + 1 < len(letters) else len(codes)])
+        code = codes[i]
+        if code not in FORMS:
+            result.append(chr(code) + marks)
+            continue
+        previous = codes[letters[position - 1]] if position > 0 else None
+        following = codes[letters[position + 1]] if position + 1 < len(letters) else None
+        joined_before = previous is not None and joins_forward(previous) and joins_backward(code)
+
+        if code == LAM and following in LAM_ALEF:
+            isolated, final = LAM_ALEF[following]
+            result.append(chr(final if joined_before else isolated) + marks)
+            skip.add(letters[position + 1])
+            continue
+
+        isolated, final, initial, medial = FORMS[code]
+        joined_after = following is not None and joins_forward(code) and joins_backward(following)
+        if joined_before and joined_after:
+            form = medial
+        elif joined_before:
+            form = final
+        elif joined_after:
+            form = initial
+        else:
+            form = isolated
+        result.append(chr(form) + marks)
+    return "".join(result)
+
+
+def is_ltr(ch):
+    """الحروف اللاتينية والأرقام تُكتب من اليسار لليمين داخل السطر العربي"""
+    return unicodedata.bidirectional(ch) in ("L", "EN", "AN")
+
+
+def visual_order(text):
+    """ترتيب سطر بالاتجاه من اليمين لليسار للرسم من اليسار: تُعكس المقاطع العربية
+    وتبقى المقاطع اللاتينية والأرقام (مع الفواصل بينها) بترتيبها"""
+    runs = []
+    i = 0
+    n = len(text)
+    while i < n:
+        if is_ltr(text[i]):
+            # مقطع لاتيني: حتى آخر حرف لاتيني تليه فواصل محايدة فقط
+            j = i + 1
+            end = i + 1
+            while j < n and (is_ltr(text[j]) or unicodedata.bidirectional(text[j]) in ("WS", "CS", "ES", "ET", "ON")):
+                if is_ltr(text[j]):
+                    end = j + 1
+                j += 1
+            runs.append(text[i:end])
+            i = end
+        else:
+            j = i + 1
+            while j < n and not is_ltr(text[j]):
+                j += 1
+            runs.append(text[i:j][::-1].translate(MIRRORED))
+            i = j
+    return "".join(reversed(runs))
+
+
+def prepare_rtl(text):
+    """النص جاهز للرسم من اليسار لليمين: تشكيل ثم ترتيب مرئي"""
+    return visual_order(shape(text))
@@ -0,0 +1,170 @@
+"""تدقيق جودة بيانات السجل بالكامل على جميع أنوية المعالج
+
+يُقسَّم السجل إلى دفعات تُفحص في عمليات منفصلة بقواعد validation.py وقواعد الجدولة
+(الإصدار الساري في تاريخ كل جرعة)، وتُكتب مشكلات كل دفعة في ملف التقرير فور
+انتهائها. عدد الدفعات المرسلة محدود فلا تتراكم نسخة ثانية من السجل في الذاكرة.
+
+مع مخزن JSON تُرسل السجلات بصيغتها المضغوطة (Child.state) مع الجداول المشتركة،
+فيبقى على العملية الرئيسية التقسيم فقط وتُفك الجرعات داخل عمليات الفحص.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+from itertools import islice
+
+from age_service import fixed_clock
+from model import Child, merge_table_state, table_state
+from rules import parse_date, vaccine_code_of
+from schedules import ScheduleRules
+from spreadsheet import write_table
+from validation import validate_child
+
+# حقول الطفل المرسلة لعمليات الفحص (ما يحتاجه الفحص فقط لتقليل النقل بين العمليات)
+AUDIT_FIELDS = (
+    "child_id", "entry_name", "entry_father_name", "entry_surname", "birth_date",
+    "entry_national_id", "entry_passport", "entry_phone", "vaccinations",
+)
+REPORT_HEADERS = ["المعرف", "الاسم", "نوع المشكلة", "التفاصيل"]
+
+# أنواع المشكلات
+INVALID_FIELD = "بيانات غير صالحة"
+INVALID_DOSE_DATE = "تاريخ جرعة غير صالح"
+DOSE_BEFORE_BIRTH = "جرعة قبل الميلاد"
+FUTURE_DOSE = "جرعة بتاريخ مستقبلي"
+SHORT_INTERVAL = "فترة أقل من الحد الأدنى"
+RESTRICTED = "تطعيمان متعارضان"
+
+# قواعد الجدولة وتاريخ التدقيق في كل عملية فحص (تُهيأ مرة واحدة عند بدء العملية)
+worker_rules = None
+worker_today = None
+
+
+class AuditReport:
+    """ملخص التدقيق: عدد الأطفال المفحوصين والمشكلات حسب النوع"""
+
+    def __init__(self):
+        self.children = 0
+        self.findings = 0
+        self.kinds = {}
+
+    def add(self, count, rows):
+        self.children += count
+        self.findings += len(rows)
+        for row in rows:
+            self.kinds[row[2]] = self.kinds.get(row[2], 0) + 1
+
+
+def audit_child(child, rules, today):
+    """مشكلات طفل واحد: [(النوع، التفاصيل)]"""
+    findings = [(INVALID_FIELD, message) for message in validate_child(child)]
+    try:
+        birth = parse_date(child.get("birth_date"))
+    except (ValueError, TypeError):
+        birth = None
+    given = {}
+    for vaccination in child.get("vaccinations", []):
+        try:
+            day, vaccine, dose = vaccination[:3]
+            dose_date = parse_date(day)
+        except (ValueError, TypeError):
+            findings.append((INVALID_DOSE_DATE, " | ".join(map(str, vaccination))))
+            continue
+        if birth and dose_date < birth:
+            findings.append((DOSE_BEFORE_BIRTH, f"{vaccine} {dose} بتاريخ {day}"))
+        if dose_date > today:
+            findings.append((FUTURE_DOSE, f"{vaccine} {dose} بتاريخ {day}"))
+        given.setdefault(vaccine_code_of(vaccine), []).append((dose_date, dose))
+
+    for code, doses in given.items():
+        doses.sort()
+        for (previous, previous_dose), (dose_date, dose) in zip(doses, doses[1:]):
+            # الفترة المطلوبة حسب إصدار الجدول الساري يوم إعطاء الجرعة
+            schedule = rules.for_date(dose_date)
+            if code not in schedule.vaccines:
+                continue
+            can_give, message = schedule.check_vaccine_interval(code, dose, previous, dose_date)
+            if not can_give:
+                findings.append((SHORT_INTERVAL, f"{code} {dose} بتاريخ {dose_date} بعد {previous_dose} "
+                                                 f"بتاريخ {previous}: {message}"))
+
+    reported = set()
+    for code, doses in given.items():
+        # القيود حسب إصدار الجدول الساري يوم آخر جرعة من هذا التطعيم
+        schedule = rules.for_date(doses[-1][0])
+        allowed, message = schedule.check_vaccine_restrictions(code, given)
+        if allowed:
+            continue
+        # التعارض يُسجل مرة واحدة لا مرة لكل طرف (M.M.R مع Chicken pox)
+        pair = frozenset(schedule.vaccines[code].conflicts & given.keys()) | {code}
+        if pair not in reported:
+            reported.add(pair)
+            findings.append((RESTRICTED, message))
+    return findings
+
+
+def init_worker(schedules_dir, today, tables):
+    global worker_rules, worker_today
+    worker_rules = ScheduleRules(schedules_dir, fixed_clock(today))
+    worker_rules.reload_if_changed()
+    worker_today = today
+    # أرقام الجرعات المضغوطة تشير إلى جداول العملية الرئيسية
+    merge_table_state(tables)
+
+
+def audit_shard(children):
+    """فحص دفعة في عملية الفحص: (عدد الأطفال، صفوف المشكلات)"""
+    rows = []
+    for child in children:
+        if child.__class__ is tuple:
+            child = Child.from_state(child)
+        findings = audit_child(child, worker_rules, worker_today)
+        if findings:
+            name = " ".join(str(child.get(field) or "") for field in ("entry_name", "entry_father_name", "entry_surname"))
+            rows += [[child.get("child_id", ""), name, kind, details] for kind, details in findings]
+    return len(children), rows
+
+
+def shards(children, shard_size):
+    """تقسيم الأطفال إلى دفعات: الصيغة المضغوطة كما هي، والقواميس بالحقول المطلوبة للفحص فقط"""
+    shard = []
+    for child in children:
+        if child.__class__ is Child:
+            shard.append(child.state())
+        else:
+            shard.append({field: child[field] for field in AUDIT_FIELDS if field in child})
+        if len(shard) >= shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def stream_findings(pool, shards, max_pending, report, progress=None):
+    """صفوف المشكلات بترتيب انتهاء الدفعات مع إبقاء max_pending دفعة فقط قيد التنفيذ"""
+    pending = set()
+    while True:
+        for shard in islice(shards, max_pending - len(pending)):
+            pending.add(pool.submit(audit_shard, shard))
+        if not pending:
+            return
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            count, rows = future.result()
+            report.add(count, rows)
+            if progress:
+                progress(report.children)
+            yield from rows
+
+
+def audit_registry(store, path, schedules_dir=None, workers=None, shard_size=2000, progress=None, today=None):
+    """فحص جميع أطفال المخزن وكتابة المشكلات في ملف التقرير (CSV أو XLSX)؛ يعيد AuditReport"""
+    today = today or date.today()
+    children = store.iter_compact() if hasattr(store, "iter_compact") else store.iter_children()
+    # ملف جدول غير صالح يرفع ScheduleError هنا قبل بدء العمليات
+    ScheduleRules(schedules_dir).reload_if_changed()
+    workers = workers or os.cpu_count() or 1
+    report = AuditReport()
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(schedules_dir, today, table_state())) as pool:
+        rows = stream_findings(pool, shards(iter(children), shard_size), workers * 2, report, progress)
+        write_table(path, REPORT_HEADERS, rows, "التدقيق")
+    return report
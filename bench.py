@@ -0,0 +1,354 @@
+"""قياس أداء السجل على بيانات اصطناعية مع حفظ النتائج كمرجع للمقارنة بين الإصدارات
+
+    python bench.py run --sizes 1000,100000 --output bench_results.json
+    python bench.py run --sizes 1000000 --compare bench_results.json
+    python bench.py generate 100000 children_data.json
+
+البيانات الاصطناعية تتبع جدول التطعيمات نفسه (الجرعات من all_vaccines والفترات
+من vaccine_intervals والأعمار الدنيا من compensation_schedule) بتاريخ مرجع ثابت
+وبذرة ثابتة، فتتطابق البيانات بين التشغيلات ويمكن مقارنة الأزمنة مباشرة.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from age_service import fixed_clock
+from rules import RuleTable, add_months
+from search_index import NameIndex
+from sqlite_store import SQLiteStore
+from storage import RecordStore, gc_paused
+
+# تاريخ المرجع لكل القياسات حتى لا تتغير الأعمار والاستحقاقات مع الأيام
+BENCH_DAY = date(2025, 1, 1)
+BASELINE_FORMAT = 1
+
+MALE_NAMES = ["محمد", "أحمد", "علي", "عمر", "يوسف", "إبراهيم", "خالد", "عبدالله", "مصطفى", "حسن",
+              "حسين", "سالم", "صالح", "عبدالرحمن", "طارق", "أنس", "معاذ", "زكريا", "إسماعيل", "ياسين"]
+FEMALE_NAMES = ["فاطمة", "مريم", "عائشة", "خديجة", "زينب", "سارة", "نور", "هدى", "آمنة", "سلمى",
+                "رحمة", "ملاك", "جنى", "ريم", "أسماء", "حنان", "إيمان", "صفاء", "رقية", "لين"]
+SURNAMES = ["الورفلي", "المصراتي", "الزنتاني", "الطرابلسي", "البرعصي", "العبيدي", "الفيتوري", "القذافي",
+            "المقريف", "الشريف", "الترهوني", "الغرياني", "السويحلي", "بن غلبون", "الكيلاني", "المنفي",
+            "الدرسي", "العرفي", "الحاسي", "المغربي"]
+
+# الجنسية ← الوزن النسبي في السجل
+NATIONALITY_WEIGHTS = {
+    "ليبي": 80, "مصري": 6, "سوداني": 4, "تونسي": 3, "سوري": 2, "جزائري": 1, "مغربي": 1,
+    "فلسطيني": 1, "يمني": 1, "أخرى": 1,
+}
+
+# احتمال أخذ الجرعة التالية في وقتها، وأقصى تأخير بالأيام
+DOSE_PROBABILITY = 0.9
+MAX_DELAY_DAYS = 60
+
+
+class RegistryGenerator:
+    """أطفال اصطناعيون بأسماء عربية وتواريخ ميلاد حتى 15 سنة وتاريخ جرعات يتبع الجدول"""
+
+    def __init__(self, rules, seed=1, today=BENCH_DAY):
+        self.rules = rules
+        self.random = random.Random(seed)
+        self.today = today
+        self.nationalities = list(NATIONALITY_WEIGHTS)
+        self.weights = list(NATIONALITY_WEIGHTS.values())
+        # ترتيب التطعيمات حسب العمر الأدنى كما في الجدول
+        self.schedule = sorted(rules.vaccines.values(), key=lambda rule: (rule.min_age_months, rule.index))
+
+    def child(self, number):
+        rnd = self.random
+        gender = "ذكر" if rnd.random() < 0.51 else "أنثى"
+        birth = self.today - timedelta(days=rnd.randrange(15 * 365))
+        nationality = rnd.choices(self.nationalities, self.weights)[0]
+        child = {
+            "child_id": uuid.UUID(int=rnd.getrandbits(128)).hex,
+            "entry_name": rnd.choice(MALE_NAMES if gender == "ذكر" else FEMALE_NAMES),
+            "entry_father_name": rnd.choice(MALE_NAMES),
+            "entry_grandfather_name": rnd.choice(MALE_NAMES),
+            "entry_surname": rnd.choice(SURNAMES),
+            "entry_mother_name": f"{rnd.choice(FEMALE_NAMES)} {rnd.choice(SURNAMES)}",
+            "birth_date": birth.isoformat(),
+            "gender": gender,
+            "nationality": nationality,
+            "entry_passport": "",
+            "entry_phone": f"09{rnd.choice('1245')}{rnd.randrange(10 ** 7):07d}",
+            "entry_national_id": "",
+            "entry_family_paper": "",
+            "entry_registration_no": f"{birth.year}{number % 10 ** 6:06d}",
+        }
+        if nationality == "ليبي":
+            child["entry_national_id"] = f"{1 if gender == 'ذكر' else 2}{birth.year}{rnd.randrange(10 ** 7):07d}"
+            child["entry_family_paper"] = str(rnd.randrange(10 ** 5, 10 ** 6))
+        else:
+            child["entry_passport"] = f"{rnd.choice('ABCKPR')}{rnd.randrange(10 ** 7):07d}"
+        child["vaccinations"] = self.history(birth, gender)
+        child["age_category"] = self.rules.calculate_age_category(birth, self.today)
+        return child
+
+    def history(self, birth, gender):
+        """الجرعات المأخوذة حتى تاريخ المرجع مع احترام العمر الأدنى والفترات والتعارضات"""
+        rnd = self.random
+        rows = []
+        taken = set()
+        for rule in self.schedule:
+            if rule.conflicts & taken or (rule.code == "HPV" and gender != "أنثى"):
+                continue
+            day = add_months(birth, rule.min_age_months)
+            for dose in rule.doses:
+                day += timedelta(days=rnd.randrange(MAX_DELAY_DAYS))
+                if day > self.today or rnd.random() > DOSE_PROBABILITY:
+                    break
+                # الفئة عند الجرعة من فرق الأشهر مباشرة: كل تاريخ جرعة مختلف فلا تفيد ذاكرة الأعمار
+                months = (day.year - birth.year) * 12 + day.month - birth.month - (day.day < birth.day)
+                rows.append([day.isoformat(), f"{rule.code} - {rule.name}", dose, "", "مكتمل",
+                             self.rules.age_category_for_months(months)])
+                taken.add(rule.code)
+                day += timedelta(days=rule.interval)
+        rows.sort(key=lambda row: row[0])
+        return rows
+
+    def children(self, count):
+        for number in range(count):
+            yield self.child(number)
+
+
+def write_registry(store, children, batch_size=10000):
+    """كتابة الأطفال في المخزن على دفعات وإرجاع عددهم"""
+    count = 0
+    batch = []
+    for child in children:
+        batch.append(child)
+        if len(batch) >= batch_size:
+            store.put_many(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        store.put_many(batch)
+        count += len(batch)
+    return count
+
+
+def open_bench_store(backend, directory):
+    if backend == "sqlite":
+        return SQLiteStore(os.path.join(directory, "children_data.db"))
+    return RecordStore(os.path.join(directory, "children_data.json"))
+
+
+def timed(fn, repeat, operations=1):
+    """أقل زمن ووسيطه لعدة تشغيلات، مع الزمن لكل عملية عند قياس عمليات متعددة"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    result = {
+        "runs": repeat,
+        "min_seconds": round(min(times), 6),
+        "median_seconds": round(statistics.median(times), 6),
+    }
+    if operations > 1:
+        result["operations"] = operations
+        result["median_per_operation_us"] = round(1e6 * statistics.median(times) / operations, 3)
+    return result
+
+
+def run_size(size, backend, repeat, directory, log):
+    """جميع القياسات لسجل بحجم واحد"""
+    rules = RuleTable(clock=fixed_clock(BENCH_DAY))
+    results = {}
+
+    start = time.perf_counter()
+    store = open_bench_store(backend, directory)
+    write_registry(store, RegistryGenerator(rules).children(size))
+    store.close()
+    elapsed = round(time.perf_counter() - start, 6)
+    results["generate"] = {"runs": 1, "min_seconds": elapsed, "median_seconds": elapsed}
+    log(f"  توليد {size} طفل: {results['generate']['min_seconds']:.2f}s")
+
+    def load():
+        # فتح المخزن من القرص كما عند تشغيل البرنامج ثم load_data
+        state["store"].close()
+        state["store"] = open_bench_store(backend, directory)
+        state["children"] = state["store"].load_all()
+
+    def startup():
+        # ما يسبق اكتمال التحميل عند التشغيل: فتح المخزن وبناء فهرس الأسماء
+        state["store"].close()
+        state["store"] = open_bench_store(backend, directory)
+        with gc_paused():
+            NameIndex().build(state["store"].load_all())
+
+    state = {"store": open_bench_store(backend, directory)}
+    results["startup"] = timed(startup, repeat)
+    results["load_data"] = timed(load, repeat)
+    store = state["store"]
+    children = state["children"]
+    log(f"  load_data: {results['load_data']['median_seconds']:.3f}s")
+
+    rnd = random.Random(2)
+    sample = rnd.sample(children, min(1000, len(children)))
+
+    def save_one_percent():
+        # save_data بعد تعديل 1% من السجلات (يُكتب المتغير فقط)
+        stamp = datetime.now().isoformat()
+        for child in children[::100]:
+            child["entry_phone"] = stamp
+        store.replace_all(children)
+
+    results["save_data"] = timed(save_one_percent, repeat)
+
+    def save_children():
+        for child in sample[:100]:
+            current = store.get(child["child_id"])
+            store.save(dict(current, entry_phone="0910000000"), current)
+
+    results["save_child"] = timed(save_children, repeat, min(100, len(sample)))
+
+    index = NameIndex()
+    results["name_index_build"] = timed(lambda: index.build(children), repeat)
+    queries = [f"{child['entry_name']} {child['entry_surname']}" for child in sample[:200]]
+    results["search_name"] = timed(lambda: [index.search(query) for query in queries], repeat, len(queries))
+    ids = [child["entry_national_id"] or child["entry_passport"] for child in sample]
+    fields = ["entry_national_id" if child["entry_national_id"] else "entry_passport" for child in sample]
+    results["search_field"] = timed(lambda: [store.find(field, value) for field, value in zip(fields, ids)],
+                                    repeat, len(ids))
+
+    births = [child["birth_date"] for child in children]
+
+    def age_categories():
+        # ذاكرة العمر باردة في كل تشغيل
+        fresh = RuleTable(clock=fixed_clock(BENCH_DAY))
+        for birth in births:
+            fresh.calculate_age_category(birth)
+
+    results["calculate_age_category"] = timed(age_categories, repeat, len(births))
+    results["due_vaccines"] = timed(
+        lambda: [rules.due_vaccines(child["birth_date"], child["vaccinations"]) for child in sample],
+        repeat, len(sample))
+    try:
+        from eligibility import BatchEligibility
+    except ImportError:
+        log("  numpy غير مثبتة: تم تخطي قياس الأهلية الجماعية")
+    else:
+        engine = BatchEligibility(rules)
+        results["eligibility_batch"] = timed(lambda: engine.evaluate(engine.load(children), BENCH_DAY), repeat)
+
+    store.close()
+    for name, result in results.items():
+        log(f"  {name}: {result['median_seconds']:.4f}s")
+    return results
+
+
+def environment():
+    """وصف بيئة القياس المحفوظ مع النتائج"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """مقارنة الوسيط بالمرجع: قائمة (الحجم، القياس، النسبة، تراجع؟)"""
+    rows = []
+    for size, benchmarks in results["sizes"].items():
+        for name, result in benchmarks.items():
+            reference = baseline.get("sizes", {}).get(size, {}).get(name)
+            if not reference or not reference["median_seconds"]:
+                continue
+            ratio = result["median_seconds"] / reference["median_seconds"]
+            rows.append((size, name, ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def run(args):
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = {
+        "format": BASELINE_FORMAT,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "backend": args.backend,
+        "environment": environment(),
+        "sizes": {},
+    }
+    for size in sizes:
+        print(f"السجل: {size} طفل ({args.backend})", file=sys.stderr)
+        directory = tempfile.mkdtemp(prefix="vaccination-bench-")
+        try:
+            results["sizes"][str(size)] = run_size(size, args.backend, args.repeat, directory,
+                                                   lambda text: print(text, file=sys.stderr))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"تم حفظ النتائج في {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("backend") != args.backend:
+            print(f"تنبيه: المرجع مقاس على {baseline.get('backend')}", file=sys.stderr)
+        regressions = 0
+        for size, name, ratio, regressed in compare(results, baseline, args.tolerance):
+            regressions += regressed
+            print(f"{size:>8} {name:<24} {ratio:6.2f}x{'  تراجع' if regressed else ''}")
+        if regressions:
+            print(f"{regressions} قياس أبطأ من المرجع بأكثر من {args.tolerance:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+def generate(args):
+    """إنشاء ملف بيانات اصطناعي للتجربة اليدوية على البرنامج"""
+    rules = RuleTable(clock=fixed_clock(BENCH_DAY))
+    if args.path.endswith(".db"):
+        store = SQLiteStore(args.path)
+    else:
+        store = RecordStore(args.path)
+    count = write_registry(store, RegistryGenerator(rules, args.seed).children(args.count))
+    store.close()
+    print(f"تم إنشاء {count} طفل في {args.path}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="قياس أداء سجل التطعيمات")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="تشغيل القياسات")
+    run_parser.add_argument("--sizes", default="1000,100000", help="أحجام السجل مفصولة بفواصل (مثل 1000,100000,1000000)")
+    run_parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--output", help="ملف JSON لحفظ النتائج كمرجع")
+    run_parser.add_argument("--compare", help="ملف مرجع سابق للمقارنة")
+    run_parser.add_argument("--tolerance", type=float, default=0.25, help="نسبة التباطؤ المسموحة قبل اعتباره تراجعاً")
+    run_parser.set_defaults(handler=run)
+
+    generate_parser = commands.add_parser("generate", help="إنشاء سجل اصطناعي")
+    generate_parser.add_argument("count", type=int)
+    generate_parser.add_argument("path", help="children_data.json أو ملف .db")
+    generate_parser.add_argument("--seed", type=int, default=1)
+    generate_parser.set_defaults(handler=generate)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
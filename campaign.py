@@ -0,0 +1,99 @@
+"""وضع حملات التطعيم: نفس التطعيم والجرعة لعدد كبير من الأطفال مع حفظ على دفعات"""
+import threading
+
+from rules import DoseIndex, parse_date
+
+# حقول البحث عن الطفل بالرقم الممسوح بترتيب الأولوية
+SCAN_FIELDS = ["entry_national_id", "entry_passport", "entry_registration_no", "entry_family_paper"]
+
+
+class CampaignSession:
+    """جلسة حملة واحدة: فحص الأهلية فورياً وتجميع الجرعات لحفظها دفعة واحدة
+
+    الفحص يعتمد على سجل الطفل المحمّل وجرعات هذه الجلسة، والحفظ عبر
+    store.save_many فتُدمج الجرعة مع أي تعديل متزامن من محطة أخرى.
+    """
+
+    def __init__(self, store, rules, vaccine_code, dose, day, batch_size=25):
+        self.store = store
+        self.day = parse_date(day)
+        # قواعد إصدار الجدول الساري في يوم الحملة
+        self.rules = rules.for_date(self.day)
+        self.rule = self.rules.vaccines[vaccine_code]
+        self.dose = dose
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        # child_id ← (السجل كما حُمّل، صف الجرعة) بانتظار الحفظ
+        self.pending = {}
+        self.recorded = set()
+        self.saved_count = 0
+
+    def find_child(self, scanned):
+        """البحث عن الطفل بالرقم الممسوح (يُستدعى في الخيط الخلفي)"""
+        scanned = scanned.strip()
+        for field in SCAN_FIELDS:
+            value = scanned.upper() if field == "entry_passport" else scanned
+            children = self.store.find(field, value)
+            if children:
+                return children
+        return []
+
+    def check(self, child):
+        """فحص الأهلية: (يمكن التسجيل، الرسالة)"""
+        child_id = child["child_id"]
+        if child_id in self.recorded:
+            return False, "تم تسجيل هذا الطفل في الحملة"
+        vaccinations = child.get("vaccinations", [])
+        doses = DoseIndex(vaccinations)
+        code = self.rule.code
+
+        years, months, days = self.rules.calculate_exact_age(child.get("birth_date"), self.day)
+        if years * 12 + months < self.rule.min_age_months:
+            return False, f"العمر أقل من {self.rule.min_age_months} شهر"
+        for row in vaccinations:
+            if str(row[1]).split(" - ")[0] == code and row[2] == self.dose:
+                return False, f"أُعطيت {self.dose} بتاريخ {row[0]}"
+        if doses.dose_count(code) >= len(self.rule.doses):
+            return False, "اكتملت جميع الجرعات"
+
+        can_combine, message = self.rules.check_vaccine_restrictions(code, doses.codes())
+        if not can_combine:
+            return False, message
+        return self.rules.check_vaccine_interval(code, self.dose, doses.last_date(code), self.day)
+
+    def record(self, child, notes="حملة"):
+        """إضافة جرعة الطفل إلى الدفعة؛ يعيد True إذا امتلأت الدفعة"""
+        row = [
+            self.day.isoformat(), f"{self.rule.code} - {self.rule.name}", self.dose, notes, "مكتمل",
+            self.rules.calculate_age_category(child.get("birth_date"), self.day),
+        ]
+        with self.lock:
+            self.pending[child["child_id"]] = (child, row)
+            self.recorded.add(child["child_id"])
+            return len(self.pending) >= self.batch_size
+
+    def flush(self):
+        """حفظ الجرعات المعلقة في عملية كتابة واحدة وإرجاع السجلات المحفوظة"""
+        with self.lock:
+            batch, self.pending = self.pending, {}
+        if not batch:
+            return []
+        items = [
+            (dict(child, vaccinations=child.get("vaccinations", []) + [row]), child)
+            for child, row in batch.values()
+        ]
+        try:
+            saved = self.store.save_many(items)
+        except Exception:
+            # تُعاد للدفعة التالية حتى لا تضيع الجرعات
+            with self.lock:
+                batch.update(self.pending)
+                self.pending = batch
+            raise
+        with self.lock:
+            self.saved_count += len(batch)
+        return saved
+
+    def pending_count(self):
+        with self.lock:
+            return len(self.pending)
@@ -0,0 +1,141 @@
+"""تقارير نسب التغطية بالتطعيم من جداول تجميع تُحدَّث مع كل حفظ
+
+جداول التجميع مفتاحها تاريخ الميلاد وليس الفئة العمرية، لأن الفئة تتغير
+مع مرور الأيام بينما تاريخ الميلاد ثابت؛ عند طلب التقرير تُحوَّل تواريخ
+الميلاد المميزة (بضعة آلاف) إلى فئات بـ calculate_age_category ثم تُجمع.
+"""
+from age_service import reference_date
+from rules import parse_date, vaccine_code_of
+
+# أبعاد التقرير المتاحة
+DIMENSIONS = {
+    "cohort": "الفئة العمرية",
+    "nationality": "الجنسية",
+    "period": "شهر الميلاد",
+}
+
+OTHER_NATIONALITY = "أخرى"
+
+
+class CoverageRollup:
+    """أعداد الأطفال والجرعات حسب (تاريخ الميلاد، الجنسية) و(التطعيم، الجرعة)"""
+
+    def __init__(self, rules, nationalities):
+        self.rules = rules
+        self.nationalities = set(nationalities)
+        # (تاريخ الميلاد، الجنسية) ← عدد الأطفال
+        self.population = {}
+        # (تاريخ الميلاد، الجنسية) ← (الكود، الجرعة) ← عدد الأطفال الذين أخذوها
+        self.vaccinated = {}
+        # مساهمة كل طفل حتى يمكن طرحها عند تعديله
+        self.contributions = {}
+        # التقارير المحسوبة منذ آخر تعديل: (الأبعاد، التطعيم، التاريخ) ← الصفوف
+        self.reports = {}
+        # ترتيب الفئات العمرية في التقارير
+        self.cohort_order = {category: i for i, (limit, category) in enumerate(rules.age_thresholds)}
+
+    def child_keys(self, child):
+        """مفاتيح مساهمة طفل واحد في جداول التجميع"""
+        try:
+            birth = parse_date(child.get("birth_date")).isoformat()
+        except (ValueError, TypeError):
+            return None
+        nationality = child.get("nationality") or OTHER_NATIONALITY
+        if nationality not in self.nationalities:
+            nationality = OTHER_NATIONALITY
+        taken = set()
+        for vaccination in child.get("vaccinations", []):
+            code = vaccine_code_of(vaccination[1])
+            if code in self.rules.vaccines:
+                taken.add((code, vaccination[2]))
+        return (birth, nationality), taken
+
+    def build(self, children):
+        """بناء الجداول من جميع السجلات"""
+        self.population = {}
+        self.vaccinated = {}
+        self.contributions = {}
+        self.reports = {}
+        self.cohort_order = {category: i for i, (limit, category) in enumerate(self.rules.age_thresholds)}
+        for child in children:
+            self.add(child)
+
+    def add(self, child):
+        self.reports = {}
+        keys = self.child_keys(child)
+        if keys is None:
+            return
+        self.contributions[child["child_id"]] = keys
+        population_key, taken = keys
+        self.population[population_key] = self.population.get(population_key, 0) + 1
+        cell = self.vaccinated.setdefault(population_key, {})
+        for key in taken:
+            cell[key] = cell.get(key, 0) + 1
+
+    def update(self, child):
+        """تحديث مساهمة طفل بعد حفظه"""
+        self.remove(child["child_id"])
+        self.add(child)
+
+    def remove(self, child_id):
+        """طرح مساهمة طفل"""
+        keys = self.contributions.pop(child_id, None)
+        if keys is None:
+            return
+        self.reports = {}
+        population_key, taken = keys
+        for table, table_keys in ((self.population, [population_key]), (self.vaccinated[population_key], taken)):
+            for key in table_keys:
+                if table[key] > 1:
+                    table[key] -= 1
+                else:
+                    del table[key]
+        if population_key not in self.population:
+            del self.vaccinated[population_key]
+
+    def coverage(self, dimensions=("cohort",), vaccine_code=None, today=None):
+        """صفوف التغطية: قيم الأبعاد، التطعيم، الجرعة، الملقحون، العدد الكلي، النسبة"""
+        today = reference_date(today) or self.rules.ages.today()
+        key = (tuple(dimensions), vaccine_code, today)
+        if key not in self.reports:
+            self.reports[key] = self.compute(dimensions, vaccine_code, today)
+        return self.reports[key]
+
+    def compute(self, dimensions, vaccine_code, today):
+        births = {birth for birth, nationality in self.population}
+        # حدود الفئات وقائمة التطعيمات من إصدار الجدول الساري في تاريخ التقرير
+        rules = self.rules.for_date(today)
+        cohorts = dict(zip(births, rules.ages.categories(births, today)))
+
+        totals = {}
+        counts = {}
+        for (birth, nationality), population in self.population.items():
+            values = {"cohort": cohorts[birth], "nationality": nationality, "period": birth[:7]}
+            group = tuple(values[dimension] for dimension in dimensions)
+            totals[group] = totals.get(group, 0) + population
+            group_counts = counts.setdefault(group, {})
+            for key, count in self.vaccinated[(birth, nationality)].items():
+                group_counts[key] = group_counts.get(key, 0) + count
+
+        rows = []
+        for group, population in sorted(totals.items(), key=lambda item: self.sort_key(item[0], dimensions)):
+            for code, rule in rules.vaccines.items():
+                if vaccine_code and code != vaccine_code:
+                    continue
+                for dose in rule.doses:
+                    vaccinated = counts[group].get((code, dose), 0)
+                    rows.append(list(group) + [code, dose, vaccinated, population,
+                                               round(100.0 * vaccinated / population, 1)])
+        return rows
+
+    def sort_key(self, group, dimensions):
+        """ترتيب الفئات العمرية من الأصغر للأكبر وبقية الأبعاد أبجدياً"""
+        order = self.cohort_order
+        return tuple(
+            (order.get(value, len(order)), value) if dimension == "cohort" else (0, value)
+            for dimension, value in zip(dimensions, group)
+        )
+
+    def headers(self, dimensions):
+        return [DIMENSIONS[dimension] for dimension in dimensions] + [
+            "التطعيم", "الجرعة", "الملقحون", "العدد الكلي", "النسبة %"]
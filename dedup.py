@@ -0,0 +1,220 @@
+"""كشف الأطفال المسجلين أكثر من مرة ودمج سجلاتهم
+
+المقارنة لا تتم بين كل زوجين في السجل: يُوزَّع الأطفال على مجموعات (blocking)
+مفتاحها تاريخ الميلاد مع اسم الأم الموحّد (أو رقم الهاتف)، ويُقارن الأطفال داخل
+كل مجموعة فقط. المجموعات صغيرة عادة فيبقى الزمن قريباً من الخطي في حجم السجل.
+"""
+from search_index import normalize_arabic, trigrams
+from storage import StorageError
+
+# أقصى حجم لمجموعة تُقارن بالكامل؛ المجموعات الأكبر لا تميّز بين الأطفال
+MAX_BLOCK_SIZE = 200
+DEFAULT_THRESHOLD = 0.75
+
+# أوزان تشابه أجزاء الاسم (مجموعها مع اسم الأم 0.85)
+NAME_WEIGHTS = [
+    ("entry_name", 0.3),
+    ("entry_father_name", 0.2),
+    ("entry_grandfather_name", 0.1),
+    ("entry_surname", 0.15),
+    ("entry_mother_name", 0.1),
+]
+NAME_TOTAL = sum(weight for field, weight in NAME_WEIGHTS)
+# (الحقل، الوزن عند التطابق، الخصم عند الاختلاف مع وجود القيمتين)
+IDENTITY_WEIGHTS = [
+    ("entry_phone", 0.15, 0.1),
+    ("entry_national_id", 0.3, 0.6),
+    # الجواز قد يتجدد برقم جديد: خصم أقل
+    ("entry_passport", 0.3, 0.15),
+    ("entry_family_paper", 0.1, 0.0),
+]
+GENDER_PENALTY = 0.6
+
+# أسماء الحقول المتطابقة كما تُعرض للمراجع
+REASON_LABELS = {
+    "entry_name": "الاسم", "entry_father_name": "اسم الأب", "entry_grandfather_name": "اسم الجد",
+    "entry_surname": "اللقب", "entry_mother_name": "اسم الأم", "entry_phone": "الهاتف",
+    "entry_national_id": "الرقم الوطني", "entry_passport": "جواز السفر", "entry_family_paper": "ورقة العائلة",
+}
+
+# حقول الهوية تُنقل من السجل المدموج إن كانت فارغة في السجل الأساسي
+FILL_FIELDS = [
+    "entry_name", "entry_father_name", "entry_grandfather_name", "entry_surname", "entry_mother_name",
+    "birth_date", "gender", "nationality", "entry_passport", "entry_phone", "entry_national_id",
+    "entry_family_paper", "entry_registration_no",
+]
+
+
+def mother_key(name):
+    """الاسم الأول للأم موحّداً (بدون "ال" وبدون فراغات "عبد ال...")"""
+    words = normalize_arabic(name).split()
+    if not words:
+        return ""
+    first = words[0]
+    if first == "عبد" and len(words) > 1:
+        first += words[1]
+    return first[2:] if first.startswith("ال") and len(first) > 3 else first
+
+
+def similarity(grams_a, grams_b):
+    """تشابه المقاطع الثلاثية (Jaccard)"""
+    if not grams_a or not grams_b:
+        return 0.0
+    shared = len(grams_a & grams_b)
+    return shared / (len(grams_a) + len(grams_b) - shared)
+
+
+class Candidate:
+    """زوج مرشح للدمج مع درجة التشابه وأسبابها"""
+
+    def __init__(self, child_a, child_b, score, reasons):
+        self.child_a = child_a
+        self.child_b = child_b
+        self.score = score
+        self.reasons = reasons
+
+
+class LinkageEngine:
+    """تقسيم السجل إلى مجموعات ثم مقارنة الأطفال داخل كل مجموعة"""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, max_block_size=MAX_BLOCK_SIZE):
+        self.threshold = threshold
+        self.max_block_size = max_block_size
+        self.skipped_blocks = 0
+        self.gram_cache = {}
+
+    def prepare(self, child):
+        """القيم الموحدة لطفل واحد (تُحسب مرة واحدة مهما تكررت مقارنته)"""
+        return {
+            "child": child,
+            "grams": {field: self.grams(child.get(field, "")) for field, weight in NAME_WEIGHTS},
+            "ids": {field: str(child.get(field) or "").strip().upper() for field, *weights in IDENTITY_WEIGHTS},
+            "distinct": set(child.get("distinct_from", ())),
+        }
+
+    def grams(self, text):
+        """مقاطع الاسم مع ذاكرة: الأسماء تتكرر كثيراً في السجل"""
+        grams = self.gram_cache.get(text)
+        if grams is None:
+            grams = self.gram_cache[text] = frozenset(trigrams(text))
+        return grams
+
+    def blocks(self, children):
+        """مجموعات الأطفال: (تاريخ الميلاد، اسم الأم) و(تاريخ الميلاد، الهاتف)"""
+        blocks = {}
+        for child in children:
+            birth = child.get("birth_date")
+            if not birth:
+                continue
+            mother = mother_key(child.get("entry_mother_name", ""))
+            if mother:
+                blocks.setdefault((birth, "mother", mother), []).append(child)
+            phone = str(child.get("entry_phone") or "").strip()
+            if phone:
+                blocks.setdefault((birth, "phone", phone), []).append(child)
+        return blocks
+
+    def score(self, a, b):
+        """(الدرجة من 0 إلى 1، الأسباب)"""
+        reasons = []
+        score = 0.0
+        # الأجزاء الفارغة في أحد السجلين لا تُحتسب (مثل اسم الجد غير المدخل)
+        compared = 0.0
+        for field, weight in NAME_WEIGHTS:
+            if not a["grams"][field] or not b["grams"][field]:
+                continue
+            value = similarity(a["grams"][field], b["grams"][field])
+            compared += weight
+            score += weight * value
+            if value == 1.0:
+                reasons.append(field)
+        if compared:
+            score *= NAME_TOTAL / compared
+        for field, weight, penalty in IDENTITY_WEIGHTS:
+            value_a, value_b = a["ids"][field], b["ids"][field]
+            if value_a and value_b:
+                if value_a == value_b:
+                    score += weight
+                    reasons.append(field)
+                else:
+                    score -= penalty
+        gender_a, gender_b = a["child"].get("gender"), b["child"].get("gender")
+        if gender_a and gender_b and gender_a != gender_b:
+            score -= GENDER_PENALTY
+        return max(0.0, min(1.0, score)), reasons
+
+    def find(self, children):
+        """الأزواج المرشحة مرتبة من الأعلى درجة"""
+        self.skipped_blocks = 0
+        self.gram_cache = {}
+        seen = set()
+        candidates = []
+        # القيم الموحدة تُحسب فقط للأطفال الذين يشاركون مجموعة مع غيرهم
+        prepared = {}
+        for block in self.blocks(children).values():
+            if len(block) < 2:
+                continue
+            if len(block) > self.max_block_size:
+                self.skipped_blocks += 1
+                continue
+            members = []
+            for child in block:
+                if child["child_id"] not in prepared:
+                    prepared[child["child_id"]] = self.prepare(child)
+                members.append(prepared[child["child_id"]])
+            for i, a in enumerate(members):
+                id_a = a["child"]["child_id"]
+                for b in members[i + 1:]:
+                    id_b = b["child"]["child_id"]
+                    pair = (id_a, id_b) if id_a < id_b else (id_b, id_a)
+                    if id_a == id_b or pair in seen:
+                        continue
+                    seen.add(pair)
+                    if id_b in a["distinct"] or id_a in b["distinct"]:
+                        continue
+                    score, reasons = self.score(a, b)
+                    if score >= self.threshold:
+                        candidates.append(Candidate(a["child"], b["child"], round(score, 3), reasons))
+        candidates.sort(key=lambda candidate: candidate.score, reverse=True)
+        return candidates
+
+
+def merge_records(keep, other):
+    """سجل واحد: حقول keep مع إكمال الفارغ منها من other، وجرعات الاثنين بدون تكرار"""
+    merged = dict(keep)
+    for field in FILL_FIELDS:
+        if not merged.get(field) and other.get(field):
+            merged[field] = other[field]
+    vaccinations = []
+    seen = set()
+    for row in list(keep.get("vaccinations", [])) + list(other.get("vaccinations", [])):
+        key = (row[0], str(row[1]).split(" - ")[0], row[2])
+        if key not in seen:
+            seen.add(key)
+            vaccinations.append(row)
+    vaccinations.sort(key=lambda row: str(row[0]))
+    merged["vaccinations"] = vaccinations
+    merged["merged_ids"] = list(keep.get("merged_ids", [])) + [other["child_id"]] + list(other.get("merged_ids", []))
+    merged["distinct_from"] = sorted(set(keep.get("distinct_from", [])) | set(other.get("distinct_from", [])))
+    if not merged["distinct_from"]:
+        del merged["distinct_from"]
+    return merged
+
+
+def merge_duplicate(store, keep_id, other_id):
+    """دمج سجل other_id في keep_id ثم حذفه؛ يعيد السجل المدموج"""
+    keep, other = store.get(keep_id), store.get(other_id)
+    if keep is None or other is None:
+        raise StorageError("تم حذف أحد السجلين من مستخدم آخر")
+    saved = store.save(merge_records(keep, other), keep)
+    store.delete(other_id)
+    return saved
+
+
+def mark_distinct(store, child_id, other_id):
+    """تسجيل أن الطفلين مختلفان حتى لا يُعرضا كمرشحين مرة أخرى"""
+    child = store.get(child_id)
+    if child is None:
+        raise StorageError("تم حذف السجل من مستخدم آخر")
+    distinct = sorted(set(child.get("distinct_from", [])) | {other_id})
+    return store.save(dict(child, distinct_from=distinct), child)
@@ -0,0 +1,138 @@
+"""قياس زمن العمليات الحساسة (مدرجات تكرارية لكل عملية) وتحليل cProfile عند الطلب
+
+القياس يُفعَّل بمتغير البيئة VACCINATION_DIAGNOSTICS=1 أو "diagnostics": true في
+settings.json. عند تعطيله لا تُغلَّف أي دالة فلا توجد أي كلفة إضافية.
+"""
+import cProfile
+import functools
+import io
+import math
+import os
+import pstats
+import threading
+import time
+
+ENV_VAR = "VACCINATION_DIAGNOSTICS"
+
+# حدود الفئات: من 1 ميكروثانية بمضاعفات 2^(1/4) (خطأ أقل من 19% في المئين)
+BUCKETS_PER_DOUBLING = 4
+MIN_SECONDS = 1e-6
+BUCKET_COUNT = 120
+
+
+def enabled_by(settings):
+    """هل القياس مفعّل من متغير البيئة أو الإعدادات"""
+    value = os.environ.get(ENV_VAR)
+    if value is not None:
+        return value.strip().lower() not in ("", "0", "false", "no")
+    return bool(settings.get("diagnostics"))
+
+
+class Histogram:
+    """مدرج تكراري لوغاريتمي لأزمنة عملية واحدة بذاكرة ثابتة"""
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds <= MIN_SECONDS:
+            bucket = 0
+        else:
+            bucket = min(BUCKET_COUNT - 1, int(math.log2(seconds / MIN_SECONDS) * BUCKETS_PER_DOUBLING) + 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """الحد الأعلى للفئة التي تقع فيها النسبة المطلوبة من القياسات"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.max, MIN_SECONDS * 2 ** (bucket / BUCKETS_PER_DOUBLING))
+        return self.max
+
+
+class Metrics:
+    """مدرجات الأزمنة لكل العمليات المقاسة؛ آمنة للاستدعاء من خيط الواجهة والخيط الخلفي"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.profiler = None
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+
+    def wrap(self, name, fn):
+        """دالة تقيس زمن كل استدعاء لـ fn باسم name"""
+        clock = time.perf_counter
+        record = self.record
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, clock() - start)
+        return timed
+
+    def instrument(self, obj, method_names, prefix=""):
+        """استبدال دوال الكائن بنسخ مقاسة (على الكائن نفسه وليس على الصنف)
+
+        يجب استدعاؤها قبل ربط الدوال بأحداث الواجهة حتى تُربط النسخ المقاسة.
+        """
+        if not self.enabled or obj is None:
+            return
+        for method_name in method_names:
+            method = getattr(obj, method_name, None)
+            if method is not None and not hasattr(method, "__wrapped__"):
+                setattr(obj, method_name, self.wrap(prefix + method_name, method))
+
+    def snapshot(self):
+        """صفوف (العملية، العدد، p50، p95، p99، الأقصى، المجموع) بالمللي ثانية مرتبة حسب المجموع"""
+        with self.lock:
+            rows = [
+                (name, h.count, h.percentile(0.50) * 1000, h.percentile(0.95) * 1000,
+                 h.percentile(0.99) * 1000, h.max * 1000, h.total * 1000)
+                for name, h in self.histograms.items()
+            ]
+        return sorted(rows, key=lambda row: row[-1], reverse=True)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    # ---------------- cProfile ----------------
+
+    def start_profile(self):
+        """بدء تحليل cProfile لخيط الواجهة"""
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop_profile(self, path=None, limit=40):
+        """إيقاف التحليل وحفظه (ملف .prof لأدوات التحليل) وإرجاع ملخص نصي"""
+        profiler, self.profiler = self.profiler, None
+        if profiler is None:
+            return ""
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
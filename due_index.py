@@ -0,0 +1,68 @@
+"""تقويم المواعيد: الجرعة التالية لكل طفل مرتبة حسب تاريخ الاستحقاق"""
+from bisect import bisect_left, insort
+from datetime import date
+
+
+class DueIndex:
+    """فهرس مواعيد مجمّع حسب اليوم: تاريخ الاستحقاق ← (معرف الطفل، كود التطعيم) ← الجرعة التالية
+
+    يُبنى مرة واحدة عند التحميل ثم يُحدَّث لكل طفل عند حفظه، وقائمة الأيام
+    المرتبة تجعل "المستحقون بين تاريخين" بحثاً ثنائياً ثم قراءة أيام النطاق فقط
+    بدلاً من إعادة حساب الأهلية لكامل السجل.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.days = {}
+        self.ordinals = []
+        self.child_keys = {}
+
+    def build(self, children):
+        """بناء الفهرس من جميع السجلات"""
+        self.days = {}
+        self.child_keys = {}
+        for child in children:
+            self.add(child)
+        self.ordinals = sorted(self.days)
+
+    def add(self, child):
+        child_id = child["child_id"]
+        keys = []
+        for code, dose, due_date in self.rules.next_due(child.get("birth_date"), child.get("vaccinations", [])):
+            ordinal = due_date.toordinal()
+            self.days.setdefault(ordinal, {})[(child_id, code)] = dose
+            keys.append((ordinal, code))
+        self.child_keys[child_id] = keys
+
+    def update(self, child):
+        """إعادة حساب مواعيد طفل بعد حفظ جرعة أو حذفها"""
+        self.remove(child["child_id"])
+        self.add(child)
+        for ordinal, code in self.child_keys[child["child_id"]]:
+            position = bisect_left(self.ordinals, ordinal)
+            if position == len(self.ordinals) or self.ordinals[position] != ordinal:
+                insort(self.ordinals, ordinal)
+
+    def remove(self, child_id):
+        """إزالة مواعيد طفل"""
+        for ordinal, code in self.child_keys.pop(child_id, ()):
+            day = self.days[ordinal]
+            del day[(child_id, code)]
+            if not day:
+                del self.days[ordinal]
+                del self.ordinals[bisect_left(self.ordinals, ordinal)]
+
+    def due_between(self, start=None, end=None):
+        """المواعيد من start إلى end (شاملة) كصفوف (التاريخ، المعرف، الكود، الجرعة)"""
+        low = bisect_left(self.ordinals, start.toordinal()) if start else 0
+        high = bisect_left(self.ordinals, end.toordinal() + 1) if end else len(self.ordinals)
+        result = []
+        for ordinal in self.ordinals[low:high]:
+            due_date = date.fromordinal(ordinal)
+            result.extend(
+                (due_date, child_id, code, dose) for (child_id, code), dose in sorted(self.days[ordinal].items())
+            )
+        return result
+
+    def __len__(self):
+        return sum(len(day) for day in self.days.values())
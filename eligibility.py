@@ -0,0 +1,226 @@
+"""محرك أهلية التطعيمات لكامل السجل دفعة واحدة (NumPy)
+
+يُستخدم ليلياً لإنتاج قوائم الاستدعاء: يُحمّل جميع الأطفال في مصفوفات
+عمودية ثم يحسب لكل طفل ولكل تطعيم الجرعة التالية وتاريخ استحقاقها وحالتها
+في تمريرة واحدة بدون حلقات على مستوى الطفل.
+"""
+import csv
+from datetime import date
+
+import numpy as np
+
+# حالات الأهلية
+NOT_ELIGIBLE = 0   # لم يحن موعدها بعد (العمر أو الفترة بين الجرعات)
+DUE = 1            # مستحقة الآن
+OVERDUE = 2        # متأخرة أكثر من مهلة السماح
+COMPLETE = 3       # اكتملت جميع الجرعات
+RESTRICTED = 4     # ممنوعة بسبب تطعيم متعارض (vaccine_restrictions)
+
+STATUS_NAMES = {
+    NOT_ELIGIBLE: "غير مستحق بعد",
+    DUE: "مستحق",
+    OVERDUE: "متأخر",
+    COMPLETE: "مكتمل",
+    RESTRICTED: "ممنوع",
+}
+
+# قيمة التاريخ المفقود (أيام منذ 1970)
+NO_DATE = np.iinfo(np.int32).min
+
+
+def parse_dates(values):
+    """تحويل نصوص YYYY-MM-DD إلى أيام منذ 1970، والقيم غير الصالحة إلى NO_DATE"""
+    # التواريخ تتكرر كثيراً في السجل: نحلل كل قيمة مميزة مرة واحدة فقط
+    positions = {}
+    codes = np.fromiter(
+        (positions.setdefault(value, len(positions)) for value in values), dtype=np.int32
+    )
+    unique_days = np.array([parse_one_date(value) for value in positions], dtype="datetime64[D]")
+    result = unique_days.astype(np.int64)
+    result[np.isnat(unique_days)] = NO_DATE
+    return result.astype(np.int32)[codes] if len(codes) else np.zeros(0, dtype=np.int32)
+
+
+def parse_one_date(value):
+    """تحليل تاريخ واحد مع قبول الأشهر والأيام بدون أصفار بادئة"""
+    try:
+        year, month, day = (int(part) for part in str(value).split("-"))
+        return date(year, month, day)
+    except (ValueError, TypeError):
+        return "NaT"
+
+
+def add_months(years, months, days, offset_months):
+    """إضافة عدد من الأشهر لمصفوفات تاريخ مع قص اليوم لنهاية الشهر"""
+    month_index = (years - 1970) * 12 + (months - 1) + offset_months
+    month_start = month_index.astype("datetime64[M]").astype("datetime64[D]")
+    next_month_start = (month_index + 1).astype("datetime64[M]").astype("datetime64[D]")
+    month_length = (next_month_start - month_start).astype(np.int64)
+    return (month_start.astype(np.int64) + np.minimum(days, month_length) - 1).astype(np.int32)
+
+
+class Registry:
+    """السجل بصيغة عمودية: مصفوفة للأطفال ومصفوفة للجرعات"""
+
+    def __init__(self, child_ids, birth_dates, dose_child, dose_code, dose_index, dose_date, rejected=()):
+        self.child_ids = child_ids
+        self.birth = birth_dates
+        self.dose_child = dose_child
+        self.dose_code = dose_code
+        self.dose_index = dose_index
+        self.dose_date = dose_date
+        # جرعات لم تُحتسب لأن تاريخها غير صالح: (المعرف، التطعيم، الجرعة، التاريخ)
+        self.rejected = list(rejected)
+
+    def __len__(self):
+        return len(self.child_ids)
+
+
+class BatchEligibility:
+    """حساب الأهلية لجميع الأطفال وجميع التطعيمات دفعة واحدة"""
+
+    def __init__(self, rules, overdue_after_days=30):
+        self.codes = list(rules.vaccines)
+        self.code_index = {code: rule.index for code, rule in rules.vaccines.items()}
+        self.dose_labels = [rules.vaccines[code].doses for code in self.codes]
+        self.dose_counts = np.array([len(doses) for doses in self.dose_labels], dtype=np.int16)
+        self.intervals = np.array([rules.vaccines[code].interval for code in self.codes], dtype=np.int32)
+        self.min_age_months = np.array(
+            [rules.vaccines[code].min_age_months for code in self.codes], dtype=np.int32
+        )
+        self.conflicts = [
+            (self.code_index[code], self.code_index[other])
+            for code in self.codes
+            for other in rules.vaccines[code].conflicts
+            if other in self.code_index
+        ]
+        self.overdue_after_days = overdue_after_days
+        # نفس ساعة القواعد حتى تتفق قوائم الاستدعاء مع next_due (مثلاً مع fixed_clock)
+        self.today = rules.ages.today
+
+    def load(self, children):
+        """تحويل سجلات الأطفال إلى مصفوفات عمودية مع قائمة الجرعات المرفوضة"""
+        child_ids = []
+        birth_dates = []
+        dose_child = []
+        dose_code = []
+        dose_index = []
+        dose_dates = []
+        for position, child in enumerate(children):
+            child_ids.append(child.get("child_id", ""))
+            birth_dates.append(child.get("birth_date", ""))
+            for vaccination in child.get("vaccinations", []):
+                code = str(vaccination[1]).split(" - ")[0]
+                code_position = self.code_index.get(code)
+                if code_position is None:
+                    continue
+                labels = self.dose_labels[code_position]
+                dose_child.append(position)
+                dose_code.append(code_position)
+                dose_index.append(labels.index(vaccination[2]) if vaccination[2] in labels else -1)
+                dose_dates.append(vaccination[0])
+        parsed_dates = parse_dates(dose_dates)
+        rejected = [
+            (child_ids[dose_child[row]], self.codes[dose_code[row]], self.dose_label(dose_code[row], dose_index[row]),
+             dose_dates[row])
+            for row in np.flatnonzero(parsed_dates == NO_DATE).tolist()
+        ]
+        return Registry(
+            np.array(child_ids, dtype=object),
+            parse_dates(birth_dates),
+            np.array(dose_child, dtype=np.int32),
+            np.array(dose_code, dtype=np.int16),
+            np.array(dose_index, dtype=np.int16),
+            parsed_dates,
+            rejected,
+        )
+
+    def dose_label(self, code_position, dose_position):
+        labels = self.dose_labels[code_position]
+        return labels[dose_position] if dose_position >= 0 else ""
+
+    def evaluate(self, registry, today=None):
+        """مصفوفات (أطفال × تطعيمات): الجرعات المأخوذة، الجرعة التالية، تاريخ الاستحقاق، الحالة"""
+        today = np.datetime64(today or self.today(), "D").astype(np.int64)
+        n_children = len(registry)
+        n_vaccines = len(self.codes)
+
+        # الجرعات الصالحة فقط (تاريخ معروف وليس في المستقبل)
+        valid = (registry.dose_date != NO_DATE) & (registry.dose_date <= today)
+        flat = registry.dose_child[valid].astype(np.int64) * n_vaccines + registry.dose_code[valid]
+        # الجرعة المكررة في السجل تُحتسب مرة واحدة: أزواج (التطعيم، الجرعة) المميزة لكل طفل،
+        # والجرعة باسم غير معروف تتميز بتاريخها
+        dose_index = registry.dose_index[valid].astype(np.int64)
+        identity = np.where(dose_index >= 0, 0, registry.dose_date[valid])
+        distinct = np.unique(np.stack([flat, dose_index, identity]), axis=1)[0]
+        taken = np.bincount(distinct, minlength=n_children * n_vaccines).reshape(n_children, n_vaccines)
+        last_dose = np.full(n_children * n_vaccines, NO_DATE, dtype=np.int32)
+        np.maximum.at(last_dose, flat, registry.dose_date[valid])
+        last_dose = last_dose.reshape(n_children, n_vaccines)
+
+        # تاريخ بلوغ العمر الأدنى لكل تطعيم
+        birth = registry.birth.astype("datetime64[D]")
+        known_birth = registry.birth != NO_DATE
+        years = np.where(known_birth, birth.astype("datetime64[Y]").astype(np.int64) + 1970, 1970)
+        months = np.where(known_birth, birth.astype("datetime64[M]").astype(np.int64) % 12 + 1, 1)
+        days = np.where(known_birth, (birth - birth.astype("datetime64[M]")).astype(np.int64) + 1, 1)
+        age_date = add_months(
+            years[:, None], months[:, None], days[:, None], self.min_age_months[None, :]
+        )
+
+        # تاريخ انقضاء الفترة الدنيا منذ آخر جرعة
+        interval_date = np.where(
+            last_dose != NO_DATE, last_dose.astype(np.int64) + self.intervals[None, :], NO_DATE
+        )
+        due_date = np.maximum(age_date, interval_date).astype(np.int32)
+
+        status = np.full((n_children, n_vaccines), NOT_ELIGIBLE, dtype=np.int8)
+        status[due_date <= today] = DUE
+        status[due_date < today - self.overdue_after_days] = OVERDUE
+        for code_position, other_position in self.conflicts:
+            status[taken[:, other_position] > 0, code_position] = RESTRICTED
+        status[taken >= self.dose_counts[None, :]] = COMPLETE
+        status[~known_birth, :] = NOT_ELIGIBLE
+        due_date[~known_birth, :] = NO_DATE
+
+        return {
+            "taken": taken,
+            "next_dose": np.minimum(taken, self.dose_counts[None, :] - 1),
+            "due_date": due_date,
+            "status": status,
+        }
+
+    def recall_list(self, registry, result, statuses=(DUE, OVERDUE)):
+        """صفوف قائمة الاستدعاء مرتبة حسب تاريخ الاستحقاق"""
+        rows, cols = np.nonzero(np.isin(result["status"], statuses))
+        order = np.argsort(result["due_date"][rows, cols], kind="stable")
+        rows, cols = rows[order], cols[order]
+        # تحويل الأعمدة كاملة إلى نصوص بدلاً من كل خلية على حدة
+        max_doses = int(self.dose_counts.max())
+        label_table = np.array(
+            [labels + [""] * (max_doses - len(labels)) for labels in self.dose_labels], dtype=object
+        )
+        status_names = np.array([STATUS_NAMES[status] for status in sorted(STATUS_NAMES)], dtype=object)
+        # التواريخ المميزة قليلة مقارنة بعدد الصفوف
+        unique_dates, date_positions = np.unique(result["due_date"][rows, cols], return_inverse=True)
+        date_texts = unique_dates.astype("datetime64[D]").astype(str).astype(object)
+        return zip(
+            registry.child_ids[rows].tolist(),
+            np.array(self.codes, dtype=object)[cols].tolist(),
+            label_table[cols, result["next_dose"][rows, cols]].tolist(),
+            date_texts[date_positions].tolist(),
+            status_names[result["status"][rows, cols]].tolist(),
+        )
+
+    def write_recall_csv(self, children, output_file, today=None):
+        """إنتاج قائمة الاستدعاء الليلية في ملف CSV وإرجاع (عدد الصفوف، الجرعات المرفوضة)"""
+        registry = self.load(children)
+        result = self.evaluate(registry, today)
+        count = 0
+        with open(output_file, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["child_id", "التطعيم", "الجرعة", "تاريخ الاستحقاق", "الحالة"])
+            for row in self.recall_list(registry, result):
+                writer.writerow(row)
+                count += 1
+        return count, registry.rejected
@@ -0,0 +1,55 @@
+"""تحقق مؤجل من حقول النموذج أثناء الكتابة باستخدام قواعد validation.py"""
+from validation import validate_field
+
+# قيمة لم تُتحقق بعد
+UNCHECKED = object()
+
+
+class FormValidator:
+    """يجمع ضغطات المفاتيح ويتحقق بعد توقف الكتابة من الحقول التي تغيرت قيمتها فقط
+
+    fields: الحقل ← دالة تعيد قيمته الحالية من النموذج.
+    on_result(field, value, message) تُستدعى لكل حقل تغيرت قيمته (message فارغة إن كان صالحاً).
+    """
+
+    def __init__(self, widget, fields, on_result, delay_ms=250):
+        self.widget = widget
+        self.fields = fields
+        self.on_result = on_result
+        self.delay_ms = delay_ms
+        self.dirty = set()
+        self.checked = {}
+        self.errors = {}
+        self.job = None
+
+    def changed(self, field):
+        """تسجيل تغيير حقل وتأجيل التحقق حتى تتوقف الكتابة"""
+        self.dirty.add(field)
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+        self.job = self.widget.after(self.delay_ms, self.flush)
+
+    def flush(self):
+        """التحقق الآن من الحقول المعلقة (مثلاً عند مغادرة الحقل أو قبل الحفظ)"""
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+        dirty, self.dirty = self.dirty, set()
+        for field in dirty:
+            value = self.fields[field]()
+            if self.checked.get(field, UNCHECKED) == value:
+                continue
+            self.checked[field] = value
+            message = validate_field(field, value)
+            if message:
+                self.errors[field] = message
+            else:
+                self.errors.pop(field, None)
+            self.on_result(field, value, message)
+        return self.errors
+
+    def revalidate(self):
+        """إعادة التحقق من جميع الحقول (بعد تحميل سجل أو تفريغ النموذج)"""
+        self.checked = {}
+        self.dirty = set(self.fields)
+        return self.flush()
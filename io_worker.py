@@ -0,0 +1,112 @@
+"""تنفيذ عمليات القرص والبحث في خيط خلفي حتى لا تتجمد الواجهة"""
+import queue
+import threading
+
+
+class Task:
+    """عملية واحدة مع دوال الاستدعاء بعد انتهائها"""
+
+    def __init__(self, fn, args, key):
+        self.fn = fn
+        self.args = args
+        self.key = key
+        self.callbacks = []
+        self.error_callbacks = []
+        self.result = None
+        self.error = None
+
+
+class IOExecutor:
+    """خيط عامل واحد بترتيب FIFO، يدمج الطلبات المكررة ويعيد النتائج عبر window.after
+
+    الطلبات التي تحمل نفس المفتاح (مثل حفظ نفس الطفل) تُدمج إن لم يبدأ تنفيذها
+    بعد: تُنفَّذ آخر نسخة مرة واحدة وتُستدعى دوال آخر طلب فقط (دوال الطلبات السابقة
+    تخص بيانات استُبدلت).
+    """
+
+    def __init__(self, window, on_busy_change=None, poll_ms=50):
+        self.window = window
+        self.on_busy_change = on_busy_change
+        self.poll_ms = poll_ms
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.polling = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None):
+        """جدولة عملية في الخيط الخلفي"""
+        with self.lock:
+            task = self.pending.get(key) if key is not None else None
+            if task is not None:
+                # طلب مكرر لم يبدأ بعد: نستبدل بياناته ودواله بالأحدث
+                task.fn = fn
+                task.args = args
+                task.callbacks = []
+                task.error_callbacks = []
+            else:
+                task = Task(fn, args, key)
+                if key is not None:
+                    self.pending[key] = task
+                self.tasks.put(task)
+                self.outstanding += 1
+            if on_done:
+                task.callbacks.append(on_done)
+            if on_error:
+                task.error_callbacks.append(on_error)
+        self.notify_busy()
+        self.schedule_poll()
+
+    def run(self):
+        """حلقة الخيط العامل"""
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            with self.lock:
+                if task.key is not None and self.pending.get(task.key) is task:
+                    del self.pending[task.key]
+                fn, args = task.fn, task.args
+            try:
+                task.result = fn(*args)
+            except Exception as e:  # تُعاد الأخطاء للواجهة بدلاً من إيقاف الخيط
+                task.error = e
+            self.results.put(task)
+
+    def schedule_poll(self):
+        if not self.polling:
+            self.polling = True
+            self.window.after(self.poll_ms, self.poll)
+
+    def poll(self):
+        """تسليم النتائج إلى دوال الاستدعاء على خيط الواجهة"""
+        self.polling = False
+        while True:
+            try:
+                task = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.outstanding -= 1
+            if task.error is not None:
+                for callback in task.error_callbacks:
+                    callback(task.error)
+                if not task.error_callbacks:
+                    self.window.report_callback_exception(type(task.error), task.error, task.error.__traceback__)
+            else:
+                for callback in task.callbacks:
+                    callback(task.result)
+        self.notify_busy()
+        if self.outstanding:
+            self.schedule_poll()
+
+    def notify_busy(self):
+        if self.on_busy_change:
+            self.on_busy_change(self.outstanding)
+
+    def shutdown(self):
+        """انتظار انتهاء جميع العمليات المعلقة (مثل الحفظ) قبل الإغلاق"""
+        self.tasks.put(None)
+        self.thread.join()
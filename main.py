@@ -1,15 +1,69 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from datetime import datetime, timedelta
+import gc
 import json
 import os
-import re
+import socket
+import sys
+import time
+import uuid
+
+from storage import ConflictError, RecordStore, gc_paused
+from sqlite_store import SQLiteStore, migrate_json
+from search_index import NameIndex
+from rules import DoseIndex, parse_date
+from schedules import ScheduleError, ScheduleRules, write_schedule_template
+from io_worker import IOExecutor
+from campaign import CampaignSession
+from due_index import DueIndex
+from coverage import DIMENSIONS, CoverageRollup
+from spreadsheet import write_table
+from pdf_cards import render_cards
+from diagnostics import Metrics, enabled_by
+from dedup import REASON_LABELS, LinkageEngine, mark_distinct, merge_duplicate
+from sync import SyncJournal, SyncedStore
+from virtual_table import ListSource, RegistrySource, VirtualTreeview
+from validation import is_valid_date
+from form_validator import FormValidator
+
+# بداية التشغيل لقياس زمن الجاهزية (ظهور النافذة واكتمال تحميل البيانات)
+STARTED_AT = time.perf_counter()
+
+# الدوال المقاسة عند تفعيل التشخيص
+UI_TIMED_METHODS = [
+    "validate_phone", "validate_national_id", "validate_passport", "to_uppercase",
+    "update_age_category_auto", "on_field_validated", "load_child_into_form", "collect_child_data",
+    "calculate_age_category", "calculate_exact_age",
+]
+RULES_TIMED_METHODS = ["due_vaccines", "next_due", "check_vaccine_interval", "check_vaccine_restrictions"]
+# فحص ملفات جدول التطعيمات أثناء التشغيل (ملي ثانية)
+SCHEDULE_POLL_MS = 60000
+STORE_TIMED_METHODS = [
+    "load_all", "get", "find", "page", "save", "save_many", "put_many", "replace_all", "delete",
+    "refresh", "read_snapshot", "tail_log", "compact",
+]
 
 class VaccinationSystem:
     def __init__(self):
         self.window = None
         self.current_child_data = {}
+        # آخر سجل حفظته هذه الجلسة لكل طفل (يُقرأ ويُكتب في الخيط الخلفي فقط)
+        self.own_saves = {}
+        # جرعات الطفل المعروض (مصدر جدول التطعيمات) وفهرسها
+        self.vaccine_rows = ListSource()
+        self.dose_index = DoseIndex()
         self.data_file = "children_data.json"
+        self.settings_file = "settings.json"
+        self.settings = self.load_settings()
+        self.metrics = Metrics(enabled_by(self.settings))
+        self.store = None
+        self.name_index = NameIndex()
+        # عمليات القرص تعمل في خيط خلفي بعد إنشاء النافذة
+        self.io = None
+        self.data_ready = False
+        self.interactive_seconds = None
+        # نافذة إضافة التطعيم تُنشأ عند أول استخدام ثم تُخفى وتُعاد
         self.add_vaccination_window = None
         
         # الخطوط
@@ -25,260 +79,391 @@ class VaccinationSystem:
             "قطري", "كويتي", "عماني", "بحريني", "عراقي", "أخرى"
         ]
         
-        # الفئات العمرية (محدثة)
-        self.age_categories = [
-            "حديثي الولادة",
-            "عمر الشهرين", 
-            "عمر 4 أشهر",
-            "عمر 6 أشهر",
-            "عمر 9 أشهر",
-            "عمر 12 شهر",
-            "عمر 15 شهر", 
-            "عمر 18 شهر",
-            "عمر 6 سنوات",
-            "عمر 12 سنة",
-            "عمر 15 سنة",
-            "تعويضي",
-            "منشطة"
-        ]
-        
-        # جميع التطعيمات المتاحة للتعويض
-        self.all_vaccines = {
-            "B.C.G": {"name": "بي سي جي", "doses": ["جرعة وحيدة"]},
-            "O.P.V": {"name": "شلل الأطفال الفموي", "doses": ["الجرعة الأولى", "الجرعة الثانية", "الجرعة الثالثة", "جرعة منشطة"]},
-            "Hep.B": {"name": "الالتهاب الكبدي البائي", "doses": ["الجرعة الأولى", "الجرعة الثانية", "الجرعة الثالثة"]},
-            "HEXA": {"name": "السداسي", "doses": ["الجرعة الأولى", "الجرعة الثانية", "الجرعة الثالثة", "جرعة منشطة"]},
-            "ROTA": {"name": "الروتا", "doses": ["الجرعة الأولى", "الجرعة الثانية", "الجرعة الثالثة"]},
-            "PCV.13": {"name": "الالتهاب الرئوي 13", "doses": ["الجرعة الأولى", "الجرعة الثانية", "جرعة منشطة"]},
-            "MENG.A+CY+W135": {"name": "التهاب السحائي الرباعي", "doses": ["الجرعة الأولى", "الجرعة الثانية", "جرعة منشطة"]},
-            "M.M.R": {"name": "المركب الفيروسي", "doses": ["الجرعة الأولى", "الجرعة الثانية", "الجرعة الثالثة"]},
-            "Hep A": {"name": "الالتهاب الكبدي الألفي", "doses": ["الجرعة الأولى", "الجرعة الثانية"]},
-            "Chicken pox": {"name": "الجديري المائي", "doses": ["الجرعة الأولى"]},
-            "PENTA": {"name": "الخماسي", "doses": ["جرعة منشطة"]},
-            "TETRA": {"name": "الثلاثي البكتيري + شلل الأطفال بالحقن", "doses": ["جرعة منشطة"]},
-            "HPV": {"name": "الورم الحليمي (للبنات فقط)", "doses": ["الجرعة الأولى", "الجرعة الثانية", "الجرعة الثالثة"]},
-            "Tdap": {"name": "الثلاثي البكتيري", "doses": ["جرعة منشطة"]}
-        }
-        
-        # الفترات الزمنية الدنيا بين الجرعات (بالأيام)
-        self.vaccine_intervals = {
-            "ROTA": 28,    # 28 يوم بين الجرعات
-            "MENG.A+CY+W135": 90,  # 90 يوم بين الجرعات
-            "M.M.R": 120,   # 120 يوم بين الجرعات
-            "HPV": 30,     # 30 يوم بين الجرعات
-            "Hep A": 180,   # 180 يوم بين الجرعات
-            "Hep.B": 30,    # 30 يوم بين الجرعات
-            "default": 21   # 21 يوم كحد أدنى للتطعيمات الأخرى
-        }
-        
-        # القيود الخاصة (Chicken pox و M.M.R لا يعطيان معاً)
-        self.vaccine_restrictions = {
-            "Chicken pox": ["M.M.R"],
-            "M.M.R": ["Chicken pox"]
+        # الفئات العمرية: حدود الإصدار الساري من جدول التطعيمات مع الفئتين الخاصتين
+        # (تُملأ في reload_schedules)
+        self.age_categories = []
+        
+        # قواعد الجدولة بإصداراتها من مجلد الجداول (بدون واجهة)
+        self.rules = ScheduleRules(self.settings["schedules_dir"])
+        self.schedule_error = None
+        # الجداول المشتقة من الإصدار الساري اليوم (تُملأ في reload_schedules)
+        self.all_vaccines = None
+        
+        # تقويم المواعيد يُبنى عند أول فتح لنافذة المواعيد
+        self.due_index = DueIndex(self.rules)
+        self.due_ready = False
+        # جداول تجميع التغطية تُبنى عند أول فتح لنافذة التقارير
+        self.coverage = CoverageRollup(self.rules, self.nationalities)
+        self.coverage_ready = False
+        self.reload_schedules()
+        
+        # القياس يغلّف الدوال قبل ربطها بأحداث لوحة المفاتيح
+        self.metrics.instrument(self, UI_TIMED_METHODS, "ui.")
+        self.metrics.instrument(self.rules, RULES_TIMED_METHODS, "rules.")
+        # فتح المخزن يشمل قراءة ملف JSON وتطبيق سجل التغييرات
+        self.metrics.instrument(self, ["open_store", "initialize_data_file"], "startup.")
+    
+    def load_settings(self):
+        """تحميل الإعدادات من settings.json مع القيم الافتراضية"""
+        settings = {
+            "storage_backend": "json",  # json أو sqlite
+            "sqlite_file": "children_data.db",
+            # وضع سجل SQLite لقاعدة البيانات وسجل المزامنة: WAL أسرع لكنه لا يعمل إلا إن كانت
+            # الملفات على هذا الجهاز؛ DELETE آمن عندما تكون في مجلد مشترك عبر الشبكة
+            "sqlite_journal_mode": "DELETE",
+            # اسم محطة العمل عند مشاركة مجلد البيانات (افتراضياً اسم الجهاز)
+            "site_id": "",
+            # خادم HTTP المحلي (python main.py serve)
+            "api_host": "127.0.0.1",
+            "api_port": 8765,
+            "api_pool_size": 8,
+            # خط TrueType يدعم العربية لبطاقات PDF (فارغ: أول خط متاح من خطوط النظام)
+            "pdf_font": "",
+            # قياس أزمنة العمليات (أو متغير البيئة VACCINATION_DIAGNOSTICS=1)، ونافذته Ctrl+Shift+D
+            "diagnostics": False,
+            # مزامنة المراكز بحزم فروقات (سجل التغييرات بجانب ملف البيانات إن ترك sync_journal فارغاً،
+            # فتشترك فيه محطات المجلد الواحد؛ يُفتح بوضع sqlite_journal_mode)
+            "sync_enabled": False,
+            "sync_journal": "",
+            # ملفات إصدارات جدول التطعيمات (تُعاد قراءتها عند تعديلها دون إعادة التشغيل)
+            "schedules_dir": "schedules",
         }
-        
-        self.initialize_data_file()
+        if os.path.exists(self.settings_file):
+            with open(self.settings_file, 'r', encoding='utf-8') as f:
+                settings.update(json.load(f))
+        return settings
+    
+    def open_store(self):
+        """فتح مخزن البيانات حسب الإعدادات"""
+        if self.settings["storage_backend"] == "sqlite":
+            store = SQLiteStore(self.settings["sqlite_file"], self.settings["sqlite_journal_mode"])
+            data_path = self.settings["sqlite_file"]
+        else:
+            # ينشئ الملف إن لم يكن موجوداً ويعيد تطبيق سجل التغييرات
+            store = RecordStore(self.data_file, writer_id=self.settings["site_id"] or None)
+            data_path = self.data_file
+        if not self.settings["sync_enabled"]:
+            return store
+        journal = SyncJournal(self.settings["sync_journal"] or data_path + ".sync.db",
+                              self.settings["site_id"] or socket.gethostname(),
+                              self.settings["sqlite_journal_mode"])
+        return SyncedStore(store, journal)
     
     def initialize_data_file(self):
         """تهيئة ملف البيانات"""
-        if not os.path.exists(self.data_file):
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump([], f)
+        self.store = self.open_store()
+        if isinstance(self.store, SyncedStore):
+            # السجلات الموجودة قبل تفعيل المزامنة تُسجل مرة واحدة
+            self.store.journal.initialize(self.store.store)
+        self.metrics.instrument(self.store, STORE_TIMED_METHODS, "store.")
+        with gc_paused():
+            self.name_index.build(self.store.iter_children())
+        # السجلات والفهارس تبقى طوال الجلسة: إخراجها من فحص جامع الدورات يقصر توقفاته
+        gc.freeze()
+    
+    def on_window_ready(self):
+        """أول لحظة تستجيب فيها النافذة الرئيسية للمستخدم"""
+        self.interactive_seconds = time.perf_counter() - STARTED_AT
+        self.metrics.record("startup.interactive", self.interactive_seconds)
+    
+    def on_data_loaded(self, result=None):
+        """بعد انتهاء تحميل البيانات في الخيط الخلفي"""
+        self.data_ready = True
+        ready_seconds = time.perf_counter() - STARTED_AT
+        self.metrics.record("startup.data_ready", ready_seconds)
+        timing = f"البيانات خلال {ready_seconds:.1f} ث"
+        if self.interactive_seconds is not None:
+            timing = f"الواجهة خلال {self.interactive_seconds:.1f} ث، " + timing
+        self.set_status(f"تم تحميل {len(self.store)} سجل ({timing})")
+    
+    def require_data_ready(self):
+        """منع العمليات التي تحتاج البيانات قبل اكتمال تحميلها"""
+        if not self.data_ready:
+            messagebox.showinfo("انتظار", "جاري تحميل البيانات، يرجى الانتظار")
+            return False
+        return True
+    
+    def on_io_busy(self, outstanding):
+        """تشغيل مؤشر التقدم في شريط التحكم أثناء عمليات الخلفية"""
+        if outstanding:
+            if not self.io_busy:
+                self.io_progress.start(15)
+                self.io_busy = True
+        elif self.io_busy:
+            self.io_progress.stop()
+            self.io_busy = False
+    
+    def reload_schedules(self):
+        """إعادة تحميل ملفات جدول التطعيمات إن تغيرت؛ يعيد True إن تغير الإصدار الساري"""
+        try:
+            changed = self.rules.reload_if_changed()
+        except ScheduleError as error:
+            self.schedule_error = str(error)
+            return False
+        # الإصدار الساري يتغير أيضاً عند بلوغ تاريخ بدء إصدار جديد
+        if not changed and self.all_vaccines is self.rules.all_vaccines:
+            return False
+        current = self.rules.current
+        self.all_vaccines = current.all_vaccines
+        self.vaccine_intervals = current.vaccine_intervals
+        self.compensation_schedule = current.compensation_schedule
+        self.vaccine_restrictions = current.vaccine_restrictions
+        self.age_categories = current.age_categories + ["تعويضي", "منشطة"]
+        if getattr(self, "age_category_combo", None) is not None:
+            self.age_category_combo['values'] = self.age_categories
+        # المواعيد والتغطية محسوبة بالقواعد السابقة: تُبنى من جديد عند فتح نوافذها
+        self.due_ready = False
+        self.coverage_ready = False
+        return True
+    
+    def poll_schedules(self):
+        """فحص دوري لملفات جدول التطعيمات أثناء التشغيل"""
+        if self.reload_schedules():
+            self.set_status(f"تم تحميل جدول التطعيمات (الإصدار {self.rules.version})")
+        if self.schedule_error:
+            messagebox.showwarning("جدول التطعيمات", f"{self.schedule_error}\n\nسيستمر العمل بالإصدار السابق.")
+            self.schedule_error = None
+        self.window.after(SCHEDULE_POLL_MS, self.poll_schedules)
+    
+    def on_io_error(self, error):
+        """عرض أخطاء عمليات الخلفية"""
+        self.set_status("فشلت العملية")
+        messagebox.showerror("خطأ", f"حدث خطأ أثناء الوصول إلى البيانات: {error}")
+    
+    def set_status(self, text):
+        """نص الحالة بجانب مؤشر التقدم"""
+        self.io_status_label.config(text=text)
     
     def load_data(self):
         """تحميل البيانات"""
-        try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
+        return self.store.load_all()
     
     def save_data(self, data):
         """حفظ البيانات"""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # تُكتب السجلات المتغيرة فقط في سجل التغييرات
+        self.store.replace_all(data)
+        self.name_index.build(self.store.load_all())
+    
+    def collect_child_data(self):
+        """جمع بيانات الطفل من النموذج"""
+        day = self.entry_day.get()
+        month = self.entry_month.get()
+        year = self.entry_year.get()
+        birth_date = ""
+        if day and month and year and self.validate_date(day, month, year):
+            birth_date = f"{int(year):04d}-{int(month):02d}-{int(day):02d}"
+        
+        child = dict(self.current_child_data)
+        child.update({
+            "entry_name": self.entry_name.get().strip(),
+            "entry_father_name": self.entry_father_name.get().strip(),
+            "entry_grandfather_name": self.entry_grandfather_name.get().strip(),
+            "entry_surname": self.entry_surname.get().strip(),
+            "entry_mother_name": self.entry_mother_name.get().strip(),
+            "birth_date": birth_date,
+            "gender": self.gender_var.get(),
+            "nationality": self.nationality_combo.get(),
+            "entry_passport": self.entry_passport.get().strip(),
+            "entry_phone": self.entry_phone.get().strip(),
+            "entry_national_id": self.entry_national_id.get().strip(),
+            "entry_family_paper": self.entry_family_paper.get().strip(),
+            "entry_registration_no": self.entry_registration_no.get().strip(),
+            "age_category": self.age_category_combo.get(),
+            "vaccinations": self.get_table_vaccinations(),
+        })
+        return child
+    
+    def load_child_into_form(self, child):
+        """عرض بيانات طفل محفوظ في النموذج"""
+        self.current_child_data = child
+        
+        self.nationality_combo.set(child.get("nationality") or "ليبي")
+        # تفعيل الحقول قبل الكتابة فيها ثم ضبط حالتها حسب الجنسية
+        for field in ("entry_national_id", "entry_family_paper", "entry_registration_no"):
+            getattr(self, field).config(state="normal")
+        
+        for field in ("entry_name", "entry_father_name", "entry_grandfather_name", "entry_surname",
+                      "entry_mother_name", "entry_passport", "entry_phone", "entry_national_id",
+                      "entry_family_paper", "entry_registration_no"):
+            entry = getattr(self, field)
+            entry.delete(0, tk.END)
+            entry.insert(0, child.get(field, ""))
+        self.on_nationality_change(None)
+        
+        for entry in (self.entry_day, self.entry_month, self.entry_year):
+            entry.delete(0, tk.END)
+        if child.get("birth_date"):
+            year, month, day = child["birth_date"].split("-")
+            self.entry_day.insert(0, day)
+            self.entry_month.insert(0, month)
+            self.entry_year.insert(0, year)
+        # يحسب العمر والفئة ويزيل تمييز أخطاء السجل السابق
+        self.form_validator.revalidate()
+        
+        self.gender_var.set(child.get("gender") or "ذكر")
+        if child.get("age_category"):
+            self.age_category_combo.set(child["age_category"])
+        
+        self.vaccine_rows.set_rows(child.get("vaccinations", []))
+        self.vaccine_table.refresh(keep_position=False)
+        self.dose_index = DoseIndex(child.get("vaccinations", []))
+    
+    def save_child(self):
+        """حفظ بيانات الطفل الحالي"""
+        if not self.entry_name.get().strip():
+            messagebox.showwarning("تحذير", "يرجى إدخال اسم الطفل أولاً")
+            return
+        
+        self.form_validator.flush()
+        if self.field_errors:
+            messagebox.showwarning("تحذير", "يرجى تصحيح الحقول التالية:\n" + "\n".join(self.field_errors.values()))
+            return
+        
+        # السجل كما حُمّل من المخزن: يُقارن إصداره عند الحفظ لكشف تعديلات المستخدمين الآخرين
+        base = self.current_child_data
+        child = self.collect_child_data()
+        if not child.get("child_id"):
+            # معرف ثابت قبل الحفظ حتى تُدمج النقرات المتكررة على "حفظ البيانات"
+            child["child_id"] = uuid.uuid4().hex
+            self.current_child_data = {"child_id": child["child_id"]}
+            base = {}
+        self.set_status("جاري الحفظ...")
+        self.io.submit(self.save_in_background, child, base, key=("save", child["child_id"]),
+                       on_done=lambda saved: self.on_child_saved(child, saved),
+                       on_error=self.on_save_error)
+    
+    def save_in_background(self, child, base):
+        """الحفظ في الخيط الخلفي مع البدء من آخر حفظ لهذه الجلسة إن كان أحدث من base
+
+        النقرة الثانية على "حفظ البيانات" قبل وصول نتيجة الأولى تحمل base القديم،
+        بينما النموذج يحتوي تعديلات الحفظ الأول: نبدأ منه حتى لا تُعد تعارضاً مع النفس.
+        """
+        own = self.own_saves.get(child["child_id"])
+        if own is not None and own["version"] > base.get("version", 0):
+            base = own
+        saved = self.store.save(child, base)
+        self.own_saves[child["child_id"]] = saved
+        return saved
+    
+    def on_child_saved(self, child, saved):
+        """بعد اكتمال الحفظ في الخيط الخلفي"""
+        self.name_index.update(saved)
+        self.update_child_indexes(saved)
+        if self.current_child_data.get("child_id") == saved["child_id"]:
+            self.current_child_data = saved
+            if {**child, "version": saved["version"]} != saved:
+                # دُمجت تعديلات مستخدم آخر: عرض السجل بعد الدمج
+                self.load_child_into_form(saved)
+                self.set_status("تم الحفظ مع دمج تعديلات مستخدم آخر")
+                return
+        self.set_status("تم حفظ البيانات بنجاح")
+    
+    def update_child_indexes(self, child):
+        """تحديث تقويم المواعيد وجداول التغطية بعد حفظ طفل (إن كانت قد بُنيت)"""
+        if self.due_ready:
+            self.due_index.update(child)
+        if self.coverage_ready:
+            self.coverage.update(child)
+    
+    def remove_child_indexes(self, child_id):
+        """إزالة طفل محذوف من فهرس الأسماء والتقويم وجداول التغطية"""
+        self.name_index.remove(child_id)
+        if self.due_ready:
+            self.due_index.remove(child_id)
+        if self.coverage_ready:
+            self.coverage.remove(child_id)
+    
+    def on_save_error(self, error):
+        """تعارض الحفظ مع تعديل مستخدم آخر على نفس الحقول"""
+        if not isinstance(error, ConflictError):
+            self.on_io_error(error)
+            return
+        self.set_status("لم يتم الحفظ بسبب تعارض")
+        if messagebox.askyesno("تعارض في البيانات",
+                               f"{error}\n\nهل تريد تحميل النسخة الحالية من السجل؟ ستفقد تعديلاتك غير المحفوظة."):
+            self.load_child_into_form(error.current)
     
     def validate_date(self, day, month, year):
         """التحقق من صحة التاريخ"""
-        try:
-            day = int(day)
-            month = int(month)
-            year = int(year)
-            datetime(year, month, day)
-            return True
-        except:
-            return False
+        return is_valid_date(day, month, year)
     
     def calculate_exact_age(self, birth_date):
         """حساب العمر بالضبط (سنة، شهر، يوم)"""
-        try:
-            birth = datetime.strptime(birth_date, "%Y-%m-%d")
-            today = datetime.now()
-            
-            # حساب الفرق
-            years = today.year - birth.year
-            months = today.month - birth.month
-            days = today.day - birth.day
-            
-            # تعديل إذا كانت الأيام سالبة
-            if days < 0:
-                months -= 1
-                # حساب أيام الشهر السابق
-                prev_month = today.month - 1 if today.month > 1 else 12
-                prev_year = today.year if today.month > 1 else today.year - 1
-                days_in_prev_month = (datetime(prev_year, prev_month + 1, 1) - timedelta(days=1)).day
-                days = days_in_prev_month - birth.day + today.day
-            
-            # تعديل إذا كانت الأشهر سالبة
-            if months < 0:
-                years -= 1
-                months += 12
-            
-            return years, months, days
-        except:
-            return 0, 0, 0
+        return self.rules.calculate_exact_age(birth_date)
     
     def calculate_age_category(self, birth_date):
         """حساب الفئة العمرية (مصحح)"""
-        try:
-            years, months, days = self.calculate_exact_age(birth_date)
-            total_months = years * 12 + months
-            
-            if total_months < 2:  # أقل من شهرين
-                return "حديثي الولادة"
-            elif total_months < 4:  # أقل من 4 أشهر
-                return "عمر الشهرين"
-            elif total_months < 6:  # أقل من 6 أشهر
-                return "عمر 4 أشهر"
-            elif total_months < 9:  # أقل من 9 أشهر
-                return "عمر 6 أشهر"
-            elif total_months < 12:  # أقل من 12 شهر
-                return "عمر 9 أشهر"
-            elif total_months < 15:  # أقل من 15 شهر
-                return "عمر 12 شهر"
-            elif total_months < 18:  # أقل من 18 شهر
-                return "عمر 15 شهر"
-            elif total_months < 24:  # أقل من سنتين
-                return "عمر 18 شهر"
-            elif total_months < 72:  # أقل من 6 سنوات
-                return "عمر 6 سنوات"
-            elif total_months < 144:  # أقل من 12 سنة
-                return "عمر 12 سنة"
-            else:
-                return "عمر 15 سنة"
-        except:
-            return "غير محدد"
+        return self.rules.calculate_age_category(birth_date)
     
     def get_compensation_vaccines(self, child_age_months):
         """الحصول على التطعيمات المناسبة للتعويض بناءً على العمر"""
-        compensation_vaccines = []
-        
-        # تحديد التطعيمات المناسبة للعمر
-        if child_age_months >= 0:  # جميع الأعمار
-            compensation_vaccines.extend(["B.C.G", "O.P.V", "Hep.B"])
-        
-        if child_age_months >= 2:  # عمر شهرين فما فوق
-            compensation_vaccines.extend(["HEXA", "ROTA", "PCV.13"])
-        
-        if child_age_months >= 9:  # عمر 9 أشهر فما فوق
-            compensation_vaccines.append("MENG.A+CY+W135")
-        
-        if child_age_months >= 12:  # عمر 12 شهر فما فوق
-            compensation_vaccines.extend(["M.M.R", "Hep A", "Chicken pox"])
-        
-        if child_age_months >= 18:  # عمر 18 شهر فما فوق
-            compensation_vaccines.append("PENTA")
-        
-        if child_age_months >= 72:  # عمر 6 سنوات فما فوق
-            compensation_vaccines.append("TETRA")
-        
-        if child_age_months >= 144:  # عمر 12 سنة فما فوق
-            compensation_vaccines.extend(["HPV", "Tdap"])
-        
-        return compensation_vaccines
+        return self.rules.get_compensation_vaccines(child_age_months)
     
-    def check_vaccine_interval(self, vaccine_code, dose, last_vaccination_date):
-        """التحقق من الفترة الزمنية بين الجرعات"""
-        if not last_vaccination_date:
-            return True, "يمكن إعطاء الجرعة الأولى"
-        
-        try:
-            last_date = datetime.strptime(last_vaccination_date, "%Y-%m-%d")
-            today = datetime.now()
-            days_passed = (today - last_date).days
-            
-            # الحصول على الفترة المطلوبة
-            required_interval = self.vaccine_intervals.get(vaccine_code, self.vaccine_intervals["default"])
-            
-            if days_passed >= required_interval:
-                return True, f"مرت {days_passed} يوم - يمكن إعطاء الجرعة"
-            else:
-                days_remaining = required_interval - days_passed
-                return False, f"لم تمر الفترة الكافية. باقي {days_remaining} يوم"
-                
-        except:
-            return True, "غير معروف - يمكن المحاولة"
-    
-    def check_vaccine_restrictions(self, selected_vaccine, existing_vaccines):
-        """التحقق من القيود الخاصة بين التطعيمات"""
-        if selected_vaccine in self.vaccine_restrictions:
-            restricted_vaccines = self.vaccine_restrictions[selected_vaccine]
-            for vaccine in existing_vaccines:
-                if vaccine in restricted_vaccines:
-                    return False, f"{selected_vaccine} لا يمكن إعطاؤه مع {vaccine}"
-        return True, "لا توجد قيود"
+    def check_vaccine_interval(self, vaccine_code, dose, last_vaccination_date, dose_date=None):
+        """التحقق من الفترة الزمنية بين الجرعات (بقواعد الإصدار الساري في تاريخ الجرعة)"""
+        return self.rules.check_vaccine_interval(vaccine_code, dose, last_vaccination_date, dose_date)
+    
+    def check_vaccine_restrictions(self, selected_vaccine, existing_vaccines, dose_date=None):
+        """التحقق من القيود الخاصة بين التطعيمات (بقواعد الإصدار الساري في تاريخ الجرعة)"""
+        return self.rules.check_vaccine_restrictions(selected_vaccine, existing_vaccines, dose_date)
+    
+    def get_table_vaccinations(self):
+        """الجرعات المعروضة في الجدول كقوائم نصية"""
+        return [[str(value) for value in row] for row in self.vaccine_rows.rows]
     
     def get_last_vaccination_date(self, vaccine_code):
         """الحصول على تاريخ آخر جرعة للتطعيم المحدد"""
-        last_date = None
-        for item in self.vaccine_table.get_children():
-            values = self.vaccine_table.item(item)["values"]
-            vaccine_type = values[1]
-            if vaccine_code in vaccine_type:
-                if last_date is None or values[0] > last_date:
-                    last_date = values[0]
-        return last_date
+        return self.dose_index.last_date(vaccine_code)
     
     def to_uppercase(self, event):
         """تحويل النص إلى أحرف كبيرة"""
         widget = event.widget
         current_text = widget.get()
-        widget.delete(0, tk.END)
-        widget.insert(0, current_text.upper())
+        # لا يُعاد كتابة الحقل إلا إذا احتوى أحرفاً صغيرة، مع إبقاء المؤشر في مكانه
+        upper_text = current_text.upper()
+        if upper_text != current_text:
+            cursor = widget.index(tk.INSERT)
+            widget.delete(0, tk.END)
+            widget.insert(0, upper_text)
+            widget.icursor(cursor)
     
     def validate_phone(self, event):
-        """التحقق من رقم الهاتف (أرقام فقط)"""
-        widget = event.widget
-        current_text = widget.get()
-        if not current_text.isdigit() and current_text != "":
-            widget.delete(0, tk.END)
-            widget.insert(0, re.sub(r'[^\d]', '', current_text))
-            messagebox.showwarning("تحذير", "رقم الهاتف يجب أن يحتوي على أرقام فقط")
+        """التحقق من رقم الهاتف (أرقام فقط) بعد توقف الكتابة"""
+        self.form_validator.changed("entry_phone")
     
     def validate_national_id(self, event):
-        """التحقق من الرقم الوطني"""
-        widget = event.widget
-        current_text = widget.get()
-        
-        if current_text == "":
-            widget.config(fg="black")
-            return
-        
-        if not current_text.isdigit() or len(current_text) != 12:
-            widget.config(fg="red")
-        else:
-            widget.config(fg="black")
+        """التحقق من الرقم الوطني بعد توقف الكتابة"""
+        self.form_validator.changed("entry_national_id")
     
     def validate_passport(self, event):
-        """التحقق من جواز السفر (إنجليزي فقط)"""
-        widget = event.widget
-        current_text = widget.get()
-        
-        # التحقق من أن النص إنجليزي فقط
-        if current_text and not re.match("^[A-Z0-9]*$", current_text):
-            widget.delete(0, tk.END)
-            widget.insert(0, re.sub(r'[^A-Z0-9]', '', current_text.upper()))
-            messagebox.showwarning("تحذير", "جواز السفر يجب أن يحتوي على أحرف إنجليزية وأرقام فقط")
+        """التحقق من جواز السفر (إنجليزي فقط) بعد توقف الكتابة"""
+        self.form_validator.changed("entry_passport")
+    
+    def on_birth_date_key(self, event):
+        """إعادة حساب العمر والفئة بعد توقف الكتابة في حقول التاريخ"""
+        self.form_validator.changed("birth_date")
+    
+    def birth_date_text(self):
+        """تاريخ الميلاد من الحقول الثلاثة، أو فارغ إن لم تكتمل بعد"""
+        day, month, year = self.entry_day.get().strip(), self.entry_month.get().strip(), self.entry_year.get().strip()
+        if not (day and month and year):
+            return ""
+        if day.isdigit() and month.isdigit() and year.isdigit():
+            return f"{int(year):04d}-{int(month):02d}-{int(day):02d}"
+        return f"{year}-{month}-{day}"
+    
+    def on_field_validated(self, field, value, message):
+        """تمييز الحقل غير الصالح في النموذج بدون نوافذ حاجبة"""
+        # الحقول الفارغة لا تُميّز أثناء الإدخال (الإلزامي منها يُفحص عند الحفظ)
+        if message and value:
+            self.field_errors[field] = message
+        else:
+            self.field_errors.pop(field, None)
+        for widget in self.validated_widgets[field]:
+            widget.config(fg="red" if field in self.field_errors else "black")
+        self.validation_label.config(text=" - ".join(self.field_errors.values()))
+        if field == "birth_date":
+            self.update_age_category_auto()
     
     def on_nationality_change(self, event):
         """تغيير حالة الحقول بناءً على الجنسية"""
@@ -373,8 +558,21 @@ class VaccinationSystem:
         
         # أزرار التحكم
         self.create_control_buttons(main_container)
+        self.metrics.instrument(self.vaccine_table, ["refresh"], "table.")
+        # نافذة التشخيص مخفية عن المستخدم العادي
+        self.window.bind('<Control-Shift-KeyPress-D>', lambda event: self.diagnostics_window())
+        
+        self.io = IOExecutor(self.window, self.on_io_busy)
+        self.io.submit(self.initialize_data_file, on_done=self.on_data_loaded, on_error=self.on_io_error)
+        # يُنفذ بعد رسم النافذة لأول مرة
+        self.window.after_idle(self.on_window_ready)
+        self.window.after_idle(self.poll_schedules)
         
         self.window.mainloop()
+        # انتظار عمليات الحفظ المعلقة قبل إغلاق المخزن
+        self.io.shutdown()
+        if self.store:
+            self.store.close()
     
     def create_personal_info_section(self, parent):
         """إنشاء قسم البيانات الشخصية"""
@@ -414,17 +612,17 @@ class VaccinationSystem:
         tk.Label(date_frame, text="يوم:", font=self.font_small, bg="#e8f4f8").pack(side="left")
         self.entry_day = tk.Entry(date_frame, font=self.font_normal, width=3, justify="center")
         self.entry_day.pack(side="left", padx=2)
-        self.entry_day.bind('<KeyRelease>', self.update_age_category_auto)
+        self.entry_day.bind('<KeyRelease>', self.on_birth_date_key)
         
         tk.Label(date_frame, text="شهر:", font=self.font_small, bg="#e8f4f8").pack(side="left")
         self.entry_month = tk.Entry(date_frame, font=self.font_normal, width=3, justify="center")
         self.entry_month.pack(side="left", padx=2)
-        self.entry_month.bind('<KeyRelease>', self.update_age_category_auto)
+        self.entry_month.bind('<KeyRelease>', self.on_birth_date_key)
         
         tk.Label(date_frame, text="سنة:", font=self.font_small, bg="#e8f4f8").pack(side="left")
         self.entry_year = tk.Entry(date_frame, font=self.font_normal, width=5, justify="center")
         self.entry_year.pack(side="left", padx=2)
-        self.entry_year.bind('<KeyRelease>', self.update_age_category_auto)
+        self.entry_year.bind('<KeyRelease>', self.on_birth_date_key)
         
         # الصف 2: الجنس والجنسية
         tk.Label(personal_frame, text="الجنس:", font=self.font_normal, bg="#e8f4f8").grid(row=2, column=7, padx=5, pady=5, sticky='e')
@@ -457,7 +655,7 @@ class VaccinationSystem:
         self.entry_passport = tk.Entry(personal_frame, font=self.font_normal, width=20)
         self.entry_passport.grid(row=3, column=6, padx=5, pady=5, sticky='w')
         self.entry_passport.bind('<KeyRelease>', self.to_uppercase)
-        self.entry_passport.bind('<FocusOut>', self.validate_passport)
+        self.entry_passport.bind('<KeyRelease>', self.validate_passport, add="+")
         
         tk.Label(personal_frame, text="رقم الهاتف:", font=self.font_normal, bg="#e8f4f8").grid(row=3, column=5, padx=5, pady=5, sticky='e')
         self.entry_phone = tk.Entry(personal_frame, font=self.font_normal, width=15)
@@ -487,6 +685,28 @@ class VaccinationSystem:
                                        font=self.font_normal, bg="#e8f4f8", fg="#2c3e50")
         self.exact_age_label.pack(side="left", padx=10)
         
+        # أخطاء الحقول تظهر هنا وباللون الأحمر في الحقل نفسه
+        self.validation_label = tk.Label(age_frame, text="", font=self.font_small, bg="#e8f4f8", fg="#f44336")
+        self.validation_label.pack(side="left", padx=10)
+        
+        self.field_errors = {}
+        self.validated_widgets = {
+            "birth_date": [self.entry_day, self.entry_month, self.entry_year],
+            "entry_passport": [self.entry_passport],
+            "entry_phone": [self.entry_phone],
+            "entry_national_id": [self.entry_national_id],
+        }
+        self.form_validator = FormValidator(personal_frame, {
+            "birth_date": self.birth_date_text,
+            "entry_passport": lambda: self.entry_passport.get().strip(),
+            "entry_phone": lambda: self.entry_phone.get().strip(),
+            "entry_national_id": lambda: self.entry_national_id.get().strip(),
+        }, self.on_field_validated)
+        # مغادرة الحقل تُظهر النتيجة فوراً دون انتظار التأجيل
+        for widgets in self.validated_widgets.values():
+            for widget in widgets:
+                widget.bind('<FocusOut>', lambda event: self.form_validator.flush(), add="+")
+        
         # تكوين الأعمدة لتحسين التخطيط
         for i in range(8):
             personal_frame.columnconfigure(i, weight=1)
@@ -514,11 +734,8 @@ class VaccinationSystem:
         
         # إنشاء الجدول
         columns = ("التاريخ", "نوع التطعيم", "الجرعة", "الملاحظات", "الحالة", "الفئة العمرية")
-        self.vaccine_table = ttk.Treeview(vaccine_frame, columns=columns, show="headings", height=8)
-        
-        # تعريف العناوين
-        for col in columns:
-            self.vaccine_table.heading(col, text=col)
+        # جدول افتراضي: يعرض الصفوف الظاهرة فقط ويرتب بالضغط على العناوين
+        self.vaccine_table = VirtualTreeview(vaccine_frame, columns, self.vaccine_rows, height=8)
         
         # تحديد عرض الأعمدة
         self.vaccine_table.column("التاريخ", width=100, anchor="center")
@@ -530,11 +747,6 @@ class VaccinationSystem:
         
         self.vaccine_table.pack(fill="both", expand=True)
         
-        # شريط التمرير
-        scrollbar = ttk.Scrollbar(vaccine_frame, orient="vertical", command=self.vaccine_table.yview)
-        scrollbar.pack(side="right", fill="y")
-        self.vaccine_table.configure(yscrollcommand=scrollbar.set)
-        
         # أزرار إدارة التطعيمات
         vaccine_buttons_frame = tk.Frame(vaccine_frame, bg="#f0f8ff")
         vaccine_buttons_frame.pack(fill="x", pady=(10, 0))
@@ -556,9 +768,14 @@ class VaccinationSystem:
         control_frame.pack(fill="x", pady=20)
         
         control_buttons = [
-            ("حفظ البيانات", self.save_data, "#2c3e50"),
+            ("حفظ البيانات", self.save_child, "#2c3e50"),
             ("بحث طفل", self.search_child, "#3498db"),
             ("عرض الكل", self.show_all, "#9b59b6"),
+            ("حملة تطعيم", self.campaign_mode, "#e67e22"),
+            ("المواعيد", self.due_calendar, "#16a085"),
+            ("التقارير", self.coverage_report, "#8e44ad"),
+            ("التكرارات", self.duplicates_review, "#c0392b"),
+            ("مزامنة", self.sync_window, "#2980b9"),
             ("جديد", self.new_record, "#e74c3c"),
             ("طباعة", self.print_record, "#27ae60")
         ]
@@ -567,6 +784,720 @@ class VaccinationSystem:
             btn = tk.Button(control_frame, text=text, command=command,
                           font=self.font_normal, bg=color, fg="white", width=12, height=2)
             btn.pack(side="left", padx=8)
+        
+        # مؤشر غير حاجب لعمليات القرص الجارية في الخلفية
+        self.io_busy = False
+        self.io_progress = ttk.Progressbar(control_frame, mode="indeterminate", length=100)
+        self.io_progress.pack(side="right", padx=8)
+        self.io_status_label = tk.Label(control_frame, text="جاري تحميل البيانات...",
+                                        font=self.font_small, bg="#f0f8ff", fg="#666")
+        self.io_status_label.pack(side="right")
+    
+    def fetch_children(self, child_ids):
+        """سجلات الأطفال بنفس الترتيب مع تجاهل المحذوف منها (يُنفذ في الخيط الخلفي)"""
+        children = [self.store.get(child_id) for child_id in child_ids]
+        return [child for child in children if child]
+
+    def search_child(self):
+        """البحث عن طفل بالاسم أو بأحد أرقام الهوية"""
+        if not self.require_data_ready():
+            return
+        
+        search_window = tk.Toplevel(self.window)
+        search_window.title("بحث طفل")
+        search_window.geometry("700x400")
+        search_window.configure(bg="#f0f8ff")
+        
+        search_fields = {
+            "الاسم": "name",
+            "الرقم الوطني": "entry_national_id",
+            "جواز السفر": "entry_passport",
+            "ورقة العائلة": "entry_family_paper",
+            "رقم القيد": "entry_registration_no",
+            "اسم الأم": "entry_mother_name",
+        }
+        
+        query_frame = tk.Frame(search_window, bg="#f0f8ff")
+        query_frame.pack(fill="x", padx=10, pady=10)
+        
+        field_combo = ttk.Combobox(query_frame, values=list(search_fields), 
+                                   font=self.font_normal, state="readonly", width=15)
+        field_combo.set("الاسم")
+        field_combo.pack(side="right", padx=5)
+        
+        query_entry = tk.Entry(query_frame, font=self.font_normal, width=30)
+        query_entry.pack(side="right", padx=5)
+        query_entry.focus_set()
+        
+        columns = ("الاسم", "اسم الأم", "تاريخ الميلاد", "الرقم الوطني", "جواز السفر")
+        results_table = ttk.Treeview(search_window, columns=columns, show="headings", height=10)
+        for col in columns:
+            results_table.heading(col, text=col)
+            results_table.column(col, width=130, anchor="center")
+        results_table.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        
+        found_children = {}
+        
+        def run_search(event=None):
+            value = query_entry.get().strip()
+            if not value:
+                return
+            if search_fields[field_combo.get()] == "entry_passport":
+                value = value.upper()
+            field = search_fields[field_combo.get()]
+            if field == "name":
+                # بحث تقريبي مرتب حسب التشابه في الذاكرة، وقراءة السجلات من المخزن في الخلفية
+                child_ids = [child_id for child_id, score in self.name_index.search(value)]
+                self.io.submit(self.fetch_children, child_ids, key="search",
+                               on_done=lambda children: show_results(children, event),
+                               on_error=self.on_io_error)
+            else:
+                # البحث في المخزن قد يصل للقرص: ينفذ في الخلفية ويُعرض آخر طلب فقط
+                self.io.submit(self.store.find, field, value, key="search",
+                               on_done=lambda children: show_results(children, event),
+                               on_error=self.on_io_error)
+        
+        def show_results(children, event):
+            if not search_window.winfo_exists():
+                return
+            results_table.delete(*results_table.get_children())
+            found_children.clear()
+            for child in children:
+                full_name = " ".join(child.get(field, "") for field in (
+                    "entry_name", "entry_father_name", "entry_grandfather_name", "entry_surname"))
+                item = results_table.insert("", "end", values=(
+                    full_name, child.get("entry_mother_name", ""), child.get("birth_date", ""),
+                    child.get("entry_national_id", ""), child.get("entry_passport", "")))
+                found_children[item] = child
+            if not found_children and event is None:
+                messagebox.showinfo("بحث", "لم يتم العثور على نتائج", parent=search_window)
+        
+        def search_as_you_type(event):
+            # البحث بالاسم أثناء الكتابة، وبقية الحقول عند الضغط على Enter
+            if search_fields[field_combo.get()] == "name" and event.keysym != "Return":
+                run_search(event)
+        
+        def open_selected(event=None):
+            selected = results_table.selection()
+            if selected:
+                self.load_child_into_form(found_children[selected[0]])
+                search_window.destroy()
+        
+        query_entry.bind('<Return>', lambda event: run_search())
+        query_entry.bind('<KeyRelease>', search_as_you_type)
+        results_table.bind('<Double-1>', open_selected)
+        tk.Button(query_frame, text="بحث", command=run_search,
+                 font=self.font_normal, bg="#3498db", fg="white", width=10).pack(side="right", padx=5)
+    
+    def show_all(self):
+        """عرض جميع الأطفال في جدول افتراضي"""
+        if not self.require_data_ready():
+            return
+        
+        all_window = tk.Toplevel(self.window)
+        all_window.title("عرض الكل")
+        all_window.geometry("1000x500")
+        all_window.configure(bg="#f0f8ff")
+        
+        fields = ["entry_name", "entry_father_name", "entry_surname", "entry_mother_name",
+                  "birth_date", "nationality", "entry_national_id", "entry_passport"]
+        columns = ("الاسم", "اسم الأب", "اللقب", "اسم الأم", "تاريخ الميلاد", "الجنسية",
+                   "الرقم الوطني", "جواز السفر")
+        
+        tk.Label(all_window, text=f"عدد الأطفال: {len(self.store)}", 
+                font=self.font_normal, bg="#f0f8ff").pack(pady=5)
+        
+        # الصفوف تُجلب من المخزن صفحةً صفحة حسب موضع التمرير
+        table = VirtualTreeview(all_window, columns, RegistrySource(self.store, fields, "entry_name"),
+                                height=18, bg="#f0f8ff")
+        for col in columns:
+            table.column(col, width=120, anchor="center")
+        table.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        
+        def open_selected(event=None):
+            selected = table.selected_rows()
+            if selected:
+                self.load_child_into_form(selected[0][1])
+                all_window.destroy()
+        
+        table.bind_rows('<Double-1>', open_selected)
+    
+    def campaign_mode(self):
+        """وضع حملة التطعيم: مسح أرقام الأطفال وتسجيل نفس الجرعة دون نوافذ حاجبة"""
+        if not self.require_data_ready():
+            return
+        
+        campaign_window = tk.Toplevel(self.window)
+        campaign_window.title("حملة تطعيم")
+        campaign_window.geometry("800x550")
+        campaign_window.configure(bg="#f0f8ff")
+        
+        setup_frame = tk.Frame(campaign_window, bg="#f0f8ff")
+        setup_frame.pack(fill="x", padx=10, pady=10)
+        
+        vaccine_options = [f"{code} - {info['name']}" for code, info in self.all_vaccines.items()]
+        vaccine_combo = ttk.Combobox(setup_frame, values=vaccine_options, font=self.font_normal,
+                                     state="readonly", width=30)
+        vaccine_combo.pack(side="right", padx=5)
+        dose_combo = ttk.Combobox(setup_frame, font=self.font_normal, state="readonly", width=15)
+        dose_combo.pack(side="right", padx=5)
+        date_entry = tk.Entry(setup_frame, font=self.font_normal, justify="center", width=12)
+        date_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
+        date_entry.pack(side="right", padx=5)
+        
+        def update_doses(event=None):
+            doses = self.all_vaccines[vaccine_combo.get().split(" - ")[0]]["doses"]
+            dose_combo['values'] = doses
+            dose_combo.set(doses[0])
+        
+        vaccine_combo.bind('<<ComboboxSelected>>', update_doses)
+        
+        scan_frame = tk.Frame(campaign_window, bg="#f0f8ff")
+        scan_frame.pack(fill="x", padx=10)
+        tk.Label(scan_frame, text="الرقم الوطني / الجواز / القيد:", font=self.font_normal,
+                bg="#f0f8ff").pack(side="right", padx=5)
+        scan_entry = tk.Entry(scan_frame, font=self.font_subtitle, justify="center", width=25, state="disabled")
+        scan_entry.pack(side="right", padx=5)
+        
+        result_label = tk.Label(campaign_window, text="اختر التطعيم والجرعة ثم ابدأ الحملة",
+                                font=self.font_subtitle, bg="#f0f8ff", fg="#666")
+        result_label.pack(pady=10)
+        counter_label = tk.Label(campaign_window, text="", font=self.font_small, bg="#f0f8ff", fg="#666")
+        counter_label.pack()
+        
+        # سجل الحملة: الأحدث في الأعلى
+        log_rows = ListSource()
+        log_rows.sort(0, True)
+        log_table = VirtualTreeview(campaign_window, ("الوقت", "الرقم", "الاسم", "النتيجة"), log_rows,
+                                    height=12, bg="#f0f8ff")
+        for col, width in (("الوقت", 80), ("الرقم", 150), ("الاسم", 220), ("النتيجة", 300)):
+            log_table.column(col, width=width, anchor="center")
+        log_table.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        state = {"session": None, "flush_job": None}
+        
+        def start():
+            if not vaccine_combo.get() or not dose_combo.get():
+                messagebox.showwarning("تحذير", "يرجى اختيار التطعيم والجرعة", parent=campaign_window)
+                return
+            try:
+                state["session"] = CampaignSession(self.store, self.rules, vaccine_combo.get().split(" - ")[0],
+                                                   dose_combo.get(), date_entry.get().strip())
+            except ValueError:
+                messagebox.showwarning("تحذير", "تاريخ الحملة غير صالح (YYYY-MM-DD)", parent=campaign_window)
+                return
+            for widget in (vaccine_combo, dose_combo, date_entry, start_button):
+                widget.config(state="disabled")
+            scan_entry.config(state="normal")
+            scan_entry.focus_set()
+            result_label.config(text=f"{vaccine_combo.get()} - {dose_combo.get()}", fg="#2c3e50")
+        
+        def on_scan(event=None):
+            value = scan_entry.get().strip()
+            scan_entry.delete(0, tk.END)
+            if value:
+                # البحث في الخلفية حتى يبقى حقل المسح جاهزاً للرقم التالي
+                self.io.submit(state["session"].find_child, value,
+                               on_done=lambda children: on_found(value, children), on_error=self.on_io_error)
+        
+        def on_found(value, children):
+            if not campaign_window.winfo_exists():
+                return
+            session = state["session"]
+            name = ""
+            if not children:
+                ok, message = False, "لا يوجد طفل بهذا الرقم"
+            elif len(children) > 1:
+                ok, message = False, f"{len(children)} أطفال بهذا الرقم - استخدم الرقم الوطني"
+            else:
+                child = children[0]
+                name = " ".join(child.get(field, "") for field in ("entry_name", "entry_father_name", "entry_surname"))
+                ok, message = session.check(child)
+                if ok:
+                    message = "تم التسجيل"
+                    if session.record(child):
+                        flush()
+            log_rows.append([datetime.now().strftime("%H:%M:%S"), value, name, message])
+            log_table.refresh(keep_position=False)
+            result_label.config(text=f"{name} - {message}" if name else message, fg="#4CAF50" if ok else "#f44336")
+            if not ok:
+                campaign_window.bell()
+            update_counter()
+            # حفظ الدفعة بعد توقف المسح لبضع ثوان
+            if state["flush_job"]:
+                campaign_window.after_cancel(state["flush_job"])
+            state["flush_job"] = campaign_window.after(3000, flush)
+        
+        def flush():
+            state["flush_job"] = None
+            if state["session"] and state["session"].pending_count():
+                self.io.submit(state["session"].flush, key="campaign-flush",
+                               on_done=on_flushed, on_error=self.on_io_error)
+        
+        def on_flushed(saved):
+            for child in saved:
+                self.update_child_indexes(child)
+            update_counter()
+        
+        def update_counter():
+            session = state["session"]
+            if session and campaign_window.winfo_exists():
+                counter_label.config(text=f"المسجلون: {len(session.recorded)} - المحفوظون: {session.saved_count}"
+                                          f" - بانتظار الحفظ: {session.pending_count()}")
+        
+        def close():
+            if state["flush_job"]:
+                campaign_window.after_cancel(state["flush_job"])
+            # الدفعة الأخيرة تُحفظ في الخلفية، والإغلاق ينتظر العمليات المعلقة
+            flush()
+            campaign_window.destroy()
+        
+        def print_recorded():
+            session = state["session"]
+            if session and session.recorded:
+                child_ids = sorted(session.recorded)
+                # بعد حفظ الدفعة المعلقة حتى تظهر جرعة الحملة في البطاقات
+                flush()
+                self.print_cards(lambda: [child for child in map(self.store.get, child_ids) if child],
+                                 campaign_window, "بطاقات الحملة.pdf")
+        
+        start_button = tk.Button(setup_frame, text="بدء الحملة", command=start,
+                                 font=self.font_normal, bg="#27ae60", fg="white", width=12)
+        start_button.pack(side="right", padx=5)
+        tk.Button(setup_frame, text="طباعة البطاقات", command=print_recorded,
+                 font=self.font_normal, bg="#2980b9", fg="white", width=12).pack(side="right", padx=5)
+        scan_entry.bind('<Return>', on_scan)
+        campaign_window.protocol("WM_DELETE_WINDOW", close)
+    
+    def due_calendar(self):
+        """الأطفال المستحقون لجرعات بين تاريخين من تقويم المواعيد"""
+        if not self.require_data_ready():
+            return
+        
+        calendar_window = tk.Toplevel(self.window)
+        calendar_window.title("المواعيد")
+        calendar_window.geometry("900x500")
+        calendar_window.configure(bg="#f0f8ff")
+        
+        range_frame = tk.Frame(calendar_window, bg="#f0f8ff")
+        range_frame.pack(fill="x", padx=10, pady=10)
+        
+        today = self.rules.ages.today()
+        tk.Label(range_frame, text="من:", font=self.font_normal, bg="#f0f8ff").pack(side="right", padx=5)
+        start_entry = tk.Entry(range_frame, font=self.font_normal, justify="center", width=12)
+        start_entry.insert(0, today.isoformat())
+        start_entry.pack(side="right", padx=5)
+        tk.Label(range_frame, text="إلى:", font=self.font_normal, bg="#f0f8ff").pack(side="right", padx=5)
+        end_entry = tk.Entry(range_frame, font=self.font_normal, justify="center", width=12)
+        end_entry.insert(0, (today + timedelta(days=7)).isoformat())
+        end_entry.pack(side="right", padx=5)
+        include_overdue = tk.BooleanVar(value=False)
+        tk.Checkbutton(range_frame, text="مع المتأخرين", variable=include_overdue,
+                      font=self.font_normal, bg="#f0f8ff").pack(side="right", padx=5)
+        
+        count_label = tk.Label(calendar_window, text="جاري تجهيز التقويم...", font=self.font_normal, bg="#f0f8ff")
+        count_label.pack()
+        
+        columns = ("تاريخ الاستحقاق", "الاسم", "الرقم الوطني", "التطعيم", "الجرعة")
+        due_rows = ListSource()
+        table = VirtualTreeview(calendar_window, columns, due_rows, height=16, bg="#f0f8ff")
+        for col in columns:
+            table.column(col, width=150, anchor="center")
+        table.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        child_ids = []
+        
+        def show():
+            if not self.due_ready:
+                return
+            try:
+                start = None if include_overdue.get() else parse_date(start_entry.get().strip())
+                end = parse_date(end_entry.get().strip())
+            except ValueError:
+                messagebox.showwarning("تحذير", "صيغة التاريخ YYYY-MM-DD", parent=calendar_window)
+                return
+            due = self.due_index.due_between(start, end)
+            # أسماء الأطفال من المخزن (قد تصل للقرص مع SQLite)
+            self.io.submit(lambda: [(entry, self.store.get(entry[1])) for entry in due], key="due-calendar",
+                           on_done=fill, on_error=self.on_io_error)
+        
+        def fill(rows):
+            if not calendar_window.winfo_exists():
+                return
+            child_ids[:] = []
+            table_rows = []
+            for (due_date, child_id, code, dose), child in rows:
+                if child is None:
+                    continue
+                child_ids.append(child_id)
+                name = " ".join(child.get(field, "") for field in ("entry_name", "entry_father_name", "entry_surname"))
+                table_rows.append([due_date.isoformat(), name, child.get("entry_national_id", ""), code, dose])
+            due_rows.set_rows(table_rows)
+            table.refresh(keep_position=False)
+            count_label.config(text=f"عدد الجرعات المستحقة: {len(table_rows)}")
+        
+        def on_built(result=None):
+            self.due_ready = True
+            if calendar_window.winfo_exists():
+                show()
+        
+        def open_selected(event=None):
+            selected = table.selected_rows()
+            if selected:
+                child = self.store.get(child_ids[selected[0][0]])
+                if child:
+                    self.load_child_into_form(child)
+                    calendar_window.destroy()
+        
+        def print_listed():
+            # طفل واحد لكل بطاقة حتى لو استحق عدة جرعات
+            listed = list(dict.fromkeys(child_ids))
+            if listed:
+                self.print_cards(lambda: [child for child in map(self.store.get, listed) if child],
+                                 calendar_window, "بطاقات المواعيد.pdf")
+        
+        tk.Button(range_frame, text="عرض", command=show,
+                 font=self.font_normal, bg="#16a085", fg="white", width=10).pack(side="right", padx=5)
+        tk.Button(range_frame, text="طباعة", command=print_listed,
+                 font=self.font_normal, bg="#27ae60", fg="white", width=10).pack(side="right", padx=5)
+        table.bind_rows('<Double-1>', open_selected)
+        if self.due_ready:
+            show()
+        else:
+            # البناء الأول يمر على كامل السجل: في الخلفية مرة واحدة
+            self.io.submit(lambda: self.due_index.build(self.store.iter_children()), key="due-build",
+                           on_done=on_built, on_error=self.on_io_error)
+    
+    def coverage_report(self):
+        """تقارير نسب التغطية حسب الفئة العمرية والجنسية وشهر الميلاد مع التصدير"""
+        if not self.require_data_ready():
+            return
+        
+        report_window = tk.Toplevel(self.window)
+        report_window.title("تقارير التغطية")
+        report_window.geometry("1000x550")
+        report_window.configure(bg="#f0f8ff")
+        
+        options_frame = tk.Frame(report_window, bg="#f0f8ff")
+        options_frame.pack(fill="x", padx=10, pady=10)
+        
+        dimension_vars = {}
+        for dimension, label in DIMENSIONS.items():
+            dimension_vars[dimension] = tk.BooleanVar(value=dimension == "cohort")
+            tk.Checkbutton(options_frame, text=label, variable=dimension_vars[dimension],
+                          font=self.font_normal, bg="#f0f8ff").pack(side="right", padx=5)
+        
+        vaccine_combo = ttk.Combobox(options_frame, values=["جميع التطعيمات"] + list(self.all_vaccines),
+                                     font=self.font_normal, state="readonly", width=20)
+        vaccine_combo.set("جميع التطعيمات")
+        vaccine_combo.pack(side="right", padx=5)
+        
+        status_label = tk.Label(report_window, text="جاري تجهيز جداول التغطية...", font=self.font_normal,
+                                bg="#f0f8ff")
+        status_label.pack()
+        
+        table_frame = tk.Frame(report_window, bg="#f0f8ff")
+        table_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        report = {"headers": [], "rows": [], "table": None}
+        
+        def show():
+            if not self.coverage_ready:
+                return
+            dimensions = [dimension for dimension, var in dimension_vars.items() if var.get()]
+            vaccine_code = None if vaccine_combo.current() <= 0 else vaccine_combo.get()
+            report["headers"] = self.coverage.headers(dimensions)
+            report["rows"] = self.coverage.coverage(dimensions, vaccine_code)
+            # الأعمدة تتغير مع الأبعاد المختارة: جدول جديد لكل تقرير
+            if report["table"] is not None:
+                report["table"].destroy()
+            table = VirtualTreeview(table_frame, report["headers"], ListSource(report["rows"]), height=18,
+                                    bg="#f0f8ff")
+            for col in report["headers"]:
+                table.column(col, width=110, anchor="center")
+            table.pack(fill="both", expand=True)
+            report["table"] = table
+            status_label.config(text=f"عدد الصفوف: {len(report['rows'])}")
+        
+        def export():
+            if not report["rows"]:
+                return
+            path = filedialog.asksaveasfilename(
+                parent=report_window, defaultextension=".xlsx",
+                filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv")])
+            if path:
+                self.io.submit(write_table, path, report["headers"], report["rows"], "التغطية",
+                               on_done=lambda result: self.set_status(f"تم تصدير التقرير إلى {path}"),
+                               on_error=self.on_io_error)
+        
+        def on_built(result=None):
+            self.coverage_ready = True
+            if report_window.winfo_exists():
+                show()
+        
+        tk.Button(options_frame, text="عرض", command=show,
+                 font=self.font_normal, bg="#16a085", fg="white", width=10).pack(side="right", padx=5)
+        tk.Button(options_frame, text="تصدير", command=export,
+                 font=self.font_normal, bg="#27ae60", fg="white", width=10).pack(side="right", padx=5)
+        if self.coverage_ready:
+            show()
+        else:
+            self.io.submit(lambda: self.coverage.build(self.store.iter_children()), key="coverage-build",
+                           on_done=on_built, on_error=self.on_io_error)
+    
+    def duplicates_review(self):
+        """مراجعة الأطفال المسجلين أكثر من مرة ودمج سجلاتهم"""
+        if not self.require_data_ready():
+            return
+        
+        review_window = tk.Toplevel(self.window)
+        review_window.title("مراجعة التكرارات")
+        review_window.geometry("1100x550")
+        review_window.configure(bg="#f0f8ff")
+        
+        buttons_frame = tk.Frame(review_window, bg="#f0f8ff")
+        buttons_frame.pack(fill="x", padx=10, pady=10)
+        status_label = tk.Label(review_window, text="", font=self.font_normal, bg="#f0f8ff")
+        status_label.pack()
+        
+        columns = ("الدرجة", "السجل الأول", "السجل الثاني", "تاريخ الميلاد", "هوية الأول", "هوية الثاني",
+                   "الجرعات", "الحقول المتطابقة")
+        rows = ListSource()
+        table = VirtualTreeview(review_window, columns, rows, height=16, bg="#f0f8ff")
+        for col, width in zip(columns, (60, 200, 200, 100, 120, 120, 70, 250)):
+            table.column(col, width=width, anchor="center")
+        table.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        candidates = []
+        
+        def full_name(child):
+            return " ".join(child.get(field, "") for field in (
+                "entry_name", "entry_father_name", "entry_grandfather_name", "entry_surname"))
+        
+        def identity(child):
+            return child.get("entry_national_id") or child.get("entry_passport") or ""
+        
+        def show(found):
+            if not review_window.winfo_exists():
+                return
+            candidates[:] = found
+            rows.set_rows([
+                [candidate.score, full_name(candidate.child_a), full_name(candidate.child_b),
+                 candidate.child_a.get("birth_date", ""), identity(candidate.child_a), identity(candidate.child_b),
+                 f"{len(candidate.child_a.get('vaccinations', []))}/{len(candidate.child_b.get('vaccinations', []))}",
+                 "، ".join(REASON_LABELS[reason] for reason in candidate.reasons)]
+                for candidate in candidates
+            ])
+            table.refresh(keep_position=False)
+            status_label.config(text=f"عدد الأزواج المرشحة: {len(candidates)}")
+        
+        def search():
+            status_label.config(text="جاري البحث عن التكرارات...")
+            self.io.submit(lambda: LinkageEngine().find(self.store.iter_children()), key="duplicates",
+                           on_done=show, on_error=self.on_io_error)
+        
+        def selected_candidate():
+            selected = table.selected_rows()
+            if not selected:
+                messagebox.showwarning("تحذير", "يرجى اختيار زوج من الجدول", parent=review_window)
+                return None
+            return candidates[selected[0][0]]
+        
+        def drop_pairs(*child_ids):
+            # الأزواج الأخرى التي تضم السجل المحذوف أو المعدل لم تعد صالحة
+            show([candidate for candidate in candidates
+                  if candidate.child_a["child_id"] not in child_ids and candidate.child_b["child_id"] not in child_ids])
+        
+        def merge(keep_first):
+            candidate = selected_candidate()
+            if candidate is None:
+                return
+            keep, other = candidate.child_a, candidate.child_b
+            if not keep_first:
+                keep, other = other, keep
+            if not messagebox.askyesno("تأكيد", f"دمج سجل {full_name(other)} في سجل {full_name(keep)} وحذفه؟",
+                                       parent=review_window):
+                return
+            
+            def on_merged(saved):
+                self.name_index.update(saved)
+                self.update_child_indexes(saved)
+                self.remove_child_indexes(other["child_id"])
+                self.set_status(f"تم دمج السجلين ({len(saved.get('vaccinations', []))} جرعة)")
+                if review_window.winfo_exists():
+                    drop_pairs(keep["child_id"], other["child_id"])
+            
+            self.io.submit(merge_duplicate, self.store, keep["child_id"], other["child_id"],
+                           on_done=on_merged, on_error=self.on_io_error)
+        
+        def not_duplicates():
+            candidate = selected_candidate()
+            if candidate is None:
+                return
+            pair = [candidate.child_a["child_id"], candidate.child_b["child_id"]]
+            self.io.submit(mark_distinct, self.store, *pair,
+                           on_done=lambda saved: show([c for c in candidates if c is not candidate]),
+                           on_error=self.on_io_error)
+        
+        def open_selected(event=None):
+            candidate = selected_candidate()
+            if candidate:
+                self.load_child_into_form(candidate.child_a)
+        
+        for text, command, color in (
+            ("بحث عن التكرارات", search, "#3498db"),
+            ("دمج في الأول", lambda: merge(True), "#27ae60"),
+            ("دمج في الثاني", lambda: merge(False), "#27ae60"),
+            ("ليسا مكررين", not_duplicates, "#7f8c8d"),
+        ):
+            tk.Button(buttons_frame, text=text, command=command,
+                     font=self.font_normal, bg=color, fg="white", width=14).pack(side="right", padx=5)
+        table.bind_rows('<Double-1>', open_selected)
+        search()
+    
+    def apply_synced_changes(self, changed):
+        """تحديث الفهارس بعد استيراد تغييرات مركز آخر"""
+        for child_id, child in changed:
+            if child is None:
+                self.remove_child_indexes(child_id)
+            else:
+                self.name_index.update(child)
+                self.update_child_indexes(child)
+    
+    def sync_window(self):
+        """تصدير حزمة فروقات لمركز آخر واستيراد حزمه"""
+        if not self.require_data_ready():
+            return
+        if not isinstance(self.store, SyncedStore):
+            messagebox.showinfo("المزامنة", "المزامنة غير مفعلة (\"sync_enabled\": true في settings.json)")
+            return
+        journal = self.store.journal
+        
+        sync_window = tk.Toplevel(self.window)
+        sync_window.title("مزامنة المراكز")
+        sync_window.geometry("520x320")
+        sync_window.configure(bg="#f0f8ff")
+        
+        tk.Label(sync_window, text=f"هذا المركز: {journal.site}",
+                font=self.font_title, bg="#f0f8ff", fg="#2c3e50").pack(pady=10)
+        
+        peers_frame = tk.Frame(sync_window, bg="#f0f8ff")
+        peers_frame.pack(fill="x", padx=20)
+        tk.Label(peers_frame, text="المركز المستلم:", font=self.font_normal, bg="#f0f8ff").pack(side="right")
+        peer_combo = ttk.Combobox(peers_frame, font=self.font_normal, width=25)
+        peer_combo.pack(side="right", padx=10)
+        
+        result_label = tk.Label(sync_window, text="", font=self.font_normal, bg="#f0f8ff",
+                               fg="#2c3e50", justify="right", wraplength=460)
+        result_label.pack(pady=15)
+        
+        def show_peers(peers):
+            if sync_window.winfo_exists():
+                peer_combo['values'] = peers
+        
+        def export():
+            peer = peer_combo.get().strip()
+            if not peer:
+                messagebox.showwarning("تحذير", "يرجى إدخال اسم المركز المستلم", parent=sync_window)
+                return
+            path = filedialog.asksaveasfilename(parent=sync_window, defaultextension=".gz",
+                                                initialfile=f"sync_{journal.site}_to_{peer}.gz",
+                                                filetypes=[("حزمة مزامنة", "*.gz")])
+            if not path:
+                return
+            
+            def on_done(result):
+                count, size = result
+                self.set_status(f"تم تصدير {count} تغيير")
+                if sync_window.winfo_exists():
+                    result_label.config(text=f"تم تصدير {count} تغيير ({size / 1024:.1f} ك.ب) إلى {os.path.basename(path)}")
+            
+            self.set_status("جاري تصدير حزمة المزامنة...")
+            self.io.submit(self.store.export_bundle, path, peer, key=("sync-export", path),
+                           on_done=on_done, on_error=self.on_io_error)
+        
+        def import_bundle():
+            path = filedialog.askopenfilename(parent=sync_window, filetypes=[("حزمة مزامنة", "*.gz")])
+            if not path:
+                return
+            
+            def on_done(result):
+                added, changed = result
+                self.apply_synced_changes(changed)
+                self.set_status(f"تم استيراد {added} تغيير")
+                if sync_window.winfo_exists():
+                    result_label.config(text=f"تغييرات جديدة: {added}، أطفال تم تحديثهم: {len(changed)}")
+                self.io.submit(journal.peers, on_done=show_peers)
+            
+            self.set_status("جاري استيراد حزمة المزامنة...")
+            self.io.submit(self.store.import_bundle, path, key=("sync-import", path),
+                           on_done=on_done, on_error=self.on_io_error)
+        
+        buttons_frame = tk.Frame(sync_window, bg="#f0f8ff")
+        buttons_frame.pack(pady=10)
+        for text, command, color in (
+            ("تصدير حزمة", export, "#27ae60"),
+            ("استيراد حزمة", import_bundle, "#3498db"),
+        ):
+            tk.Button(buttons_frame, text=text, command=command,
+                     font=self.font_normal, bg=color, fg="white", width=14).pack(side="right", padx=5)
+        
+        self.io.submit(journal.peers, on_done=show_peers)
+    
+    def diagnostics_window(self):
+        """أزمنة العمليات المقاسة (p50/p95/p99) وتحليل cProfile عند الطلب"""
+        diagnostics_window = tk.Toplevel(self.window)
+        diagnostics_window.title("التشخيص")
+        diagnostics_window.geometry("900x600")
+        diagnostics_window.configure(bg="#f0f8ff")
+        
+        buttons_frame = tk.Frame(diagnostics_window, bg="#f0f8ff")
+        buttons_frame.pack(fill="x", padx=10, pady=10)
+        status = "مفعّل" if self.metrics.enabled else "معطّل (diagnostics في settings.json أو VACCINATION_DIAGNOSTICS=1)"
+        tk.Label(buttons_frame, text=f"القياس: {status}", font=self.font_small, bg="#f0f8ff").pack(side="right", padx=5)
+        
+        columns = ("العملية", "العدد", "p50 ms", "p95 ms", "p99 ms", "الأقصى ms", "المجموع ms")
+        rows = ListSource()
+        table = VirtualTreeview(diagnostics_window, columns, rows, height=14, bg="#f0f8ff")
+        table.column("العملية", width=220, anchor="w")
+        for col in columns[1:]:
+            table.column(col, width=90, anchor="center")
+        table.pack(fill="both", expand=True, padx=10)
+        
+        profile_text = tk.Text(diagnostics_window, font=("Courier", 9), height=10, wrap="none")
+        profile_text.pack(fill="both", padx=10, pady=10)
+        
+        def refresh():
+            if not diagnostics_window.winfo_exists():
+                return
+            rows.set_rows([
+                [name, count] + [round(value, 3) for value in values]
+                for name, count, *values in self.metrics.snapshot()
+            ])
+            table.refresh()
+            diagnostics_window.after(1000, refresh)
+        
+        def toggle_profile():
+            if self.metrics.profiler is None:
+                self.metrics.start_profile()
+                profile_button.config(text="إيقاف التحليل")
+                return
+            path = filedialog.asksaveasfilename(parent=diagnostics_window, defaultextension=".prof",
+                                                filetypes=[("cProfile", "*.prof")])
+            summary = self.metrics.stop_profile(path or None)
+            profile_button.config(text="بدء تحليل cProfile")
+            profile_text.delete("1.0", tk.END)
+            profile_text.insert("1.0", summary)
+        
+        def close():
+            # التحليل لا يستمر بعد إغلاق النافذة
+            self.metrics.stop_profile()
+            diagnostics_window.destroy()
+        
+        profile_button = tk.Button(buttons_frame, text="بدء تحليل cProfile", command=toggle_profile,
+                                   font=self.font_normal, bg="#8e44ad", fg="white", width=16)
+        profile_button.pack(side="left", padx=5)
+        tk.Button(buttons_frame, text="تصفير", command=self.metrics.reset,
+                 font=self.font_normal, bg="#7f8c8d", fg="white", width=10).pack(side="left", padx=5)
+        diagnostics_window.protocol("WM_DELETE_WINDOW", close)
+        refresh()
     
     def add_vaccination(self):
         """إضافة تطعيم جديد"""
@@ -579,9 +1510,10 @@ class VaccinationSystem:
     def open_vaccination_window(self, title):
         """فتح نافذة إضافة/إدراج التطعيم"""
         # التحقق من وجود نافذة مفتوحة مسبقاً
-        if self.add_vaccination_window and self.add_vaccination_window.winfo_exists():
-            self.add_vaccination_window.lift()
-            self.add_vaccination_window.focus_force()
+        window = self.add_vaccination_window
+        if window is not None and window.winfo_exists() and window.winfo_viewable():
+            window.lift()
+            window.focus_force()
             return
         
         if not self.entry_name.get().strip():
@@ -593,23 +1525,10 @@ class VaccinationSystem:
             messagebox.showwarning("تحذير", "يرجى اختيار الفئة العمرية أولاً")
             return
         
-        # نافذة إضافة تطعيم
-        self.add_vaccination_window = tk.Toplevel(self.window)
-        self.add_vaccination_window.title(title)
-        self.add_vaccination_window.geometry("600x500")  # زيادة الحجم
-        self.add_vaccination_window.configure(bg="#f0f8ff")
-        self.add_vaccination_window.transient(self.window)
-        self.add_vaccination_window.grab_set()
-        
-        # إغلاق النافذة عند الضغط على X
-        self.add_vaccination_window.protocol("WM_DELETE_WINDOW", self.close_add_vaccination_window)
-        
-        # معلومات العمر والفئة
-        info_frame = tk.Frame(self.add_vaccination_window, bg="#f0f8ff")
-        info_frame.pack(fill="x", pady=5)
-        
-        tk.Label(info_frame, text=f"الفئة العمرية: {selected_age}", 
-                font=self.font_normal, bg="#f0f8ff", fg="#2c3e50").pack(side="left", padx=10)
+        if window is None or not window.winfo_exists():
+            window = self.create_vaccination_window()
+        window.title(title)
+        self.vaccination_age_label.config(text=f"الفئة العمرية: {selected_age}")
         
         # الحصول على العمر بالشهور للتعويض
         day = self.entry_day.get()
@@ -622,8 +1541,6 @@ class VaccinationSystem:
             child_age_months = years * 12 + months
         
         # أنواع التطعيمات المتاحة
-        tk.Label(self.add_vaccination_window, text="نوع التطعيم:", font=self.font_normal, bg="#f0f8ff").pack(pady=5)
-        
         vaccine_options = []
         if selected_age == "تعويضي":
             # عرض جميع التطعيمات المناسبة للعمر للتعويض
@@ -639,42 +1556,73 @@ class VaccinationSystem:
             # الفئات العمرية العادية
             pass  # سيتم معالجتها لاحقاً
         
-        self.vaccine_combo = ttk.Combobox(self.add_vaccination_window, values=vaccine_options, 
-                                    font=self.font_normal, state="readonly", width=50)
+        # إعادة تعبئة النافذة المخفية بقيم هذا الطفل
+        self.vaccine_combo['values'] = vaccine_options
+        self.vaccine_combo.set(vaccine_options[0] if vaccine_options else "")
+        self.interval_label.config(text="")
+        self.restriction_label.config(text="")
+        # تحديث الجرعات بناءً على التطعيم المختار أولاً
+        self.update_dose_options()
+        self.date_entry.delete(0, tk.END)
+        self.date_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
+        self.notes_entry.delete("1.0", tk.END)
+        
+        window.deiconify()
+        window.grab_set()
+        window.focus_force()
+    
+    def create_vaccination_window(self):
+        """إنشاء نافذة إضافة التطعيم مخفية (مرة واحدة في الجلسة)"""
+        window = tk.Toplevel(self.window)
+        window.withdraw()
+        window.geometry("600x500")  # زيادة الحجم
+        window.configure(bg="#f0f8ff")
+        window.transient(self.window)
+        
+        # إغلاق النافذة عند الضغط على X
+        window.protocol("WM_DELETE_WINDOW", self.close_add_vaccination_window)
+        
+        # معلومات العمر والفئة
+        info_frame = tk.Frame(window, bg="#f0f8ff")
+        info_frame.pack(fill="x", pady=5)
+        
+        self.vaccination_age_label = tk.Label(info_frame, text="", font=self.font_normal,
+                                              bg="#f0f8ff", fg="#2c3e50")
+        self.vaccination_age_label.pack(side="left", padx=10)
+        
+        tk.Label(window, text="نوع التطعيم:", font=self.font_normal, bg="#f0f8ff").pack(pady=5)
+        
+        self.vaccine_combo = ttk.Combobox(window, font=self.font_normal, state="readonly", width=50)
         self.vaccine_combo.pack(pady=5)
-        if vaccine_options:
-            self.vaccine_combo.set(vaccine_options[0])
         self.vaccine_combo.bind('<<ComboboxSelected>>', self.on_vaccine_selected)
         
         # معلومات الفترة الزمنية
-        self.interval_label = tk.Label(self.add_vaccination_window, text="", 
+        self.interval_label = tk.Label(window, text="", 
                                      font=self.font_small, bg="#f0f8ff", fg="#666")
         self.interval_label.pack(pady=2)
         
         # معلومات القيود
-        self.restriction_label = tk.Label(self.add_vaccination_window, text="", 
+        self.restriction_label = tk.Label(window, text="", 
                                         font=self.font_small, bg="#f0f8ff", fg="#f44336")
         self.restriction_label.pack(pady=2)
         
-        tk.Label(self.add_vaccination_window, text="الجرعة:", font=self.font_normal, bg="#f0f8ff").pack(pady=5)
+        tk.Label(window, text="الجرعة:", font=self.font_normal, bg="#f0f8ff").pack(pady=5)
         
-        self.dose_combo = ttk.Combobox(self.add_vaccination_window, 
+        self.dose_combo = ttk.Combobox(window, 
                                  font=self.font_normal, state="readonly", width=20)
         self.dose_combo.pack(pady=5)
         
-        # تحديث الجرعات بناءً على التطعيم المختار أولاً
-        self.update_dose_options()
-        
-        tk.Label(self.add_vaccination_window, text="التاريخ:", font=self.font_normal, bg="#f0f8ff").pack(pady=5)
-        self.date_entry = tk.Entry(self.add_vaccination_window, font=self.font_normal, justify="center")
-        self.date_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
+        tk.Label(window, text="التاريخ:", font=self.font_normal, bg="#f0f8ff").pack(pady=5)
+        self.date_entry = tk.Entry(window, font=self.font_normal, justify="center")
         self.date_entry.pack(pady=5)
+        # تغيير تاريخ الجرعة قد يغير الفترة المطلوبة (إصدار جدول آخر)
+        self.date_entry.bind('<FocusOut>', lambda event: self.check_vaccine_interval_and_restrictions())
         
-        tk.Label(self.add_vaccination_window, text="الملاحظات:", font=self.font_normal, bg="#f0f8ff").pack(pady=5)
-        self.notes_entry = tk.Text(self.add_vaccination_window, font=self.font_normal, height=4, width=50)
+        tk.Label(window, text="الملاحظات:", font=self.font_normal, bg="#f0f8ff").pack(pady=5)
+        self.notes_entry = tk.Text(window, font=self.font_normal, height=4, width=50)
         self.notes_entry.pack(pady=5)
         
-        buttons_frame = tk.Frame(self.add_vaccination_window, bg="#f0f8ff")
+        buttons_frame = tk.Frame(window, bg="#f0f8ff")
         buttons_frame.pack(pady=10)
         
         tk.Button(buttons_frame, text="حفظ التطعيم", command=self.save_vaccine,
@@ -682,6 +1630,9 @@ class VaccinationSystem:
         
         tk.Button(buttons_frame, text="إلغاء", command=self.close_add_vaccination_window,
                  font=self.font_normal, bg="#f44336", fg="white", width=15).pack(side="left", padx=5)
+        
+        self.add_vaccination_window = window
+        return window
     
     def on_vaccine_selected(self, event):
         """عند اختيار نوع التطعيم، تحديث قائمة الجرعات والتحقق من الفترات"""
@@ -719,7 +1670,11 @@ class VaccinationSystem:
             
             # التحقق من الفترة الزمنية
             last_date = self.get_last_vaccination_date(vaccine_code)
-            can_give, interval_msg = self.check_vaccine_interval(vaccine_code, selected_dose, last_date)
+            try:
+                dose_date = parse_date(self.date_entry.get().strip())
+            except ValueError:
+                dose_date = None
+            can_give, interval_msg = self.check_vaccine_interval(vaccine_code, selected_dose, last_date, dose_date)
             self.interval_label.config(text=interval_msg)
             if not can_give:
                 self.interval_label.config(fg="#f44336")
@@ -728,7 +1683,7 @@ class VaccinationSystem:
             
             # التحقق من القيود
             existing_vaccines = self.get_existing_vaccines()
-            can_combine, restriction_msg = self.check_vaccine_restrictions(vaccine_code, existing_vaccines)
+            can_combine, restriction_msg = self.check_vaccine_restrictions(vaccine_code, existing_vaccines, dose_date)
             self.restriction_label.config(text=restriction_msg)
             if not can_combine:
                 self.restriction_label.config(fg="#f44336")
@@ -737,13 +1692,7 @@ class VaccinationSystem:
     
     def get_existing_vaccines(self):
         """الحصول على التطعيمات الموجودة في الجدول"""
-        existing_vaccines = []
-        for item in self.vaccine_table.get_children():
-            values = self.vaccine_table.item(item)["values"]
-            vaccine_type = values[1]
-            vaccine_code = vaccine_type.split(" - ")[0]
-            existing_vaccines.append(vaccine_code)
-        return existing_vaccines
+        return self.dose_index.codes()
     
     def save_vaccine(self):
         """حفظ التطعيم"""
@@ -759,10 +1708,14 @@ class VaccinationSystem:
             messagebox.showwarning("تحذير", "يرجى اختيار الجرعة")
             return
         
-        # التحقق النهائي من القيود
+        # التحقق النهائي من القيود بقواعد إصدار الجدول الساري في تاريخ الجرعة
         vaccine_code = vaccine_type.split(" - ")[0]
+        try:
+            dose_date = parse_date(self.date_entry.get().strip())
+        except ValueError:
+            dose_date = None
         existing_vaccines = self.get_existing_vaccines()
-        can_combine, restriction_msg = self.check_vaccine_restrictions(vaccine_code, existing_vaccines)
+        can_combine, restriction_msg = self.check_vaccine_restrictions(vaccine_code, existing_vaccines, dose_date)
         
         if not can_combine:
             messagebox.showerror("خطأ", restriction_msg)
@@ -784,31 +1737,219 @@ class VaccinationSystem:
             "مكتمل",
             selected_age
         )
-        self.vaccine_table.insert("", "end", values=vaccine_data)
+        self.vaccine_rows.append(vaccine_data)
+        self.vaccine_table.refresh()
+        self.dose_index.add(vaccine_data)
         self.close_add_vaccination_window()
         messagebox.showinfo("نجاح", "تم إضافة التطعيم بنجاح")
     
     def close_add_vaccination_window(self):
-        """إغلاق نافذة إضافة التطعيم"""
-        if self.add_vaccination_window:
-            self.add_vaccination_window.destroy()
-            self.add_vaccination_window = None
+        """إغلاق نافذة إضافة التطعيم (تُخفى لإعادة استخدامها في المرة التالية)"""
+        window = self.add_vaccination_window
+        if window is not None and window.winfo_exists():
+            window.grab_release()
+            window.withdraw()
     
     def delete_vaccination(self):
         """حذف تطعيم"""
-        selected = self.vaccine_table.selection()
+        selected = self.vaccine_table.selected_rows()
         if not selected:
             messagebox.showwarning("تحذير", "يرجى اختيار تطعيم للحذف")
             return
         
         if messagebox.askyesno("تأكيد", "هل أنت متأكد من حذف هذا التطعيم؟"):
-            self.vaccine_table.delete(selected)
+            for index, row in selected:
+                self.dose_index.remove(row)
+            self.vaccine_rows.remove([index for index, row in selected])
+            self.vaccine_table.refresh()
+    
+    def new_record(self):
+        """تفريغ النموذج لإدخال طفل جديد"""
+        self.current_child_data = {}
+        for field in ("entry_national_id", "entry_family_paper", "entry_registration_no"):
+            getattr(self, field).config(state="normal")
+        for entry in (self.entry_name, self.entry_father_name, self.entry_grandfather_name, self.entry_surname,
+                      self.entry_mother_name, self.entry_passport, self.entry_phone, self.entry_national_id,
+                      self.entry_family_paper, self.entry_registration_no,
+                      self.entry_day, self.entry_month, self.entry_year):
+            entry.delete(0, tk.END)
+        self.nationality_combo.set("ليبي")
+        self.on_nationality_change(None)
+        self.gender_var.set("ذكر")
+        self.age_category_combo.set("")
+        self.form_validator.revalidate()
+        self.vaccine_rows.set_rows([])
+        self.vaccine_table.refresh(keep_position=False)
+        self.dose_index = DoseIndex()
+        self.entry_name.focus_set()
+    
+    def print_record(self):
+        """طباعة بطاقة التطعيم للطفل المعروض في ملف PDF"""
+        if not self.entry_name.get().strip():
+            messagebox.showwarning("تحذير", "يرجى إدخال اسم الطفل أولاً")
+            return
+        child = self.collect_child_data()
+        self.print_cards(lambda: [child], self.window, f"{child['entry_name']}.pdf")
     
-    # باقي الدوال (save_data, search_child, show_all, new_record, print_record) تبقى كما هي
-    # ... [يتبع باقي الدوال بنفس الشكل السابق]
+    def print_cards(self, load_children, parent, default_name="بطاقات التطعيم.pdf"):
+        """طباعة بطاقات عدة أطفال في ملف PDF واحد؛ الجلب والرسم في الخيط الخلفي"""
+        path = filedialog.asksaveasfilename(parent=parent, defaultextension=".pdf", initialfile=default_name,
+                                            filetypes=[("PDF", "*.pdf")])
+        if not path:
+            return
+        
+        def render():
+            return render_cards(load_children(), path, self.settings["pdf_font"] or None)
+        
+        def on_done(pages):
+            self.set_status(f"تمت طباعة {pages} صفحة إلى {path}")
+            if hasattr(os, "startfile"):
+                os.startfile(path)
+        
+        self.set_status("جاري تجهيز الطباعة...")
+        self.io.submit(render, key=("print", path), on_done=on_done, on_error=self.on_io_error)
+
 
 # تشغيل التطبيق
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["migrate"]:
+        # python main.py migrate [children_data.json] [children_data.db]
+        json_file = sys.argv[2] if len(sys.argv) > 2 else "children_data.json"
+        db_file = sys.argv[3] if len(sys.argv) > 3 else "children_data.db"
+        count = migrate_json(json_file, db_file)
+        print(f"تم ترحيل {count} سجل إلى {db_file}")
+        sys.exit(0)
+    
+    if sys.argv[1:2] == ["schedule-template"] and len(sys.argv) > 2:
+        # python main.py schedule-template YYYY-MM-DD - ملف إصدار جديد من الجدول المدمج لتعديله
+        app = VaccinationSystem()
+        os.makedirs(app.settings["schedules_dir"], exist_ok=True)
+        output_file = os.path.join(app.settings["schedules_dir"], f"{sys.argv[2]}.json")
+        write_schedule_template(output_file, sys.argv[2])
+        print(f"تم إنشاء {output_file}")
+        sys.exit(0)
+    
+    if sys.argv[1:2] in (["export"], ["import"]) and len(sys.argv) > 2:
+        # python main.py export|import registry.jsonl[.gz]
+        from transfer import export_jsonl, import_jsonl
+        
+        def show_progress(count, fraction):
+            percent = f" ({fraction:.0%})" if fraction is not None else ""
+            print(f"\r{count} سجل{percent}", end="", file=sys.stderr, flush=True)
+        
+        app = VaccinationSystem()
+        app.initialize_data_file()
+        if sys.argv[1] == "export":
+            count = export_jsonl(app.store, sys.argv[2], show_progress)
+            print(f"\nتم تصدير {count} سجل إلى {sys.argv[2]}")
+        else:
+            report = import_jsonl(app.store, sys.argv[2], progress=show_progress)
+            print(f"\nتم استيراد {report.imported} سجل، مكرر {report.duplicates}، غير صالح {report.invalid}")
+            for line_number, message in report.errors:
+                print(f"  السطر {line_number}: {message}")
+        app.store.close()
+        sys.exit(0)
+    
+    if sys.argv[1:2] == ["serve"]:
+        # python main.py serve [port] - واجهة HTTP لتطبيقات الإدخال والتقارير
+        from api_server import serve
+        app = VaccinationSystem()
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else app.settings["api_port"]
+        if app.settings["storage_backend"] == "sqlite":
+            # اتصال SQLite مستقل لكل خيط في المجموعة
+            open_store, pool_size = app.open_store, app.settings["api_pool_size"]
+        else:
+            # مخزن JSON واحد في الذاكرة تتشاركه جميع الخيوط
+            store = app.open_store()
+            open_store, pool_size = (lambda: store), app.settings["api_pool_size"]
+        serve(open_store, app.rules, app.settings["api_host"], port, pool_size)
+        sys.exit(0)
+    
+    if sys.argv[1:2] == ["coverage"]:
+        # python main.py coverage [coverage.xlsx|csv] [cohort,nationality,period]
+        output_file = sys.argv[2] if len(sys.argv) > 2 else "coverage.xlsx"
+        dimensions = sys.argv[3].split(",") if len(sys.argv) > 3 else ["cohort"]
+        app = VaccinationSystem()
+        app.initialize_data_file()
+        app.coverage.build(app.store.iter_children())
+        rows = app.coverage.coverage(dimensions)
+        write_table(output_file, app.coverage.headers(dimensions), rows, "التغطية")
+        app.store.close()
+        print(f"تم إنتاج {len(rows)} صف في {output_file}")
+        sys.exit(0)
+    
+    if sys.argv[1:2] == ["cards"]:
+        # python main.py cards [cards.pdf] - بطاقات جميع الأطفال في ملف واحد
+        app = VaccinationSystem()
+        app.initialize_data_file()
+        output_file = sys.argv[2] if len(sys.argv) > 2 else "cards.pdf"
+        pages = render_cards(app.store.iter_children(), output_file, app.settings["pdf_font"] or None,
+                             progress=lambda count: print(f"\r{count} بطاقة", end="", file=sys.stderr, flush=True))
+        app.store.close()
+        print(f"\nتم إنتاج {pages} صفحة في {output_file}")
+        sys.exit(0)
+    
+    if sys.argv[1:2] == ["duplicates"]:
+        # python main.py duplicates [duplicates.csv] - قائمة المرشحين للدمج للمراجعة
+        app = VaccinationSystem()
+        app.initialize_data_file()
+        output_file = sys.argv[2] if len(sys.argv) > 2 else "duplicates.csv"
+        candidates = LinkageEngine().find(app.store.iter_children())
+        write_table(output_file, ["الدرجة", "المعرف الأول", "المعرف الثاني", "الحقول المتطابقة"], (
+            [candidate.score, candidate.child_a["child_id"], candidate.child_b["child_id"],
+             "، ".join(REASON_LABELS[reason] for reason in candidate.reasons)]
+            for candidate in candidates), "التكرارات")
+        app.store.close()
+        print(f"تم إنتاج {len(candidates)} زوج مرشح في {output_file}")
+        sys.exit(0)
+    
+    if sys.argv[1:2] in (["sync-export"], ["sync-import"]) and len(sys.argv) > 2:
+        # python main.py sync-export <المركز المستلم> [bundle.gz] | sync-import bundle.gz
+        app = VaccinationSystem()
+        app.settings["sync_enabled"] = True
+        app.initialize_data_file()
+        if sys.argv[1] == "sync-export":
+            peer = sys.argv[2]
+            output_file = sys.argv[3] if len(sys.argv) > 3 else f"sync_{app.store.journal.site}_to_{peer}.gz"
+            count, size = app.store.export_bundle(output_file, peer)
+            print(f"تم تصدير {count} تغيير ({size} بايت) إلى {output_file}")
+        else:
+            added, changed = app.store.import_bundle(sys.argv[2])
+            print(f"تم استيراد {added} تغيير، تم تحديث {len(changed)} طفل")
+        app.store.close()
+        sys.exit(0)
+    
+    if sys.argv[1:2] == ["audit"]:
+        # python main.py audit [audit.csv] [عدد العمليات] - تدقيق جودة بيانات كامل السجل
+        from audit import audit_registry
+        app = VaccinationSystem()
+        app.initialize_data_file()
+        output_file = sys.argv[2] if len(sys.argv) > 2 else "audit.csv"
+        workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        report = audit_registry(app.store, output_file, app.settings["schedules_dir"], workers,
+                                progress=lambda count: print(f"\r{count} طفل", end="", file=sys.stderr, flush=True))
+        app.store.close()
+        print(f"\nتم فحص {report.children} طفل ووُجدت {report.findings} مشكلة في {output_file}")
+        for kind, count in sorted(report.kinds.items(), key=lambda item: -item[1]):
+            print(f"  {kind}: {count}")
+        sys.exit(0)
+    
+    if sys.argv[1:2] == ["recall"]:
+        # python main.py recall [recall_list.csv] - قائمة الاستدعاء الليلية
+        from eligibility import BatchEligibility
+        app = VaccinationSystem()
+        app.initialize_data_file()
+        engine = BatchEligibility(app.rules)
+        output_file = sys.argv[2] if len(sys.argv) > 2 else "recall_list.csv"
+        count, rejected = engine.write_recall_csv(app.load_data(), output_file)
+        app.store.close()
+        print(f"تم إنتاج {count} صف في {output_file}")
+        if rejected:
+            print(f"تم تجاهل {len(rejected)} جرعة بتاريخ غير صالح:", file=sys.stderr)
+            for child_id, code, dose, day in rejected[:20]:
+                print(f"  {child_id}: {code} {dose} بتاريخ {day!r}", file=sys.stderr)
+        sys.exit(0)
+    
     try:
         app = VaccinationSystem()
         app.create_main_window()
@@ -0,0 +1,261 @@
+"""نموذج مضغوط لسجلات الأطفال في الذاكرة
+
+السجل في الملفات وفي واجهة المخزن يبقى قاموساً بنصوص العرض، أما في الذاكرة
+فكل طفل كائن بـ __slots__ وجرعاته مضغوطة في bytes واحد (12 بايت للجرعة):
+التاريخ يوم ترتيبي، ونوع التطعيم والجرعة والحالة والفئة العمرية أرقام صغيرة من
+جداول مشتركة تبدأ من ALL_VACCINES. الملاحظات نص حر لا يتكرر فلا تدخل الجداول:
+تُحفظ كما هي بجانب الجرعات المضغوطة إن وُجدت. نصوص العرض ('الكود - الاسم'،
+'الجرعة الثانية'، 'YYYY-MM-DD') تُبنى فقط عند to_record.
+"""
+import struct
+import threading
+from datetime import date
+
+from rules import AGE_THRESHOLDS, ALL_VACCINES, OLDEST_AGE_CATEGORY
+
+# حقول الطفل المعروفة (أي حقل آخر يُحفظ في extra كما هو)
+FIELDS = (
+    "child_id", "entry_name", "entry_father_name", "entry_grandfather_name", "entry_surname",
+    "entry_mother_name", "birth_date", "gender", "nationality", "entry_passport", "entry_phone",
+    "entry_national_id", "entry_family_paper", "entry_registration_no", "age_category", "version",
+)
+# حقول قيمها تتكرر كثيراً بين الأطفال: تُحفظ نسخة واحدة من كل قيمة
+POOLED_FIELDS = frozenset([
+    "entry_name", "entry_father_name", "entry_grandfather_name", "entry_surname",
+    "entry_mother_name", "gender", "nationality", "age_category",
+])
+
+# الجرعة: التاريخ، نوع التطعيم، الجرعة، الحالة، الفئة العمرية
+DOSE = struct.Struct("<iHHHH")
+
+
+class Interner(dict):
+    """جدول قيم مشترك: interner[القيمة] ← رقم صغير ثابت طوال الجلسة، وvalues[الرقم] ← القيمة
+
+    القيمة الجديدة تُضاف عند أول طلب لها (البحث نفسه بحث قاموس عادي).
+    """
+
+    def __init__(self, seed=()):
+        super().__init__()
+        self.values = []
+        # merge تضيف القيم وهي ممسكة بالقفل
+        self.lock = threading.RLock()
+        for value in seed:
+            self.__missing__(value)
+
+    def __missing__(self, value):
+        with self.lock:
+            number = self.get(value)
+            if number is None:
+                number = len(self.values)
+                self.values.append(value)
+                self[value] = number
+        return number
+
+    def merge(self, values):
+        """إضافة جدول محفوظ إن كان متوافقاً (أحدهما بداية للآخر)؛ يعيد هل نجح"""
+        with self.lock:
+            shared = min(len(values), len(self.values))
+            if self.values[:shared] != list(values[:shared]):
+                return False
+            # نفس القفل حتى تنتهي الإضافة: قيمة جديدة من خيط آخر بينهما تغير أرقام الجدول المحفوظ
+            for value in values[shared:]:
+                self.__missing__(value)
+        return True
+
+
+class DateCodes(dict):
+    """'YYYY-MM-DD' ← اليوم الترتيبي؛ التواريخ بصيغة أخرى تُحفظ في RAW_DATES برقم سالب"""
+
+    def __missing__(self, value):
+        ordinal = date_ordinal(value)
+        code = ordinal if ordinal is not None else -1 - RAW_DATES[value]
+        self[value] = code
+        return code
+
+
+class DateTexts(dict):
+    """اليوم الترتيبي (أو الرقم السالب) ← نص التاريخ"""
+
+    def __missing__(self, code):
+        text = date.fromordinal(code).isoformat() if code >= 0 else RAW_DATES.values[-1 - code]
+        if code >= 0:
+            self[code] = text
+        return text
+
+
+def dose_labels():
+    """أسماء الجرعات بترتيب ظهورها في الجدول (ترتيبها هو رقمها)"""
+    labels = []
+    for info in ALL_VACCINES.values():
+        labels += [dose for dose in info["doses"] if dose not in labels]
+    return labels
+
+
+VACCINES = Interner(f"{code} - {info['name']}" for code, info in ALL_VACCINES.items())
+DOSES = Interner(dose_labels())
+STATUSES = Interner(["مكتمل"])
+CATEGORIES = Interner([category for months, category in AGE_THRESHOLDS] + [OLDEST_AGE_CATEGORY, "تعويضي", "منشطة"])
+# تواريخ بصيغة غير معتادة تُحفظ نصاً برقم سالب
+RAW_DATES = Interner()
+TABLES = (VACCINES, DOSES, STATUSES, CATEGORIES, RAW_DATES)
+DATE_CODES = DateCodes()
+DATE_TEXTS = DateTexts()
+
+# نسخة واحدة من كل قيمة متكررة (الأسماء والجنس والجنسية)
+VALUE_POOL = {}
+
+MISSING = object()
+
+
+def date_ordinal(value):
+    """اليوم الترتيبي لتاريخ 'YYYY-MM-DD'، أو None إن لم يكن بهذه الصيغة تماماً"""
+    if value.__class__ is not str or len(value) != 10:
+        return None
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        return None
+    # fromisoformat تقبل صيغاً أخرى بنفس الطول: نتأكد أن النص يعود كما هو
+    return day.toordinal() if day.isoformat() == value else None
+
+
+def pack_doses(rows):
+    """جرعات الطفل مضغوطة في bytes (مع صف الملاحظات إن وُجدت)، أو نسخة قائمة إن تعذر ضغطها"""
+    if any(len(row) != 6 or row[3].__class__ is not str for row in rows):
+        return [list(row) for row in rows]
+    pack = DOSE.pack
+    try:
+        packed = b"".join([
+            pack(DATE_CODES[day], VACCINES[vaccine], DOSES[dose], STATUSES[status], CATEGORIES[category])
+            for day, vaccine, dose, note, status, category in rows
+        ])
+    except (TypeError, struct.error):
+        # قيمة غير قابلة للفهرسة أو جدول تجاوز 65535 قيمة
+        return [list(row) for row in rows]
+    notes = tuple(row[3] for row in rows)
+    return (packed, notes) if any(notes) else packed
+
+
+def unpack_doses(doses):
+    """صفوف الجرعات بنصوص العرض (نفس ترتيب أعمدة جدول التطعيمات)"""
+    if doses.__class__ is list:
+        return [list(row) for row in doses]
+    notes = None
+    if doses.__class__ is tuple:
+        doses, notes = doses
+    dates, vaccines, dose_values = DATE_TEXTS, VACCINES.values, DOSES.values
+    statuses, categories = STATUSES.values, CATEGORIES.values
+    rows = [
+        [dates[day], vaccines[vaccine], dose_values[dose], "", statuses[status], categories[category]]
+        for day, vaccine, dose, status, category in DOSE.iter_unpack(doses)
+    ]
+    if notes:
+        for row, note in zip(rows, notes):
+            row[3] = note
+    return rows
+
+
+class Child:
+    """سجل طفل مضغوط وغير قابل للتعديل؛ get و[] تعيدان القيم كما في القاموس الأصلي"""
+
+    __slots__ = FIELDS + ("doses", "extra")
+
+    @classmethod
+    def from_record(cls, record):
+        child = cls.__new__(cls)
+        extra = None
+        for key, value in record.items():
+            if key == "vaccinations":
+                child.doses = pack_doses(value)
+            elif key == "birth_date" and value.__class__ is str:
+                code = DATE_CODES[value]
+                child.birth_date = code if code >= 0 else value
+            elif key in POOLED_FIELDS:
+                setattr(child, key, VALUE_POOL.setdefault(value, value) if value.__class__ is str else value)
+            elif key in FIELD_SET and key != "birth_date":
+                setattr(child, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        child.extra = extra
+        return child
+
+    def to_record(self):
+        """القاموس بنصوص العرض (نسخة جديدة في كل مرة)"""
+        record = {}
+        for key in FIELDS:
+            value = getattr(self, key, MISSING)
+            if value is not MISSING:
+                record[key] = value
+        birth = record.get("birth_date")
+        if birth.__class__ is int:
+            record["birth_date"] = DATE_TEXTS[birth]
+        doses = getattr(self, "doses", MISSING)
+        if doses is not MISSING:
+            record["vaccinations"] = unpack_doses(doses)
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+    def get(self, key, default=None):
+        if key in FIELD_SET:
+            value = getattr(self, key, MISSING)
+            if value is not MISSING:
+                return DATE_TEXTS[value] if key == "birth_date" and value.__class__ is int else value
+        elif key == "vaccinations":
+            doses = getattr(self, "doses", MISSING)
+            return default if doses is MISSING else unpack_doses(doses)
+        # تاريخ ميلاد بقيمة غير نصية يُحفظ كما هو مع الحقول الإضافية
+        return self.extra.get(key, default) if self.extra else default
+
+    def __getitem__(self, key):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    # ---------------- الحفظ الثنائي ----------------
+
+    def state(self):
+        """صف قابل للحفظ بـ marshal: (الحقول الموجودة كقناع بت، القيم، الجرعات، الإضافي)"""
+        mask = 0
+        values = []
+        for bit, key in enumerate(FIELDS):
+            value = getattr(self, key, MISSING)
+            if value is not MISSING:
+                mask |= 1 << bit
+                values.append(value)
+        return mask, tuple(values), getattr(self, "doses", None), self.extra
+
+    @classmethod
+    def from_state(cls, state):
+        mask, values, doses, extra = state
+        child = cls.__new__(cls)
+        values = iter(values)
+        for bit, key in enumerate(FIELDS):
+            if mask >> bit & 1:
+                setattr(child, key, next(values))
+        if doses is not None:
+            child.doses = doses
+        child.extra = extra
+        return child
+
+
+FIELD_SET = frozenset(FIELDS)
+
+
+def table_state():
+    """الجداول المشتركة التي تشير إليها أرقام الجرعات المضغوطة"""
+    return [list(table.values) for table in TABLES]
+
+
+def merge_table_state(state):
+    """اعتماد جداول محفوظة مع لقطة ثنائية؛ False إن تعارضت مع جداول هذه الجلسة"""
+    if len(state) != len(TABLES):
+        return False
+    return all(table.merge(values) for table, values in zip(TABLES, state))
@@ -0,0 +1,384 @@
+"""طباعة بطاقات التطعيم إلى PDF: خط TrueType مضمّن، قالب صفحة مشترك، وكتابة تدفقية
+
+كل صفحة تُكتب في الملف فور تجهيزها ولا يبقى في الذاكرة إلا مواقع الكائنات،
+فيمكن طباعة مئات البطاقات في ملف واحد. الخط يُحلَّل ويُضغط مرة واحدة لكل
+مسار، والنصوص المتكررة (التسميات، أسماء التطعيمات، الجرعات) تُشكَّل وتُقاس مرة واحدة.
+"""
+import os
+import struct
+import zlib
+from datetime import date
+from functools import lru_cache
+
+from arabic_shaping import prepare_rtl
+
+# خطوط تحتوي الحروف العربية وأشكال العرض، بالترتيب
+FONT_CANDIDATES = [
+    r"C:\Windows\Fonts\arial.ttf",
+    r"C:\Windows\Fonts\tahoma.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/Library/Fonts/Arial.ttf",
+]
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 بالنقاط
+MARGIN = 40
+ROW_HEIGHT = 20
+TABLE_TOP = 560
+ROWS_PER_PAGE = 24
+
+# أعمدة جدول التطعيمات من اليمين: (العنوان، موقع الصف في السجل، العرض)
+TABLE_COLUMNS = [
+    ("التاريخ", 0, 80),
+    ("التطعيم", 1, 160),
+    ("الجرعة", 2, 90),
+    ("الحالة", 4, 60),
+    ("الملاحظات", 3, 125),
+]
+
+# حقول البطاقة: (التسمية، مفتاح السجل، العمود 0 يمين أو 1 يسار، السطر)
+INFO_FIELDS = [
+    ("الاسم:", "full_name", 0, 0),
+    ("اسم الأم:", "entry_mother_name", 0, 1),
+    ("تاريخ الميلاد:", "birth_date", 0, 2),
+    ("الجنس:", "gender", 0, 3),
+    ("الجنسية:", "nationality", 1, 0),
+    ("الرقم الوطني:", "entry_national_id", 1, 1),
+    ("جواز السفر:", "entry_passport", 1, 2),
+    ("رقم القيد:", "entry_registration_no", 1, 3),
+]
+
+
+class PrintError(Exception):
+    """تعذر تجهيز الطباعة (مثل عدم وجود خط عربي)"""
+
+
+class TrueTypeFont:
+    """قراءة ما تحتاجه الطباعة من ملف TTF: خريطة الحروف، عروض الحروف، المقاييس"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        if self.data[:4] not in (b"\x00\x01\x00\x00", b"true"):
+            raise PrintError(f"الخط {path} ليس TrueType")
+        num_tables = struct.unpack(">H", self.data[4:6])[0]
+        self.tables = {}
+        for i in range(num_tables):
+            tag, checksum, offset, length = struct.unpack(">4sIII", self.data[12 + 16 * i:28 + 16 * i])
+            self.tables[tag.decode('latin-1')] = (offset, length)
+
+        head = self.table("head")
+        self.units_per_em = struct.unpack(">H", head[18:20])[0]
+        self.bbox = struct.unpack(">hhhh", head[36:44])
+        hhea = self.table("hhea")
+        self.ascent, self.descent = struct.unpack(">hh", hhea[4:8])
+        num_metrics = struct.unpack(">H", hhea[34:36])[0]
+        hmtx = self.table("hmtx")
+        self.advances = [struct.unpack(">H", hmtx[4 * i:4 * i + 2])[0] for i in range(num_metrics)]
+        self.cmap = self.read_cmap()
+        self.name = "".join(ch for ch in os.path.splitext(os.path.basename(path))[0] if ch.isalnum()) or "Font"
+        self.compressed = None
+        self.layouts = {}
+
+    def table(self, tag):
+        if tag not in self.tables:
+            raise PrintError(f"الخط {self.path} لا يحتوي جدول {tag}")
+        offset, length = self.tables[tag]
+        return self.data[offset:offset + length]
+
+    def read_cmap(self):
+        """خريطة رمز يونيكود ← رقم الحرف في الخط (الصيغة 12 أو 4)"""
+        cmap = self.table("cmap")
+        subtables = {}
+        for i in range(struct.unpack(">H", cmap[2:4])[0]):
+            platform, encoding, offset = struct.unpack(">HHI", cmap[4 + 8 * i:12 + 8 * i])
+            subtables[(platform, encoding)] = offset
+        mapping = {}
+        if (3, 10) in subtables:
+            offset = subtables[(3, 10)]
+            groups = struct.unpack(">I", cmap[offset + 12:offset + 16])[0]
+            for g in range(groups):
+                start, end, glyph = struct.unpack(">III", cmap[offset + 16 + 12 * g:offset + 28 + 12 * g])
+                for code in range(start, end + 1):
+                    mapping[code] = glyph + code - start
+            return mapping
+        offset = subtables.get((3, 1), subtables.get((0, 3)))
+        if offset is None:
+            raise PrintError(f"الخط {self.path} لا يحتوي خريطة يونيكود")
+        seg_count = struct.unpack(">H", cmap[offset + 6:offset + 8])[0] // 2
+        ends = offset + 14
+        starts = ends + 2 * seg_count + 2
+        deltas = starts + 2 * seg_count
+        range_offsets = deltas + 2 * seg_count
+        for s in range(seg_count):
+            end = struct.unpack(">H", cmap[ends + 2 * s:ends + 2 * s + 2])[0]
+            start = struct.unpack(">H", cmap[starts + 2 * s:starts + 2 * s + 2])[0]
+            delta = struct.unpack(">h", cmap[deltas + 2 * s:deltas + 2 * s + 2])[0]
+            range_offset = struct.unpack(">H", cmap[range_offsets + 2 * s:range_offsets + 2 * s + 2])[0]
+            for code in range(start, min(end, 0xFFFE) + 1):
+                if range_offset == 0:
+                    glyph = (code + delta) & 0xFFFF
+                else:
+                    position = range_offsets + 2 * s + range_offset + 2 * (code - start)
+                    glyph = struct.unpack(">H", cmap[position:position + 2])[0]
+                    if glyph:
+                        glyph = (glyph + delta) & 0xFFFF
+                if glyph:
+                    mapping[code] = glyph
+        return mapping
+
+    def advance(self, glyph):
+        return self.advances[glyph] if glyph < len(self.advances) else self.advances[-1]
+
+    def layout(self, text):
+        """(أرقام الحروف بالترتيب المرئي، العرض بوحدات الخط) مع ذاكرة للنصوص المتكررة"""
+        cached = self.layouts.get(text)
+        if cached is None:
+            glyphs = [self.cmap.get(ord(ch), 0) for ch in prepare_rtl(text)]
+            cached = (glyphs, sum(self.advance(glyph) for glyph in glyphs))
+            if len(self.layouts) < 20000:
+                self.layouts[text] = cached
+        return cached
+
+    def font_file(self):
+        """ملف الخط مضغوطاً (يُحسب مرة واحدة)"""
+        if self.compressed is None:
+            self.compressed = zlib.compress(self.data, 6)
+        return self.compressed
+
+
+@lru_cache(maxsize=4)
+def load_font(path):
+    """تحميل الخط مرة واحدة لكل مسار"""
+    return TrueTypeFont(path)
+
+
+def find_font(preferred=None):
+    """أول خط متاح يحتوي الحروف العربية"""
+    for path in ([preferred] if preferred else []) + FONT_CANDIDATES:
+        if path and os.path.exists(path):
+            font = load_font(path)
+            if 0xFE8D in font.cmap and 0x0627 in font.cmap:
+                return font
+    raise PrintError("لم يتم العثور على خط يدعم العربية؛ حدد pdf_font في settings.json")
+
+
+class PdfWriter:
+    """كتابة كائنات PDF مباشرة إلى الملف مع حفظ مواقعها لجدول xref"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.file = open(self.tmp_path, 'wb')
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.offsets = {}
+        self.next_id = 1
+
+    def reserve(self):
+        """حجز رقم كائن يُكتب لاحقاً"""
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def write(self, obj_id, body):
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(f"{obj_id} 0 obj\n".encode('latin-1') + body + b"\nendobj\n")
+
+    def write_stream(self, obj_id, data, extra="", compress=True):
+        if compress:
+            data = zlib.compress(data, 6)
+            extra += " /Filter /FlateDecode"
+        self.write(obj_id, f"<< /Length {len(data)}{extra} >>\nstream\n".encode('latin-1') + data + b"\nendstream")
+
+    def close(self, catalog_id):
+        xref = self.file.tell()
+        count = self.next_id
+        lines = [f"xref\n0 {count}\n0000000000 65535 f \n"]
+        for obj_id in range(1, count):
+            lines.append(f"{self.offsets.get(obj_id, 0):010d} 00000 n \n")
+        lines.append(f"trailer\n<< /Size {count} /Root {catalog_id} 0 R >>\nstartxref\n{xref}\n%%EOF\n")
+        self.file.write("".join(lines).encode('latin-1'))
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.tmp_path)
+
+
+class CardRenderer:
+    """بطاقات تطعيم من اليمين لليسار: قالب ثابت مشترك (XObject) ونصوص كل طفل فوقه"""
+
+    def __init__(self, font):
+        self.font = font
+        self.glyph_hex = {}
+        self.used = {}
+
+    # ---------------- النصوص ----------------
+
+    def text(self, value, right, y, size=10, max_width=None, align="right"):
+        """أوامر رسم نص ينتهي عند right (أو يتوسطها)، مع تصغيره ليتسع في max_width"""
+        value = str(value or "")
+        if not value:
+            return ""
+        glyphs, units = self.font.layout(value)
+        width = units * size / self.font.units_per_em
+        if max_width and width > max_width:
+            size = max(5.0, size * max_width / width)
+            width = units * size / self.font.units_per_em
+        for glyph in glyphs:
+            if glyph not in self.used:
+                self.used[glyph] = self.font.advance(glyph)
+        x = right - width if align == "right" else right - width / 2
+        hex_glyphs = "".join(self.hex(glyph) for glyph in glyphs)
+        return f"BT /F1 {size:.2f} Tf {x:.2f} {y:.2f} Td <{hex_glyphs}> Tj ET\n"
+
+    def hex(self, glyph):
+        value = self.glyph_hex.get(glyph)
+        if value is None:
+            value = self.glyph_hex[glyph] = f"{glyph:04X}"
+        return value
+
+    # ---------------- القالب والصفحات ----------------
+
+    def template(self, printed_on):
+        """الأجزاء الثابتة لكل الصفحات: الإطار، العنوان، التسميات، رأس الجدول وخطوطه"""
+        right = PAGE_WIDTH - MARGIN
+        parts = [
+            "0.8 w 0.17 0.24 0.31 RG\n",
+            f"{MARGIN} {MARGIN} {PAGE_WIDTH - 2 * MARGIN} {PAGE_HEIGHT - 2 * MARGIN} re S\n",
+            self.text("بطاقة التطعيم", PAGE_WIDTH / 2, PAGE_HEIGHT - 80, 20, align="center"),
+            f"{MARGIN + 20} {PAGE_HEIGHT - 95} m {right - 20} {PAGE_HEIGHT - 95} l S\n",
+        ]
+        for label, key, column, line in INFO_FIELDS:
+            parts.append(self.text(label, self.info_right(column), self.info_y(line), 11))
+
+        table_width = sum(width for title, index, width in TABLE_COLUMNS)
+        left = right - 20 - table_width
+        top = TABLE_TOP
+        parts.append(f"0.9 0.95 1 rg {left} {top} {table_width} {ROW_HEIGHT} re f 0 g\n")
+        x = right - 20
+        for title, index, width in TABLE_COLUMNS:
+            parts.append(self.text(title, x - width / 2, top + 6, 10, align="center"))
+            x -= width
+        parts.append("0.5 w\n")
+        bottom = top - ROWS_PER_PAGE * ROW_HEIGHT
+        for row in range(ROWS_PER_PAGE + 2):
+            y = top + ROW_HEIGHT - row * ROW_HEIGHT
+            parts.append(f"{left} {y} m {left + table_width} {y} l S\n")
+        x = right - 20
+        parts.append(f"{x} {top + ROW_HEIGHT} m {x} {bottom} l S\n")
+        for title, index, width in TABLE_COLUMNS:
+            x -= width
+            parts.append(f"{x} {top + ROW_HEIGHT} m {x} {bottom} l S\n")
+        parts.append(self.text(f"تاريخ الطباعة: {printed_on.isoformat()}", right - 20, MARGIN + 15, 9))
+        return "".join(parts).encode('latin-1')
+
+    def info_right(self, column):
+        return PAGE_WIDTH - MARGIN - 20 - column * (PAGE_WIDTH - 2 * MARGIN) / 2
+
+    def info_y(self, line):
+        return PAGE_HEIGHT - 130 - line * 24
+
+    def page_content(self, child, rows, page_number, page_count):
+        """نصوص صفحة واحدة لطفل: البيانات وحتى ROWS_PER_PAGE صفاً من التطعيمات"""
+        values = dict(child)
+        values["full_name"] = " ".join(child.get(field, "") for field in (
+            "entry_name", "entry_father_name", "entry_grandfather_name", "entry_surname")).strip()
+        parts = ["q /Tpl Do Q\n"]
+        for label, key, column, line in INFO_FIELDS:
+            label_width = self.font.layout(label)[1] * 11 / self.font.units_per_em
+            parts.append(self.text(values.get(key, ""), self.info_right(column) - label_width - 8,
+                                   self.info_y(line), 11, max_width=(PAGE_WIDTH - 2 * MARGIN) / 2 - label_width - 40))
+        for row_number, row in enumerate(rows):
+            y = TABLE_TOP - (row_number + 1) * ROW_HEIGHT + 6
+            x = PAGE_WIDTH - MARGIN - 20
+            for title, index, width in TABLE_COLUMNS:
+                value = row[index] if index < len(row) else ""
+                parts.append(self.text(value, x - 4, y, 9, max_width=width - 8))
+                x -= width
+        if page_count > 1:
+            parts.append(self.text(f"صفحة {page_number} من {page_count}", MARGIN + 80, MARGIN + 15, 9, align="center"))
+        return "".join(parts).encode('latin-1')
+
+    def render(self, children, path, progress=None, printed_on=None):
+        """كتابة بطاقات الأطفال في ملف PDF واحد وإرجاع عدد الصفحات"""
+        writer = PdfWriter(path)
+        try:
+            catalog_id, pages_id, font_id, template_id = (writer.reserve() for _ in range(4))
+            writer.write_stream(template_id, self.template(printed_on or date.today()),
+                                f" /Type /XObject /Subtype /Form /BBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}]"
+                                f" /Resources << /Font << /F1 {font_id} 0 R >> >>")
+            resources = f"<< /Font << /F1 {font_id} 0 R >> /XObject << /Tpl {template_id} 0 R >> >>"
+            page_ids = []
+            for count, child in enumerate(children, 1):
+                vaccinations = child.get("vaccinations", [])
+                chunks = [vaccinations[i:i + ROWS_PER_PAGE] for i in range(0, len(vaccinations), ROWS_PER_PAGE)] or [[]]
+                for page_number, rows in enumerate(chunks, 1):
+                    content_id, page_id = writer.reserve(), writer.reserve()
+                    writer.write_stream(content_id, self.page_content(child, rows, page_number, len(chunks)))
+                    writer.write(page_id, (
+                        f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}]"
+                        f" /Resources {resources} /Contents {content_id} 0 R >>").encode('latin-1'))
+                    page_ids.append(page_id)
+                if progress and count % 50 == 0:
+                    progress(count)
+            self.write_font(writer, font_id)
+            kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+            writer.write(pages_id, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode('latin-1'))
+            writer.write(catalog_id, f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode('latin-1'))
+            writer.close(catalog_id)
+        except BaseException:
+            writer.abort()
+            raise
+        return len(page_ids)
+
+    def write_font(self, writer, font_id):
+        """الخط المركب Type0 (Identity-H) مع عروض الحروف المستخدمة فقط وخريطة ToUnicode"""
+        font = self.font
+        scale = 1000.0 / font.units_per_em
+        descendant_id, descriptor_id, file_id, unicode_id = (writer.reserve() for _ in range(4))
+        # الملف مضغوط مسبقاً ومحفوظ مع الخط فلا يُضغط مرة أخرى
+        writer.write_stream(file_id, font.font_file(), f" /Length1 {len(font.data)} /Filter /FlateDecode",
+                            compress=False)
+        bbox = " ".join(str(round(value * scale)) for value in font.bbox)
+        writer.write(descriptor_id, (
+            f"<< /Type /FontDescriptor /FontName /{font.name} /Flags 32 /FontBBox [{bbox}]"
+            f" /ItalicAngle 0 /Ascent {round(font.ascent * scale)} /Descent {round(font.descent * scale)}"
+            f" /CapHeight {round(font.ascent * scale)} /StemV 80 /FontFile2 {file_id} 0 R >>").encode('latin-1'))
+        widths = " ".join(f"{glyph} [{round(advance * scale)}]" for glyph, advance in sorted(self.used.items()))
+        writer.write(descendant_id, (
+            f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{font.name}"
+            f" /CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >>"
+            f" /FontDescriptor {descriptor_id} 0 R /DW 500 /W [{widths}] /CIDToGIDMap /Identity >>").encode('latin-1'))
+        writer.write_stream(unicode_id, self.to_unicode())
+        writer.write(font_id, (
+            f"<< /Type /Font /Subtype /Type0 /BaseFont /{font.name} /Encoding /Identity-H"
+            f" /DescendantFonts [{descendant_id} 0 R] /ToUnicode {unicode_id} 0 R >>").encode('latin-1'))
+
+    def to_unicode(self):
+        """ربط الحروف المستخدمة برموزها حتى يمكن البحث والنسخ من الملف"""
+        reverse = {}
+        for code, glyph in self.font.cmap.items():
+            if glyph in self.used and (glyph not in reverse or 0xFB50 <= reverse[glyph]):
+                reverse[glyph] = code
+        entries = [f"<{glyph:04X}> <{reverse[glyph]:04X}>" for glyph in sorted(reverse) if reverse[glyph] <= 0xFFFF]
+        lines = [
+            "/CIDInit /ProcSet findresource begin 12 dict begin begincmap",
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+            "/CMapName /Adobe-Identity-UCS def /CMapType 2 def",
+            "1 begincodespacerange <0000> <FFFF> endcodespacerange",
+        ]
+        for start in range(0, len(entries), 100):
+            chunk = entries[start:start + 100]
+            lines.append(f"{len(chunk)} beginbfchar")
+            lines.extend(chunk)
+            lines.append("endbfchar")
+        lines.append("endcmap CMapName currentdict /CMap defineresource pop end end")
+        return "\n".join(lines).encode('latin-1')
+
+
+def render_cards(children, path, font_path=None, progress=None):
+    """طباعة بطاقات الأطفال في ملف PDF وإرجاع عدد الصفحات"""
+    return CardRenderer(find_font(font_path)).render(children, path, progress)
@@ -0,0 +1,350 @@
+"""قواعد جدولة التطعيمات بدون واجهة رسومية
+
+تعمل جميع الدوال على سجلات عادية: الطفل قاموس، والجرعة قائمة بنفس ترتيب
+أعمدة جدول التطعيمات (التاريخ، نوع التطعيم، الجرعة، الملاحظات، الحالة، الفئة العمرية).
+"""
+import calendar
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, timedelta
+
+from age_service import AgeService, reference_date
+
+# جميع التطعيمات المتاحة للتعويض
+ALL_VACCINES = {
+    "B.C.G": {"name": "بي سي جي", "doses": ["جرعة وحيدة"]},
+    "O.P.V": {"name": "شلل الأطفال الفموي", "doses": ["الجرعة الأولى", "الجرعة الثانية", "الجرعة الثالثة", "جرعة منشطة"]},
+    "Hep.B": {"name": "الالتهاب الكبدي البائي", "doses": ["الجرعة الأولى", "الجرعة الثانية", "الجرعة الثالثة"]},
+    "HEXA": {"name": "السداسي", "doses": ["الجرعة الأولى", "الجرعة الثانية", "الجرعة الثالثة", "جرعة منشطة"]},
+    "ROTA": {"name": "الروتا", "doses": ["الجرعة الأولى", "الجرعة الثانية", "الجرعة الثالثة"]},
+    "PCV.13": {"name": "الالتهاب الرئوي 13", "doses": ["الجرعة الأولى", "الجرعة الثانية", "جرعة منشطة"]},
+    "MENG.A+CY+W135": {"name": "التهاب السحائي الرباعي", "doses": ["الجرعة الأولى", "الجرعة الثانية", "جرعة منشطة"]},
+    "M.M.R": {"name": "المركب الفيروسي", "doses": ["الجرعة الأولى", "الجرعة الثانية", "الجرعة الثالثة"]},
+    "Hep A": {"name": "الالتهاب الكبدي الألفي", "doses": ["الجرعة الأولى", "الجرعة الثانية"]},
+    "Chicken pox": {"name": "الجديري المائي", "doses": ["الجرعة الأولى"]},
+    "PENTA": {"name": "الخماسي", "doses": ["جرعة منشطة"]},
+    "TETRA": {"name": "الثلاثي البكتيري + شلل الأطفال بالحقن", "doses": ["جرعة منشطة"]},
+    "HPV": {"name": "الورم الحليمي (للبنات فقط)", "doses": ["الجرعة الأولى", "الجرعة الثانية", "الجرعة الثالثة"]},
+    "Tdap": {"name": "الثلاثي البكتيري", "doses": ["جرعة منشطة"]}
+}
+
+# الفترات الزمنية الدنيا بين الجرعات (بالأيام)
+VACCINE_INTERVALS = {
+    "ROTA": 28,    # 28 يوم بين الجرعات
+    "MENG.A+CY+W135": 90,  # 90 يوم بين الجرعات
+    "M.M.R": 120,   # 120 يوم بين الجرعات
+    "HPV": 30,     # 30 يوم بين الجرعات
+    "Hep A": 180,   # 180 يوم بين الجرعات
+    "Hep.B": 30,    # 30 يوم بين الجرعات
+    "default": 21   # 21 يوم كحد أدنى للتطعيمات الأخرى
+}
+
+# التطعيمات المتاحة للتعويض حسب العمر الأدنى بالشهور
+COMPENSATION_SCHEDULE = [
+    (0, ["B.C.G", "O.P.V", "Hep.B"]),            # جميع الأعمار
+    (2, ["HEXA", "ROTA", "PCV.13"]),             # عمر شهرين فما فوق
+    (9, ["MENG.A+CY+W135"]),                     # عمر 9 أشهر فما فوق
+    (12, ["M.M.R", "Hep A", "Chicken pox"]),     # عمر 12 شهر فما فوق
+    (18, ["PENTA"]),                             # عمر 18 شهر فما فوق
+    (72, ["TETRA"]),                             # عمر 6 سنوات فما فوق
+    (144, ["HPV", "Tdap"]),                      # عمر 12 سنة فما فوق
+]
+
+# القيود الخاصة (Chicken pox و M.M.R لا يعطيان معاً)
+VACCINE_RESTRICTIONS = {
+    "Chicken pox": ["M.M.R"],
+    "M.M.R": ["Chicken pox"]
+}
+
+# حدود الفئات العمرية: أقل من عدد الأشهر ← الفئة
+AGE_THRESHOLDS = [
+    (2, "حديثي الولادة"),    # أقل من شهرين
+    (4, "عمر الشهرين"),      # أقل من 4 أشهر
+    (6, "عمر 4 أشهر"),       # أقل من 6 أشهر
+    (9, "عمر 6 أشهر"),       # أقل من 9 أشهر
+    (12, "عمر 9 أشهر"),      # أقل من 12 شهر
+    (15, "عمر 12 شهر"),      # أقل من 15 شهر
+    (18, "عمر 15 شهر"),      # أقل من 18 شهر
+    (24, "عمر 18 شهر"),      # أقل من سنتين
+    (72, "عمر 6 سنوات"),     # أقل من 6 سنوات
+    (144, "عمر 12 سنة"),     # أقل من 12 سنة
+]
+OLDEST_AGE_CATEGORY = "عمر 15 سنة"
+
+
+class VaccineRule:
+    """قواعد تطعيم واحد بعد التجميع"""
+
+    def __init__(self, code, index, name, doses, interval, conflicts, min_age_months):
+        self.code = code
+        self.index = index
+        self.name = name
+        self.doses = doses
+        # الجرعة ← ترتيبها في قائمة الجرعات
+        self.dose_index = {dose: i for i, dose in enumerate(doses)}
+        self.interval = interval
+        self.conflicts = frozenset(conflicts)
+        self.min_age_months = min_age_months
+
+
+class RuleTable:
+    """جدول قواعد مجمّع مسبقاً: كود التطعيم ← الجرعات والفترة والتعارضات والعمر الأدنى"""
+
+    def __init__(self, all_vaccines=ALL_VACCINES, vaccine_intervals=VACCINE_INTERVALS,
+                 vaccine_restrictions=VACCINE_RESTRICTIONS, compensation_schedule=COMPENSATION_SCHEDULE,
+                 age_thresholds=AGE_THRESHOLDS, clock=None, oldest_age_category=OLDEST_AGE_CATEGORY,
+                 version="", effective_from=None):
+        self.all_vaccines = all_vaccines
+        self.vaccine_intervals = vaccine_intervals
+        self.vaccine_restrictions = vaccine_restrictions
+        self.compensation_schedule = compensation_schedule
+        self.age_thresholds = age_thresholds
+        self.default_interval = vaccine_intervals["default"]
+        # إصدار الجدول وتاريخ بدء العمل به (None: الجدول المدمج الساري منذ البداية)
+        self.version = version
+        self.effective_from = effective_from
+        # ساعة مشتركة لكل حسابات العمر والفترات (قابلة للتثبيت في التقارير)
+        self.ages = AgeService(age_thresholds, oldest_age_category, clock)
+        # الفئات العمرية من الأصغر للأكبر (كما تُعرض في نموذج الإدخال)
+        self.age_categories = [category for limit, category in age_thresholds] + [oldest_age_category]
+
+        min_age = {}
+        # سلم التعويض للبحث الثنائي: العمر الأدنى ← جميع التطعيمات المتاحة من هذا العمر فأقل
+        self.compensation_ages = []
+        self.compensation_lists = [()]
+        for min_age_months, vaccines in sorted(compensation_schedule, key=lambda step: step[0]):
+            for code in vaccines:
+                min_age.setdefault(code, min_age_months)
+            self.compensation_ages.append(min_age_months)
+            self.compensation_lists.append(self.compensation_lists[-1] + tuple(vaccines))
+
+        self.vaccines = {
+            code: VaccineRule(
+                code, index, info["name"], info["doses"],
+                vaccine_intervals.get(code, self.default_interval),
+                vaccine_restrictions.get(code, ()),
+                min_age.get(code, 0),
+            )
+            for index, (code, info) in enumerate(all_vaccines.items())
+        }
+
+    def for_date(self, day=None):
+        """الجدول الساري في تاريخ معين (جدول واحد: نفسه دائماً)"""
+        return self
+
+    # ---------------- العمر ----------------
+
+    def calculate_exact_age(self, birth_date, today=None):
+        """حساب العمر بالضبط (سنة، شهر، يوم)"""
+        return self.ages.exact_age(birth_date, today)
+
+    def age_category_for_months(self, total_months):
+        """الفئة العمرية لعدد أشهر معين"""
+        return self.ages.category_for_months(total_months)
+
+    def calculate_age_category(self, birth_date, today=None):
+        """حساب الفئة العمرية"""
+        return self.ages.age_category(birth_date, today)
+
+    # ---------------- التطعيمات ----------------
+
+    def get_compensation_vaccines(self, child_age_months):
+        """الحصول على التطعيمات المناسبة للتعويض بناءً على العمر"""
+        return list(self.compensation_lists[bisect_right(self.compensation_ages, child_age_months)])
+
+    def check_vaccine_interval(self, vaccine_code, dose, last_vaccination_date, today=None):
+        """التحقق من الفترة الزمنية بين الجرعات"""
+        if not last_vaccination_date:
+            return True, "يمكن إعطاء الجرعة الأولى"
+
+        try:
+            last_date = parse_date(last_vaccination_date)
+            today = reference_date(today) or self.ages.today()
+            days_passed = (today - last_date).days
+
+            # الحصول على الفترة المطلوبة
+            rule = self.vaccines.get(vaccine_code)
+            required_interval = rule.interval if rule else self.default_interval
+
+            if days_passed >= required_interval:
+                return True, f"مرت {days_passed} يوم - يمكن إعطاء الجرعة"
+            else:
+                days_remaining = required_interval - days_passed
+                return False, f"لم تمر الفترة الكافية. باقي {days_remaining} يوم"
+
+        except (ValueError, TypeError):
+            return True, "غير معروف - يمكن المحاولة"
+
+    def check_vaccine_restrictions(self, selected_vaccine, existing_vaccines):
+        """التحقق من القيود الخاصة بين التطعيمات"""
+        rule = self.vaccines.get(selected_vaccine)
+        if rule and rule.conflicts:
+            # existing_vaccines يفضل أن يكون مجموعة أو DoseIndex.codes() للبحث المباشر
+            for vaccine in rule.conflicts:
+                if vaccine in existing_vaccines:
+                    return False, f"{selected_vaccine} لا يمكن إعطاؤه مع {vaccine}"
+        return True, "لا توجد قيود"
+
+    def due_vaccines(self, birth_date, vaccinations, today=None):
+        """التطعيمات المستحقة لطفل: الجرعة التالية لكل تطعيم مناسب للعمر وهل يمكن إعطاؤها"""
+        today = reference_date(today) or self.ages.today()
+        years, months, days = self.calculate_exact_age(birth_date, today)
+        doses = DoseIndex(vaccinations)
+        existing = doses.codes()
+        due = []
+        for code in self.get_compensation_vaccines(years * 12 + months):
+            rule = self.vaccines.get(code)
+            if rule is None:
+                continue
+            count = doses.dose_count(code)
+            if count >= len(rule.doses):
+                continue
+            can_give, message = self.check_vaccine_interval(code, rule.doses[count], doses.last_date(code), today)
+            allowed, restriction = self.check_vaccine_restrictions(code, existing)
+            if not allowed:
+                can_give, message = False, restriction
+            due.append({
+                "vaccine_code": code,
+                "vaccine_name": rule.name,
+                "dose": rule.doses[count],
+                "can_give": can_give,
+                "message": message,
+            })
+        return due
+
+    def next_due(self, birth_date, vaccinations, today=None):
+        """الجرعة التالية لكل تطعيم غير مكتمل وتاريخ استحقاقها: [(الكود، الجرعة، التاريخ)]
+
+        تاريخ الاستحقاق هو الأبعد بين بلوغ العمر الأدنى وانقضاء الفترة منذ آخر جرعة،
+        وتُستبعد التطعيمات الممنوعة بسبب تطعيم متعارض (نفس منطق BatchEligibility).
+        """
+        try:
+            birth = parse_date(birth_date)
+        except (ValueError, TypeError):
+            return []
+        today = reference_date(today) or self.ages.today()
+        counts = {}
+        last_dates = {}
+        # الجرعة المكررة في السجل تُحتسب مرة واحدة (الجرعة باسم غير معروف تتميز بتاريخها)
+        seen = set()
+        for vaccination in vaccinations:
+            try:
+                dose_date = parse_date(vaccination[0])
+            except (ValueError, TypeError):
+                continue
+            # الجرعات المستقبلية لا تُحتسب
+            if dose_date > today:
+                continue
+            code = vaccine_code_of(vaccination[1])
+            rule = self.vaccines.get(code)
+            dose = vaccination[2] if rule and vaccination[2] in rule.dose_index else dose_date
+            if (code, dose) not in seen:
+                seen.add((code, dose))
+                counts[code] = counts.get(code, 0) + 1
+            if code not in last_dates or dose_date > last_dates[code]:
+                last_dates[code] = dose_date
+        age_dates = {}
+        due = []
+        for code, rule in self.vaccines.items():
+            count = counts.get(code, 0)
+            if count >= len(rule.doses) or not rule.conflicts.isdisjoint(counts):
+                continue
+            due_date = age_dates.get(rule.min_age_months)
+            if due_date is None:
+                due_date = age_dates[rule.min_age_months] = add_months(birth, rule.min_age_months)
+            last_date = last_dates.get(code)
+            if last_date is not None:
+                due_date = max(due_date, last_date + timedelta(days=rule.interval))
+            due.append((code, rule.doses[count], due_date))
+        return due
+
+    def get_last_vaccination_date(self, vaccinations, vaccine_code):
+        """الحصول على تاريخ آخر جرعة للتطعيم المحدد"""
+        return DoseIndex(vaccinations).last_date(vaccine_code)
+
+    def get_existing_vaccines(self, vaccinations):
+        """أكواد التطعيمات الموجودة في سجل الجرعات"""
+        return DoseIndex(vaccinations).codes()
+
+
+class DoseIndex:
+    """فهرس جرعات طفل واحد: كود التطعيم ← تواريخ الجرعات مرتبة
+
+    يُحدَّث عند إضافة جرعة أو حذفها بدلاً من المرور على كامل الجدول،
+    فيصبح آخر تاريخ O(1) والإضافة والحذف O(log n).
+    """
+
+    def __init__(self, vaccinations=()):
+        self.dates = {}
+        # جرعات بتاريخ غير صالح: تُحتسب في وجود التطعيم دون تاريخ
+        self.undated = {}
+        for vaccination in vaccinations:
+            self.add(vaccination)
+
+    def add(self, vaccination):
+        """إضافة جرعة (قائمة بترتيب أعمدة الجدول)"""
+        code = vaccine_code_of(vaccination[1])
+        try:
+            dose_date = parse_date(vaccination[0])
+        except (ValueError, TypeError):
+            self.undated[code] = self.undated.get(code, 0) + 1
+            return
+        insort(self.dates.setdefault(code, []), dose_date)
+
+    def remove(self, vaccination):
+        """إزالة جرعة محذوفة"""
+        code = vaccine_code_of(vaccination[1])
+        try:
+            dose_date = parse_date(vaccination[0])
+        except (ValueError, TypeError):
+            if self.undated.get(code, 0) > 1:
+                self.undated[code] -= 1
+            else:
+                self.undated.pop(code, None)
+            return
+        dates = self.dates.get(code, [])
+        position = bisect_left(dates, dose_date)
+        if position < len(dates) and dates[position] == dose_date:
+            del dates[position]
+            if not dates:
+                del self.dates[code]
+
+    def last_date(self, vaccine_code):
+        """تاريخ آخر جرعة للتطعيم أو None"""
+        dates = self.dates.get(vaccine_code)
+        return dates[-1] if dates else None
+
+    def dose_count(self, vaccine_code):
+        """عدد الجرعات المسجلة للتطعيم"""
+        return len(self.dates.get(vaccine_code, ())) + self.undated.get(vaccine_code, 0)
+
+    def codes(self):
+        """مجموعة أكواد التطعيمات المسجلة"""
+        return self.dates.keys() | self.undated.keys()
+
+
+def vaccine_code_of(vaccine_type):
+    """استخراج كود التطعيم من النص المعروض 'الكود - الاسم'"""
+    return str(vaccine_type).split(" - ")[0]
+
+
+def add_months(day, months):
+    """إضافة أشهر لتاريخ مع قص اليوم لآخر الشهر"""
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def parse_date(value):
+    """تحويل 'YYYY-MM-DD' (أو كائن date) إلى date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and len(value) == 10:
+        # المسار السريع للصيغة المعتادة بأصفار بادئة
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, "%Y-%m-%d").date()
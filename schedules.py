@@ -0,0 +1,253 @@
+"""إصدارات جدول التطعيمات الوطني من ملفات بيانات مع إعادة التحميل أثناء التشغيل
+
+كل ملف JSON في مجلد الجداول إصدار يبدأ العمل به من effective_from، وما لم يذكره
+الملف من أقسام يُؤخذ من الإصدار السابق له (أولها الجدول المدمج في rules.py).
+كل إصدار يُجمَّع مرة واحدة في RuleTable، وتقييم جرعة أو طفل في تاريخ معين يستخدم
+الإصدار الساري في ذلك التاريخ (بحث ثنائي في تواريخ البدء مع ذاكرة لكل يوم).
+
+مثال ملف schedules/2026-01-01.json (تحديث فترة الروتا فقط):
+    {"version": "2026.1", "effective_from": "2026-01-01",
+     "intervals": {"ROTA": 35, "default": 21}}
+"""
+import json
+import os
+from bisect import bisect_right
+from datetime import date
+
+from age_service import reference_date
+from rules import (AGE_THRESHOLDS, ALL_VACCINES, COMPENSATION_SCHEDULE, OLDEST_AGE_CATEGORY,
+                   VACCINE_INTERVALS, VACCINE_RESTRICTIONS, RuleTable, parse_date)
+
+# أقسام ملف الجدول ← معاملات RuleTable
+SECTIONS = {
+    "vaccines": "all_vaccines",
+    "intervals": "vaccine_intervals",
+    "restrictions": "vaccine_restrictions",
+    "compensation": "compensation_schedule",
+    "age_thresholds": "age_thresholds",
+    "oldest_age_category": "oldest_age_category",
+}
+BUILTIN_VERSION = "مدمج"
+
+
+class ScheduleError(Exception):
+    """ملف جدول تطعيمات غير صالح"""
+
+
+def builtin_schedule():
+    """الجدول المدمج بصيغة ملفات الجداول (نقطة بداية لإصدار جديد)"""
+    return {
+        "version": BUILTIN_VERSION,
+        "effective_from": None,
+        "vaccines": ALL_VACCINES,
+        "intervals": VACCINE_INTERVALS,
+        "restrictions": VACCINE_RESTRICTIONS,
+        "compensation": [[months, list(vaccines)] for months, vaccines in COMPENSATION_SCHEDULE],
+        "age_thresholds": [[months, category] for months, category in AGE_THRESHOLDS],
+        "oldest_age_category": OLDEST_AGE_CATEGORY,
+    }
+
+
+def read_schedule(path):
+    """قراءة ملف إصدار والتحقق من صيغته؛ يعيد القاموس مع effective_from كـ date"""
+    name = os.path.basename(path)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            definition = json.load(f)
+    except (OSError, ValueError) as error:
+        raise ScheduleError(f"{name}: تعذرت قراءة الملف ({error})")
+    if not isinstance(definition, dict):
+        raise ScheduleError(f"{name}: الملف ليس كائن JSON")
+    try:
+        definition["effective_from"] = parse_date(definition.get("effective_from"))
+    except (ValueError, TypeError):
+        raise ScheduleError(f"{name}: effective_from يجب أن يكون تاريخاً بصيغة YYYY-MM-DD")
+    definition.setdefault("version", os.path.splitext(name)[0])
+    unknown = set(definition) - set(SECTIONS) - {"version", "effective_from"}
+    if unknown:
+        raise ScheduleError(f"{name}: أقسام غير معروفة: {', '.join(sorted(unknown))}")
+    return definition
+
+
+def check_schedule(schedule):
+    """التحقق من إصدار كامل (بعد إكماله من الإصدار السابق) وتحويل سلالمه إلى صفوف"""
+    version = schedule["version"]
+    for section in ("vaccines", "intervals", "restrictions"):
+        if not isinstance(schedule[section], dict):
+            raise ScheduleError(f"{version}: القسم {section} يجب أن يكون كائناً")
+    for section in ("compensation", "age_thresholds"):
+        # الأقسام الموروثة من إصدار سابق محولة إلى صفوف (tuple) مسبقاً
+        steps = schedule[section]
+        if not isinstance(steps, (list, tuple)) or not all(isinstance(step, (list, tuple)) for step in steps):
+            raise ScheduleError(f"{version}: القسم {section} يجب أن يكون قائمة صفوف")
+    vaccines = schedule["vaccines"]
+    for code, info in vaccines.items():
+        if not isinstance(info, dict) or not isinstance(info.get("name"), str) or not info.get("doses"):
+            raise ScheduleError(f"{version}: التطعيم {code} يحتاج name و doses")
+    intervals = schedule["intervals"]
+    if not isinstance(intervals.get("default"), int) or any(
+            not isinstance(days, int) or days < 0 for days in intervals.values()):
+        raise ScheduleError(f"{version}: الفترات أعداد أيام صحيحة مع قيمة default")
+    for section in ("compensation", "age_thresholds"):
+        steps = [tuple(step) for step in schedule[section]]
+        if any(len(step) != 2 for step in steps):
+            raise ScheduleError(f"{version}: {section} صفوف [الأشهر، القيمة]")
+        months = [step[0] for step in steps]
+        if not all(isinstance(month, int) for month in months) or months != sorted(set(months)):
+            raise ScheduleError(f"{version}: {section} صفوف [الأشهر، القيمة] بأشهر متزايدة")
+        schedule[section] = steps
+    for months, codes in schedule["compensation"]:
+        unknown = [code for code in codes if code not in vaccines]
+        if unknown:
+            raise ScheduleError(f"{version}: تطعيمات غير معرفة في compensation: {', '.join(unknown)}")
+    return schedule
+
+
+def compile_schedules(definitions, clock=None):
+    """جداول RuleTable مرتبة حسب تاريخ البدء، أولها الجدول المدمج"""
+    definitions = sorted(definitions, key=lambda definition: definition["effective_from"])
+    tables = [RuleTable(clock=clock, version=BUILTIN_VERSION)]
+    schedule = builtin_schedule()
+    for definition in definitions:
+        if definition["effective_from"] == schedule["effective_from"]:
+            raise ScheduleError(f"الإصداران {schedule['version']} و{definition['version']} يبدآن بنفس التاريخ")
+        schedule = check_schedule(dict(schedule, **definition))
+        tables.append(RuleTable(
+            clock=clock, version=schedule["version"], effective_from=schedule["effective_from"],
+            **{argument: schedule[section] for section, argument in SECTIONS.items()}
+        ))
+    return tables
+
+
+class ScheduleRules:
+    """جميع إصدارات الجدول بنفس واجهة RuleTable
+
+    كل دالة تستقبل تاريخاً اختيارياً (today أو تاريخ الجرعة) وتستخدم الإصدار الساري فيه،
+    واليوم إن لم يُحدد. لتقييم عدة عمليات بنفس التاريخ يُفضّل أخذ الجدول مرة واحدة
+    بـ for_date ثم استدعاء دواله مباشرة.
+    """
+
+    def __init__(self, directory=None, clock=None):
+        self.directory = directory
+        self.clock = clock or date.today
+        # بصمة ملفات المجلد عند آخر تحميل (None: لم يُحمّل بعد)
+        self.stamp = None
+        self.install(compile_schedules([], clock))
+
+    def install(self, tables):
+        # الحالة تُستبدل بإسناد واحد: الخيوط الأخرى ترى الإصدارات القديمة أو الجديدة كاملة
+        self.state = ([table.effective_from.toordinal() if table.effective_from else 0 for table in tables],
+                      tables, {})
+
+    # ---------------- التحميل ----------------
+
+    def directory_stamp(self):
+        """(الاسم، زمن التعديل، الحجم) لكل ملف جدول في المجلد"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return ()
+        stamp = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json") and entry.is_file():
+                info = entry.stat()
+                stamp.append((entry.name, info.st_mtime_ns, info.st_size))
+        return tuple(sorted(stamp))
+
+    def reload_if_changed(self):
+        """إعادة التحميل إن تغيرت ملفات المجلد؛ يعيد True إن تغيرت
+
+        الملف غير الصالح يرفع ScheduleError مرة واحدة وتبقى الإصدارات السابقة
+        مستخدمة حتى يُصحح الملف.
+        """
+        stamp = self.directory_stamp()
+        if stamp == self.stamp:
+            return False
+        self.stamp = stamp
+        self.install(compile_schedules(
+            [read_schedule(os.path.join(self.directory, name)) for name, mtime, size in stamp], self.clock))
+        return True
+
+    def versions(self):
+        """[(الإصدار، تاريخ البدء)] بالترتيب"""
+        return [(table.version, table.effective_from) for table in self.state[1]]
+
+    # ---------------- اختيار الإصدار ----------------
+
+    def today(self):
+        return reference_date(self.clock())
+
+    def for_date(self, day=None):
+        """الجدول المجمّع الساري في تاريخ معين (اليوم إن لم يُحدد)"""
+        starts, tables, by_day = self.state
+        if len(tables) == 1:
+            return tables[0]
+        day = reference_date(day) or self.today()
+        table = by_day.get(day)
+        if table is None:
+            table = by_day[day] = tables[bisect_right(starts, day.toordinal()) - 1]
+        return table
+
+    @property
+    def current(self):
+        return self.for_date()
+
+    # الجداول المشتقة من الإصدار الساري اليوم
+    all_vaccines = property(lambda self: self.current.all_vaccines)
+    vaccine_intervals = property(lambda self: self.current.vaccine_intervals)
+    vaccine_restrictions = property(lambda self: self.current.vaccine_restrictions)
+    compensation_schedule = property(lambda self: self.current.compensation_schedule)
+    age_thresholds = property(lambda self: self.current.age_thresholds)
+    age_categories = property(lambda self: self.current.age_categories)
+    default_interval = property(lambda self: self.current.default_interval)
+    vaccines = property(lambda self: self.current.vaccines)
+    ages = property(lambda self: self.current.ages)
+    version = property(lambda self: self.current.version)
+
+    # ---------------- نفس دوال RuleTable ----------------
+
+    def calculate_exact_age(self, birth_date, today=None):
+        """حساب العمر بالضبط (سنة، شهر، يوم)"""
+        return self.for_date(today).calculate_exact_age(birth_date, today)
+
+    def age_category_for_months(self, total_months, today=None):
+        """الفئة العمرية لعدد أشهر معين"""
+        return self.for_date(today).age_category_for_months(total_months)
+
+    def calculate_age_category(self, birth_date, today=None):
+        """حساب الفئة العمرية بحدود الإصدار الساري في تاريخ المرجع"""
+        return self.for_date(today).calculate_age_category(birth_date, today)
+
+    def get_compensation_vaccines(self, child_age_months, today=None):
+        """الحصول على التطعيمات المناسبة للتعويض بناءً على العمر"""
+        return self.for_date(today).get_compensation_vaccines(child_age_months)
+
+    def check_vaccine_interval(self, vaccine_code, dose, last_vaccination_date, today=None):
+        """التحقق من الفترة بين الجرعات بقواعد الإصدار الساري في تاريخ الجرعة (today)"""
+        return self.for_date(today).check_vaccine_interval(vaccine_code, dose, last_vaccination_date, today)
+
+    def check_vaccine_restrictions(self, selected_vaccine, existing_vaccines, today=None):
+        """التحقق من القيود الخاصة بين التطعيمات بقواعد الإصدار الساري في تاريخ الجرعة"""
+        return self.for_date(today).check_vaccine_restrictions(selected_vaccine, existing_vaccines)
+
+    def due_vaccines(self, birth_date, vaccinations, today=None):
+        """التطعيمات المستحقة لطفل في تاريخ المرجع"""
+        return self.for_date(today).due_vaccines(birth_date, vaccinations, today)
+
+    def next_due(self, birth_date, vaccinations, today=None):
+        """الجرعة التالية لكل تطعيم غير مكتمل وتاريخ استحقاقها"""
+        return self.for_date(today).next_due(birth_date, vaccinations, today)
+
+    def get_last_vaccination_date(self, vaccinations, vaccine_code):
+        """الحصول على تاريخ آخر جرعة للتطعيم المحدد (لا يعتمد على إصدار الجدول)"""
+        return self.current.get_last_vaccination_date(vaccinations, vaccine_code)
+
+    def get_existing_vaccines(self, vaccinations):
+        """أكواد التطعيمات الموجودة في سجل الجرعات (لا يعتمد على إصدار الجدول)"""
+        return self.current.get_existing_vaccines(vaccinations)
+
+
+def write_schedule_template(path, effective_from):
+    """ملف إصدار جديد بمحتوى الجدول المدمج لتعديله"""
+    effective_from = parse_date(effective_from).isoformat()
+    schedule = dict(builtin_schedule(), version=effective_from, effective_from=effective_from)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(schedule, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,103 @@
+"""فهرس بحث تقريبي بالأسماء العربية (n-gram ثلاثي)"""
+import heapq
+import re
+from collections import Counter
+
+# حقول الاسم الرباعي واسم الأم
+NAME_FIELDS = ["entry_name", "entry_father_name", "entry_grandfather_name", "entry_surname", "entry_mother_name"]
+
+# التشكيل وعلامة المد الصغيرة
+DIACRITICS = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]")
+TATWEEL = "\u0640"
+
+LETTER_MAP = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي",
+    "ؤ": "و",
+    "ة": "ه",
+    "ء": None,
+})
+
+
+def normalize_arabic(text):
+    """توحيد أشكال الحروف وحذف التشكيل والتطويل"""
+    text = DIACRITICS.sub("", text or "").replace(TATWEEL, "")
+    text = text.translate(LETTER_MAP).lower()
+    return " ".join(text.split())
+
+
+def trigrams(text):
+    """مقاطع ثلاثية لكل كلمة مع حشو بمسافة من الطرفين"""
+    grams = set()
+    for word in normalize_arabic(text).split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex:
+    """فهرس مقلوب من المقاطع الثلاثية إلى معرفات الأطفال"""
+
+    def __init__(self):
+        self.postings = {}
+        self.child_grams = {}
+
+    def build(self, children):
+        """بناء الفهرس من جميع السجلات"""
+        self.postings = {}
+        self.child_grams = {}
+        # الأسماء تتكرر كثيراً: مقاطع كل قيمة تُحسب مرة واحدة أثناء البناء
+        cache = {}
+        for child in children:
+            self.update(child, cache)
+
+    def update(self, child, cache=None):
+        """تحديث فهرس طفل واحد بعد الحفظ"""
+        child_id = child["child_id"]
+        self.remove(child_id)
+        if cache is None:
+            grams = trigrams(" ".join(child.get(field, "") for field in NAME_FIELDS))
+        else:
+            # مقاطع الاسم الكامل = اتحاد مقاطع أجزائه (كل كلمة تُحشى على حدة)
+            grams = set()
+            for field in NAME_FIELDS:
+                value = child.get(field, "")
+                part = cache.get(value)
+                if part is None:
+                    part = cache[value] = trigrams(value)
+                grams |= part
+        # صف بدل مجموعة: أصغر بعدة مرات ويكفي للمرور عليه ومعرفة عدده
+        self.child_grams[child_id] = tuple(grams)
+        postings = self.postings
+        for gram in grams:
+            ids = postings.get(gram)
+            if ids is None:
+                ids = postings[gram] = set()
+            ids.add(child_id)
+
+    def remove(self, child_id):
+        """إزالة طفل من الفهرس"""
+        for gram in self.child_grams.pop(child_id, ()):
+            ids = self.postings[gram]
+            ids.discard(child_id)
+            if not ids:
+                del self.postings[gram]
+
+    def search(self, query, limit=20, min_score=0.3):
+        """المرشحون مرتبون حسب نسبة المقاطع المشتركة مع الاستعلام"""
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        hits = Counter()
+        for gram in query_grams:
+            hits.update(self.postings.get(gram, ()))
+        threshold = min_score * len(query_grams)
+        candidates = (
+            # الأولوية لتغطية الاستعلام ثم لقصر الاسم المخزن
+            (count / len(query_grams), count / len(self.child_grams[child_id]), child_id)
+            for child_id, count in hits.items() if count >= threshold
+        )
+        return [
+            (child_id, round(score, 3))
+            for score, _, child_id in heapq.nlargest(limit, candidates)
+        ]
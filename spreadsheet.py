@@ -0,0 +1,80 @@
+"""كتابة الجداول إلى CSV و XLSX (بدون مكتبات خارجية)"""
+import csv
+import os
+import zipfile
+from html import escape as html_escape
+
+
+def escape(text):
+    """ترميز & و < و > في نص XML (xml.sax يستورد urllib وssl ويبطئ بدء التشغيل)"""
+    return html_escape(text, quote=False)
+
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>"""
+
+ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>"""
+
+SHEET_START = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<sheetViews><sheetView rightToLeft="1" workbookViewId="0"/></sheetViews>
+<sheetData>"""
+
+SHEET_END = "</sheetData></worksheet>"
+
+
+def write_csv(path, headers, rows):
+    """ملف CSV بترميز utf-8-sig حتى يفتحه Excel بالعربية مباشرة"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(rows)
+
+
+def xlsx_cell(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+    return f"<c><v>{value}</v></c>"
+
+
+def write_xlsx(path, headers, rows, sheet_name="التقرير"):
+    """ملف XLSX بورقة واحدة من اليمين لليسار؛ الصفوف تُكتب تدفقياً داخل الملف المضغوط"""
+    tmp_path = path + ".tmp"
+    with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES)
+        archive.writestr("_rels/.rels", ROOT_RELS)
+        archive.writestr("xl/workbook.xml", WORKBOOK.format(name=escape(sheet_name[:31])))
+        archive.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS)
+        with archive.open("xl/worksheets/sheet1.xml", 'w') as sheet:
+            sheet.write(SHEET_START.encode('utf-8'))
+            sheet.write(("<row>" + "".join(xlsx_cell(value) for value in headers) + "</row>").encode('utf-8'))
+            for row in rows:
+                sheet.write(("<row>" + "".join(xlsx_cell(value) for value in row) + "</row>").encode('utf-8'))
+            sheet.write(SHEET_END.encode('utf-8'))
+    os.replace(tmp_path, path)
+
+
+def write_table(path, headers, rows, sheet_name="التقرير"):
+    """الكتابة حسب امتداد الملف (.xlsx أو .csv)"""
+    if path.lower().endswith(".xlsx"):
+        write_xlsx(path, headers, rows, sheet_name)
+    else:
+        write_csv(path, headers, rows)
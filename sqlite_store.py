@@ -0,0 +1,261 @@
+"""مخزن سجلات الأطفال على SQLite مع فهارس للبحث"""
+import json
+import sqlite3
+import threading
+import uuid
+from itertools import islice
+
+from storage import INDEXED_FIELDS, RecordStore, StorageError, merge_child
+
+# حقول جدول الأطفال بنفس أسماء مفاتيح السجل
+CHILD_FIELDS = [
+    "entry_name", "entry_father_name", "entry_grandfather_name", "entry_surname",
+    "entry_mother_name", "birth_date", "gender", "nationality", "entry_passport",
+    "entry_phone", "entry_national_id", "entry_family_paper", "entry_registration_no",
+    "age_category",
+]
+
+VACCINATION_FIELDS = ["vaccination_date", "vaccine_type", "dose", "notes", "status", "age_category"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS children (
+    child_id TEXT PRIMARY KEY,
+    {", ".join(f"{field} TEXT NOT NULL DEFAULT ''" for field in CHILD_FIELDS)},
+    version INTEGER NOT NULL DEFAULT 0,
+    extra TEXT NOT NULL DEFAULT '{{}}'
+);
+CREATE TABLE IF NOT EXISTS vaccinations (
+    id INTEGER PRIMARY KEY,
+    child_id TEXT NOT NULL REFERENCES children(child_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    {", ".join(f"{field} TEXT NOT NULL DEFAULT ''" for field in VACCINATION_FIELDS)}
+);
+CREATE INDEX IF NOT EXISTS idx_vaccinations_child ON vaccinations(child_id, position);
+CREATE INDEX IF NOT EXISTS idx_children_entry_name ON children(entry_name);
+{"".join(f"CREATE INDEX IF NOT EXISTS idx_children_{field} ON children({field});" for field in INDEXED_FIELDS)}
+CREATE TABLE IF NOT EXISTS change_counter (id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL);
+INSERT OR IGNORE INTO change_counter VALUES (1, 0);
+{"".join(f"CREATE TRIGGER IF NOT EXISTS children_{event.lower()}_stamp AFTER {event} ON children "
+         f"BEGIN UPDATE change_counter SET value = value + 1; END;" for event in ("INSERT", "UPDATE", "DELETE"))}
+"""
+
+
+def column_text(value):
+    """قيمة عمود نصي (None تُحفظ فارغة لا 'None')"""
+    return "" if value is None else str(value)
+
+
+class SQLiteStore:
+    """مخزن بنفس واجهة RecordStore لكن بجداول مطبّعة وفهارس"""
+
+    def __init__(self, db_file, journal_mode="WAL"):
+        self.db_file = db_file
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        # WAL لا يعمل على مجلد مشترك عبر الشبكة؛ DELETE يحتاج synchronous=FULL ليتحمل انقطاع الكهرباء
+        self.conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.conn.execute("PRAGMA synchronous=" + ("NORMAL" if journal_mode.upper() == "WAL" else "FULL"))
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(children)")}
+        if "version" not in columns:
+            # قاعدة من إصدار سابق بدون أرقام إصدارات
+            self.conn.execute("ALTER TABLE children ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            self.conn.commit()
+
+    # ---------------- القراءة ----------------
+
+    def row_to_child(self, row, vaccinations):
+        """تحويل صف من الجدول إلى سجل طفل"""
+        child = json.loads(row[-1])
+        child["child_id"] = row[0]
+        child.update(zip(CHILD_FIELDS, row[1:-2]))
+        child["version"] = row[-2]
+        child["vaccinations"] = vaccinations
+        return child
+
+    def fetch_children(self, where="", params=()):
+        """جلب الأطفال مع تطعيماتهم"""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT child_id, {', '.join(CHILD_FIELDS)}, version, extra FROM children {where}", params
+            ).fetchall()
+            if not rows:
+                return []
+            vaccinations = {row[0]: [] for row in rows}
+            if where:
+                ids = list(vaccinations)
+                # حد SQLite لعدد المعاملات في الاستعلام الواحد
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    self.collect_vaccinations(
+                        vaccinations,
+                        f"WHERE child_id IN ({', '.join('?' * len(chunk))})", chunk,
+                    )
+            else:
+                self.collect_vaccinations(vaccinations)
+        return [self.row_to_child(row, vaccinations[row[0]]) for row in rows]
+
+    def collect_vaccinations(self, vaccinations, where="", params=()):
+        """تجميع التطعيمات حسب الطفل بترتيب إدخالها"""
+        cursor = self.conn.execute(
+            f"SELECT child_id, {', '.join(VACCINATION_FIELDS)} FROM vaccinations {where} "
+            f"ORDER BY child_id, position", params
+        )
+        for row in cursor:
+            if row[0] in vaccinations:
+                vaccinations[row[0]].append(list(row[1:]))
+
+    def load_all(self):
+        """جميع الأطفال كقائمة"""
+        return self.fetch_children()
+
+    def iter_children(self, batch_size=1000):
+        """المرور على جميع الأطفال على دفعات دون تحميلهم كلهم في الذاكرة"""
+        last_id = ""
+        while True:
+            batch = self.fetch_children(
+                "WHERE child_id > ? ORDER BY child_id LIMIT ?", (last_id, batch_size)
+            )
+            if not batch:
+                return
+            yield from batch
+            last_id = batch[-1]["child_id"]
+
+    def page(self, offset, limit, order_by="entry_name", descending=False):
+        """صفحة من الأطفال مرتبة حسب أحد الحقول"""
+        if order_by not in CHILD_FIELDS:
+            raise ValueError(f"لا يمكن الترتيب حسب {order_by}")
+        direction = "DESC" if descending else "ASC"
+        return self.fetch_children(
+            f"ORDER BY {order_by} {direction}, child_id {direction} LIMIT ? OFFSET ?", (limit, offset)
+        )
+
+    def get(self, child_id):
+        """سجل طفل واحد أو None"""
+        children = self.fetch_children("WHERE child_id = ?", (child_id,))
+        return children[0] if children else None
+
+    def find(self, field, value):
+        """البحث المطابق في أحد الحقول المفهرسة"""
+        if field not in INDEXED_FIELDS:
+            raise ValueError(f"الحقل {field} غير مفهرس")
+        return self.fetch_children(f"WHERE {field} = ?", (value,))
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM children").fetchone()[0]
+
+    def change_stamp(self):
+        """عداد يزيد مع أي تعديل على جدول الأطفال (تزيده المحفزات من أي اتصال)"""
+        with self.lock:
+            return self.conn.execute("SELECT value FROM change_counter").fetchone()[0]
+
+    # ---------------- الكتابة ----------------
+
+    def current_version(self, child_id):
+        """إصدار الطفل الحالي أو 0 إن لم يكن موجوداً"""
+        row = self.conn.execute("SELECT version FROM children WHERE child_id = ?", (child_id,)).fetchone()
+        return row[0] if row else 0
+
+    def write_child(self, child, keep_version=False):
+        """كتابة سجل طفل داخل معاملة مفتوحة برقم إصدار جديد (أو بإصداره كما هو عند الترحيل)"""
+        child_id = child.get("child_id") or uuid.uuid4().hex
+        extra = {
+            key: value for key, value in child.items()
+            if key not in CHILD_FIELDS and key not in ("child_id", "vaccinations", "version")
+        }
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO children (child_id, {', '.join(CHILD_FIELDS)}, version, extra) "
+            f"VALUES ({', '.join('?' * (len(CHILD_FIELDS) + 1))}, "
+            f"{'?' if keep_version else 'COALESCE((SELECT version FROM children WHERE child_id = ?), 0) + 1'}, ?)",
+            [child_id] + [column_text(child.get(field)) for field in CHILD_FIELDS]
+            + [child.get("version", 0) if keep_version else child_id, json.dumps(extra, ensure_ascii=False)],
+        )
+        self.conn.execute("DELETE FROM vaccinations WHERE child_id = ?", (child_id,))
+        self.conn.executemany(
+            f"INSERT INTO vaccinations (child_id, position, {', '.join(VACCINATION_FIELDS)}) "
+            f"VALUES ({', '.join('?' * (len(VACCINATION_FIELDS) + 2))})",
+            [
+                [child_id, position] + [column_text(value) for value in vaccination]
+                for position, vaccination in enumerate(child.get("vaccinations", []))
+            ],
+        )
+        return child_id
+
+    def save(self, child, base=None):
+        """حفظ طفل مع التحقق من الإصدار وإرجاع السجل المحفوظ (مثل RecordStore.save)"""
+        return self.save_many([(child, base)])[0]
+
+    def save_many(self, items):
+        """حفظ أزواج (السجل، base) في معاملة واحدة؛ عند أي تعارض لا يُحفظ شيء"""
+        saved = []
+        with self.lock, self.conn:
+            # قفل الكتابة من البداية حتى لا تتغير النسخة بين القراءة والكتابة
+            self.conn.execute("BEGIN IMMEDIATE")
+            for child, base in items:
+                child = dict(child)
+                if not child.get("child_id"):
+                    child["child_id"] = uuid.uuid4().hex
+                base = base or {}
+                current = self.get(child["child_id"])
+                if current is not None and current["version"] != base.get("version", 0):
+                    child = merge_child(base, child, current)
+                elif current is None and base.get("version"):
+                    raise StorageError("تم حذف السجل من مستخدم آخر")
+                self.write_child(child)
+                child["version"] = self.current_version(child["child_id"])
+                saved.append(child)
+        return saved
+
+    def put(self, child):
+        """حفظ سجل طفل واحد وإرجاع معرفه"""
+        return self.put_many([child])[0]
+
+    def put_many(self, children):
+        """حفظ عدة سجلات في معاملة واحدة"""
+        with self.lock, self.conn:
+            return [self.write_child(child) for child in children]
+
+    def delete(self, child_id):
+        """حذف سجل طفل"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM children WHERE child_id = ?", (child_id,))
+
+    def replace_all(self, children):
+        """استبدال السجل كاملاً في معاملة واحدة"""
+        with self.lock, self.conn:
+            kept = [self.write_child(child) for child in children]
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS kept_ids (child_id TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM kept_ids")
+            self.conn.executemany("INSERT OR IGNORE INTO kept_ids VALUES (?)", [(i,) for i in kept])
+            self.conn.execute("DELETE FROM children WHERE child_id NOT IN (SELECT child_id FROM kept_ids)")
+
+    def close(self):
+        """إغلاق الاتصال"""
+        with self.lock:
+            self.conn.close()
+
+
+def migrate_json(json_file, db_file, batch_size=1000):
+    """ترحيل children_data.json (مع سجل تغييراته) إلى قاعدة SQLite
+
+    الأطفال يُكتبون على دفعات دون تحميل السجل كاملاً، وبأرقام إصداراتهم كما هي
+    حتى لا تُقبل بعد الترحيل تعديلات محطة بدأت من نسخة أقدم.
+    """
+    source = RecordStore(json_file)
+    target = SQLiteStore(db_file)
+    try:
+        count = 0
+        children = source.iter_children()
+        while True:
+            batch = list(islice(children, batch_size))
+            if not batch:
+                return count
+            with target.lock, target.conn:
+                for child in batch:
+                    target.write_child(child, keep_version=True)
+            count += len(batch)
+    finally:
+        source.close()
+        target.close()
@@ -0,0 +1,728 @@
+"""مخزن سجلات الأطفال: لقطة كاملة + سجل تغييرات إلحاقي لكل محطة عمل"""
+import copy
+import gc
+import glob
+import json
+import marshal
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+import zlib
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+
+from model import Child, merge_table_state, table_state
+
+try:
+    import fcntl
+except ImportError:  # ويندوز
+    fcntl = None
+    import msvcrt
+
+
+# الحقول التي يمكن البحث بها مطابقةً (نفسها في مخزن SQLite)
+INDEXED_FIELDS = [
+    "entry_national_id", "entry_passport", "entry_family_paper",
+    "entry_registration_no", "entry_mother_name", "birth_date",
+]
+
+# عدد أقفال السجلات في ملف الأقفال (كل طفل يقع في خانة حسب معرفه)
+LOCK_SLOTS = 4096
+# خانة قفل الضغط بعد خانات السجلات
+COMPACTION_SLOT = LOCK_SLOTS
+# سجلات محجوزة في هذه العملية (أقفال النظام لا تمنع نفس العملية من حجز الملف مرتين)
+CLAIMED_LOGS = set()
+
+# نسخة ثنائية من اللقطة (children_data.json.bin) تُقرأ عند بدء التشغيل بدل تحليل JSON
+SNAPSHOT_CACHE_FORMAT = 3
+
+# مساحة أسماء معرفات السجلات القديمة (uuid5 من موضع السجل ومحتواه)
+LEGACY_ID_NAMESPACE = uuid.UUID("6f1c2a4e-5b7d-4c1e-9a3f-2d8b0e7c5a91")
+
+
+class StorageError(Exception):
+    """خطأ في ملفات التخزين"""
+
+
+class ConflictError(StorageError):
+    """تعديل متزامن لنفس الحقول من مستخدمين مختلفين"""
+
+    def __init__(self, current, fields):
+        self.current = current
+        self.fields = fields
+        super().__init__(f"تم تعديل السجل من مستخدم آخر في الحقول: {', '.join(fields)}")
+
+
+def lock_region(fd, offset, blocking=True):
+    """قفل بايت واحد في ملف الأقفال (يُحرر تلقائياً إذا توقفت العملية)"""
+    if fcntl:
+        fcntl.lockf(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB), 1, offset)
+    else:
+        os.lseek(fd, offset, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+
+
+def unlock_region(fd, offset):
+    if fcntl:
+        fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset)
+    else:
+        os.lseek(fd, offset, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def gc_paused():
+    """إيقاف جامع الدورات أثناء إنشاء ملايين الكائنات عند القراءة (لا تنتج دورات)"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def legacy_child_id(position, child):
+    """معرف ثابت لسجل قديم بدون معرف: كل محطة تقرأ نفس الملف تعطيه نفس المعرف"""
+    identity = json.dumps([position, child], ensure_ascii=False, sort_keys=True)
+    return uuid.uuid5(LEGACY_ID_NAMESPACE, identity).hex
+
+
+def merge_child(base, mine, theirs):
+    """دمج ثلاثي: تعديلاتي على base مع تعديلات مستخدم آخر (theirs)
+
+    الحقل الذي عدّله طرف واحد يؤخذ منه، والتطعيمات تُدمج كمجموعات
+    (إضافات وحذف كل طرف)، ويُرفع ConflictError إذا عدّل الطرفان نفس الحقل بقيم مختلفة.
+    """
+    merged = dict(theirs)
+    conflicts = []
+    for key in mine:
+        if key in ("version", "vaccinations"):
+            continue
+        mine_value, theirs_value, base_value = mine.get(key), theirs.get(key), base.get(key)
+        if mine_value == base_value or mine_value == theirs_value:
+            continue
+        if theirs_value == base_value:
+            merged[key] = mine_value
+        else:
+            conflicts.append(key)
+    if conflicts:
+        raise ConflictError(theirs, conflicts)
+
+    base_rows = [tuple(row) for row in base.get("vaccinations", [])]
+    mine_rows = [tuple(row) for row in mine.get("vaccinations", [])]
+    removed = set(base_rows) - set(mine_rows)
+    added = [row for row in mine_rows if row not in set(base_rows)]
+    rows = [row for row in (tuple(r) for r in theirs.get("vaccinations", [])) if row not in removed]
+    rows += [row for row in added if row not in set(rows)]
+    merged["vaccinations"] = [list(row) for row in rows]
+    return merged
+
+
+class RecordStore:
+    """مخزن سجلات يكتب التغييرات فقط ويدعم عدة محطات عمل على نفس المجلد المشترك
+
+    الملف الأساسي (children_data.json) قائمة JSON كاملة، وكل محطة عمل تُلحق
+    تغييراتها بملف سجل خاص بها (children_data.json.<المحطة>.log) مع fsync،
+    فلا تتنافس المحطات على ملف واحد. لكل طفل رقم إصدار يزيد مع كل حفظ،
+    ويُطبق السجل الأحدث فقط، فإعادة قراءة أي سجل آمنة.
+    الحفظ يقفل خانة الطفل في ملف الأقفال، ويقرأ تغييرات المحطات الأخرى،
+    ثم يدمج أو يرفض حسب الإصدار الذي بدأ منه المستخدم.
+    عند تجاوز عدد الأسطر الحد المحدد تُعاد كتابة اللقطة في خيط خلفي
+    عبر ملف مؤقت ثم os.replace، فلا يمكن أن يُترك الملف الأساسي نصف مكتوب.
+    """
+
+    def __init__(self, data_file, compact_threshold=500, writer_id=None, refresh_interval=1.0):
+        self.data_file = data_file
+        self.compact_threshold = compact_threshold
+        self.refresh_interval = refresh_interval
+        self.records = {}
+        # إصدارات السجلات المحذوفة حتى لا تعيدها سجلات أقدم
+        self.tombstones = {}
+        self.indexes = {field: {} for field in INDEXED_FIELDS}
+        # يزيد مع أي تغيير في السجلات
+        self.generation = 0
+        # ترتيب عرض الصفحات حسب حقل واحد: (القيمة، المعرف) مرتبة، تُحدَّث مع كل تغيير
+        # بدلاً من إعادة ترتيب كامل السجل
+        self.sorted_field = None
+        self.sorted_keys = []
+        # موضع القراءة في كل ملف سجل وبصمة آخر لقطة مقروءة
+        self.log_offsets = {}
+        self.snapshot_stamp = None
+        self.last_refresh = 0.0
+        self.log_entries = 0
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()
+        self.compaction_thread = None
+        self.log_handle = None
+        self.locks_fd = os.open(data_file + ".locks", os.O_RDWR | os.O_CREAT)
+        self.claim_log(writer_id or socket.gethostname())
+        self.load()
+
+    def claim_log(self, writer_id):
+        """حجز ملف سجل خاص بهذه العملية (مع لاحقة إن كانت المحطة تشغل نسخة أخرى)"""
+        writer_id = re.sub(r"[^\w.-]", "_", writer_id)
+        number = 1
+        while True:
+            candidate = writer_id if number == 1 else f"{writer_id}-{number}"
+            owner_file = f"{self.data_file}.{candidate}.owner"
+            if os.path.abspath(owner_file) in CLAIMED_LOGS:
+                number += 1
+                continue
+            owner_fd = os.open(owner_file, os.O_RDWR | os.O_CREAT)
+            try:
+                lock_region(owner_fd, 0, blocking=False)
+            except OSError:
+                os.close(owner_fd)
+                number += 1
+                continue
+            CLAIMED_LOGS.add(os.path.abspath(owner_file))
+            self.owner_file = owner_file
+            self.owner_fd = owner_fd
+            self.writer_id = candidate
+            self.log_file = f"{self.data_file}.{candidate}.log"
+            # ملف السجل أثناء الضغط (يُحذف بعد كتابة اللقطة الجديدة)
+            self.rotated_log_file = self.log_file + ".1"
+            return
+
+    # ---------------- القراءة ----------------
+
+    def load(self):
+        """تحميل اللقطة ثم إعادة تطبيق ملفات السجل لجميع المحطات"""
+        with self.lock:
+            self.records = {}
+            self.tombstones = {}
+            self.indexes = {field: {} for field in INDEXED_FIELDS}
+            self.sorted_field = None
+            self.sorted_keys = []
+            self.log_offsets = {}
+            self.snapshot_stamp = None
+            needs_compaction = self.refresh(recover=True)
+            self.log_entries = 0
+            legacy_logs = [self.data_file + ".log", self.data_file + ".log.1"]
+            if (needs_compaction or not os.path.exists(self.data_file)
+                    or os.path.exists(self.rotated_log_file)
+                    or any(os.path.exists(path) for path in legacy_logs)):
+                self.compact()
+
+    def log_paths(self):
+        """جميع ملفات السجل الحالية بما فيها سجلات المحطات الأخرى"""
+        pattern = glob.escape(self.data_file)
+        paths = sorted(glob.glob(pattern + ".*.log.1")) + sorted(glob.glob(pattern + ".*.log"))
+        # سجل الإصدار السابق (محطة واحدة) إن وُجد
+        legacy = [self.data_file + ".log.1", self.data_file + ".log"]
+        return [path for path in legacy if os.path.exists(path)] + paths
+
+    def refresh(self, recover=False):
+        """قراءة ما تغير في اللقطة وسجلات المحطات الأخرى منذ آخر قراءة"""
+        with self.lock:
+            needs_compaction = self.read_snapshot()
+            for path in self.log_paths():
+                own = path in (self.log_file, self.rotated_log_file)
+                self.tail_log(path, truncate_torn=recover and own)
+            self.last_refresh = time.monotonic()
+            return needs_compaction
+
+    def maybe_refresh(self):
+        """تحديث دوري لعمليات القراءة حتى لا تُقرأ الملفات مع كل استعلام"""
+        if time.monotonic() - self.last_refresh >= self.refresh_interval:
+            self.refresh()
+
+    def read_snapshot(self):
+        """دمج اللقطة إن تغيرت منذ آخر قراءة (الإصدار الأحدث يغلب)"""
+        try:
+            stat = os.stat(self.data_file)
+        except FileNotFoundError:
+            return False
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if stamp == self.snapshot_stamp:
+            return False
+        with gc_paused():
+            children = self.read_snapshot_cache(stamp)
+            if children is not None:
+                return self.apply_snapshot(children, stamp)
+            try:
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    children = json.load(f)
+            except (OSError, ValueError) as e:
+                raise StorageError(f"تعذر قراءة ملف البيانات {self.data_file}: {e}")
+            initial = not self.records and not self.tombstones
+            needs_compaction = self.apply_snapshot(children, stamp)
+            if not needs_compaction:
+                # لقطة كتبتها نسخة أقدم أو عُدلت يدوياً: التشغيل التالي يقرأ النسخة الثنائية
+                if initial:
+                    # عند التحميل الأول ما في الذاكرة هو محتوى اللقطة نفسه (مضغوطاً مسبقاً)
+                    children = list(self.records.values()) + [
+                        {"child_id": child_id, "version": version, "deleted": True}
+                        for child_id, version in self.tombstones.items()
+                    ]
+                self.write_snapshot_cache(children, stamp)
+            return needs_compaction
+
+    def apply_snapshot(self, children, stamp):
+        """تطبيق سجلات اللقطة وإرجاع هل تحتاج إعادة كتابة"""
+        needs_compaction = False
+        for position, child in enumerate(children):
+            if not child.get("child_id"):
+                # سجلات قديمة بدون معرف: نثبت المعرف بإعادة كتابة اللقطة
+                child["child_id"] = legacy_child_id(position, child)
+                needs_compaction = True
+            if "version" not in child:
+                child["version"] = 0
+                needs_compaction = True
+            if child.get("deleted"):
+                self.apply({"op": "delete", "child_id": child["child_id"], "version": child["version"]})
+            else:
+                self.apply({"op": "put", "child": child})
+        self.snapshot_stamp = stamp
+        return needs_compaction
+
+    def read_snapshot_cache(self, stamp):
+        """سجلات النسخة الثنائية (كائنات Child جاهزة) إن كانت مطابقة لملف JSON الحالي، وإلا None"""
+        try:
+            with open(self.data_file + ".bin", 'rb') as f:
+                # loads على كامل الملف أسرع بكثير من load التي تقرأ الملف قطعة لكل كائن
+                version, cached_stamp, tables, states, tombstones = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if version != SNAPSHOT_CACHE_FORMAT or tuple(cached_stamp) != stamp:
+            return None
+        # أرقام الجرعات المضغوطة تشير إلى جداول الجلسة التي كتبت الملف
+        if not merge_table_state(tables):
+            return None
+        children = [Child.from_state(state) for state in states]
+        children += [{"child_id": child_id, "version": version, "deleted": True}
+                     for child_id, version in tombstones]
+        return children
+
+    def write_snapshot_cache(self, children, stamp):
+        """كتابة النسخة الثنائية مع بصمة ملف JSON الذي تطابقه"""
+        states = []
+        tombstones = []
+        for child in children:
+            if child.get("deleted"):
+                tombstones.append((child["child_id"], child["version"]))
+            else:
+                states.append((child if isinstance(child, Child) else Child.from_record(child)).state())
+        cache_file = self.data_file + ".bin"
+        tmp_file = f"{cache_file}.{self.writer_id}.tmp"
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(marshal.dumps((SNAPSHOT_CACHE_FORMAT, list(stamp), table_state(), states, tombstones)))
+            os.replace(tmp_file, cache_file)
+        except (OSError, ValueError):
+            # النسخة الثنائية اختيارية: يبقى ملف JSON هو المرجع
+            pass
+
+    def tail_log(self, path, truncate_torn=False):
+        """تطبيق الأسطر الجديدة في ملف سجل"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.log_offsets.pop(path, None)
+            return
+        identity, offset = self.log_offsets.get(path, (None, 0))
+        if identity != stat.st_ino or stat.st_size < offset:
+            # ملف جديد أو أُعيد إنشاؤه بعد الضغط
+            offset = 0
+        if stat.st_size == offset:
+            self.log_offsets[path] = (stat.st_ino, offset)
+            return
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            lines = f.read().splitlines(keepends=True)
+        for index, line in enumerate(lines):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("سطر غير مكتمل")
+                entry = json.loads(line.decode('utf-8'))
+            except ValueError:
+                if index == len(lines) - 1:
+                    if truncate_torn:
+                        # انقطاع أثناء الكتابة: نتجاهل الجزء المكتوب جزئياً
+                        with open(path, 'r+b') as f:
+                            f.truncate(offset)
+                    # سطر محطة أخرى قيد الكتابة: يُقرأ في التحديث التالي
+                    break
+                raise StorageError(f"ملف السجل {path} تالف عند الموضع {offset}")
+            self.apply(entry)
+            offset += len(line)
+        self.log_offsets[path] = (stat.st_ino, offset)
+
+    def current_version(self, child_id):
+        """إصدار الطفل الحالي (أو إصدار حذفه)"""
+        child = self.records.get(child_id)
+        if child is not None:
+            return child.get("version", 0)
+        return self.tombstones.get(child_id, 0)
+
+    def apply(self, entry):
+        """تطبيق عملية واحدة من السجل على الذاكرة إن كانت أحدث من الموجود"""
+        if entry["op"] == "put":
+            child = entry["child"]
+            child_id = child["child_id"]
+        else:
+            child = None
+            child_id = entry["child_id"]
+
+        known = child_id in self.records or child_id in self.tombstones
+        current_version = self.current_version(child_id)
+        version = child.get("version") if child is not None else entry.get("version")
+        if version is None:
+            # عمليات السجل القديم بدون إصدار تُطبق بترتيبها
+            version = current_version + 1
+            if child is not None:
+                child["version"] = version
+        elif known and version <= current_version:
+            return
+
+        self.generation += 1
+        self.unindex_child(self.records.pop(child_id, None))
+        if child is not None:
+            # في الذاكرة يُحفظ الطفل بالنموذج المضغوط (model.py)
+            if not isinstance(child, Child):
+                child = Child.from_record(child)
+            self.tombstones.pop(child_id, None)
+            self.records[child_id] = child
+            self.index_child(child)
+        else:
+            self.tombstones[child_id] = version
+
+    def index_child(self, child):
+        """إضافة الطفل إلى فهارس البحث
+
+        معظم القيم (الرقم الوطني، الجواز...) لطفل واحد: تشير إلى معرفه مباشرة،
+        ولا تُنشأ مجموعة إلا عند تكرار القيمة.
+        """
+        child_id = child["child_id"]
+        if self.sorted_field is not None:
+            insort(self.sorted_keys, (str(child.get(self.sorted_field, "")), child_id))
+        for field, index in self.indexes.items():
+            value = child.get(field)
+            if value:
+                ids = index.get(value)
+                if ids is None:
+                    index[value] = child_id
+                elif ids.__class__ is set:
+                    ids.add(child_id)
+                elif ids != child_id:
+                    index[value] = {ids, child_id}
+
+    def unindex_child(self, child):
+        """إزالة الطفل من فهارس البحث"""
+        if child is None:
+            return
+        child_id = child["child_id"]
+        if self.sorted_field is not None:
+            key = (str(child.get(self.sorted_field, "")), child_id)
+            position = bisect_left(self.sorted_keys, key)
+            if position < len(self.sorted_keys) and self.sorted_keys[position] == key:
+                del self.sorted_keys[position]
+        for field, index in self.indexes.items():
+            value = child.get(field)
+            ids = index.get(value) if value else None
+            if ids is None:
+                continue
+            if ids.__class__ is set:
+                ids.discard(child_id)
+                if len(ids) == 1:
+                    index[value] = next(iter(ids))
+            elif ids == child_id:
+                del index[value]
+
+    def load_all(self):
+        """جميع الأطفال كقائمة"""
+        with self.lock:
+            self.maybe_refresh()
+            records = list(self.records.values())
+        with gc_paused():
+            return [child.to_record() for child in records]
+
+    def iter_children(self, batch_size=1000):
+        """المرور على جميع الأطفال واحداً تلو الآخر (يُبنى قاموس كل طفل عند الوصول إليه)"""
+        with self.lock:
+            self.maybe_refresh()
+            records = list(self.records.values())
+        return (child.to_record() for child in records)
+
+    def iter_compact(self):
+        """الأطفال بصيغتهم المضغوطة (model.Child) دون بناء القواميس، للمرور السريع على كامل السجل"""
+        with self.lock:
+            self.maybe_refresh()
+            return list(self.records.values())
+
+    def page(self, offset, limit, order_by="entry_name", descending=False):
+        """صفحة من الأطفال مرتبة حسب أحد الحقول"""
+        with self.lock:
+            self.maybe_refresh()
+            if self.sorted_field != order_by:
+                # الترتيب الكامل مرة واحدة لكل حقل، ثم يُحدَّث في index_child و unindex_child
+                self.sorted_keys = sorted(
+                    (str(child.get(order_by, "")), child_id) for child_id, child in self.records.items()
+                )
+                self.sorted_field = order_by
+            keys = self.sorted_keys
+            if descending:
+                end = max(len(keys) - offset, 0)
+                keys = keys[max(end - limit, 0):end][::-1]
+            else:
+                keys = keys[offset:offset + limit]
+            return [self.records[child_id].to_record() for value, child_id in keys]
+
+    def get(self, child_id):
+        """سجل طفل واحد أو None"""
+        with self.lock:
+            self.maybe_refresh()
+            child = self.records.get(child_id)
+            return child.to_record() if child is not None else None
+
+    def find(self, field, value):
+        """البحث المطابق في أحد الحقول المفهرسة"""
+        if field not in self.indexes:
+            raise ValueError(f"الحقل {field} غير مفهرس")
+        with self.lock:
+            self.maybe_refresh()
+            ids = self.indexes[field].get(value)
+            if ids is None:
+                return []
+            if ids.__class__ is not set:
+                ids = (ids,)
+            return [self.records[child_id].to_record() for child_id in ids]
+
+    def __len__(self):
+        return len(self.records)
+
+    def change_stamp(self):
+        """قيمة تتغير مع أي تعديل (من هذه العملية أو من محطة أخرى) لمعرفة متى تُعاد الفهارس المشتقة"""
+        with self.lock:
+            self.maybe_refresh()
+            return self.generation
+
+    # ---------------- الكتابة ----------------
+
+    @contextmanager
+    def child_locks(self, child_ids):
+        """قفل خانات الأطفال في ملف الأقفال المشترك (بترتيب ثابت لتجنب التعارض)"""
+        slots = sorted({zlib.crc32(child_id.encode('utf-8')) % LOCK_SLOTS for child_id in child_ids})
+        with self.write_lock:
+            locked = []
+            try:
+                for slot in slots:
+                    lock_region(self.locks_fd, slot)
+                    locked.append(slot)
+                yield
+            finally:
+                for slot in reversed(locked):
+                    unlock_region(self.locks_fd, slot)
+
+    def save(self, child, base=None):
+        """حفظ طفل مع التحقق من الإصدار وإرجاع السجل المحفوظ
+
+        base هو السجل كما حُمّل قبل التعديل؛ إن عدّلت محطة أخرى الطفل بعده
+        تُدمج التعديلات حقلاً بحقل أو يُرفع ConflictError.
+        """
+        return self.save_many([(child, base)])[0]
+
+    def save_many(self, items):
+        """حفظ أزواج (السجل، base) بعملية fsync واحدة؛ عند أي تعارض لا يُحفظ شيء"""
+        children = []
+        for child, base in items:
+            child = copy.deepcopy(child)
+            if not child.get("child_id"):
+                child["child_id"] = uuid.uuid4().hex
+            children.append((child, base or {}))
+        with self.child_locks([child["child_id"] for child, base in children]):
+            self.refresh()
+            with self.lock:
+                prepared = {}
+                saved = []
+                for child, base in children:
+                    child_id = child["child_id"]
+                    current = prepared.get(child_id)
+                    if current is None and child_id in self.records:
+                        current = self.records[child_id].to_record()
+                    current_version = current["version"] if current is not None else self.current_version(child_id)
+                    if current is not None and current_version != base.get("version", 0):
+                        child = merge_child(base, child, current)
+                    elif current is None and child_id in self.tombstones:
+                        raise StorageError("تم حذف السجل من مستخدم آخر")
+                    child["version"] = current_version + 1
+                    prepared[child_id] = child
+                    saved.append(child)
+                self.append([{"op": "put", "child": child} for child in saved])
+        return [copy.deepcopy(child) for child in saved]
+
+    def put(self, child):
+        """حفظ سجل طفل واحد وإرجاع معرفه"""
+        return self.put_many([child])[0]
+
+    def put_many(self, children):
+        """حفظ عدة سجلات بعملية fsync واحدة (الأحدث يغلب دون دمج)"""
+        children = [copy.deepcopy(child) for child in children]
+        for child in children:
+            if not child.get("child_id"):
+                child["child_id"] = uuid.uuid4().hex
+        ids = [child["child_id"] for child in children]
+        with self.child_locks(ids):
+            self.refresh()
+            with self.lock:
+                versions = {}
+                for child in children:
+                    child_id = child["child_id"]
+                    versions[child_id] = versions.get(child_id, self.current_version(child_id)) + 1
+                    child["version"] = versions[child_id]
+                self.append([{"op": "put", "child": child} for child in children])
+        return ids
+
+    def delete(self, child_id):
+        """حذف سجل طفل"""
+        with self.child_locks([child_id]):
+            self.refresh()
+            with self.lock:
+                self.append([{
+                    "op": "delete", "child_id": child_id,
+                    "version": self.current_version(child_id) + 1,
+                }])
+
+    def replace_all(self, children):
+        """استبدال السجل كاملاً بكتابة الفروقات فقط"""
+        with self.lock:
+            self.refresh()
+            kept = set()
+            changed = []
+            for child in children:
+                child_id = child.get("child_id")
+                if child_id:
+                    kept.add(child_id)
+                    current = self.records.get(child_id)
+                    if current is not None and current.to_record() == child:
+                        continue
+                changed.append(child)
+            removed = [child_id for child_id in self.records if child_id not in kept]
+        if changed:
+            self.put_many(changed)
+        for child_id in removed:
+            self.delete(child_id)
+
+    def append(self, entries):
+        """إلحاق عمليات بسجل هذه المحطة ثم تطبيقها على الذاكرة"""
+        if not entries:
+            return
+        data = b"".join(
+            (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8') for entry in entries
+        )
+        with self.lock:
+            if self.log_handle is None:
+                self.log_handle = open(self.log_file, 'ab')
+            self.log_handle.write(data)
+            self.log_handle.flush()
+            os.fsync(self.log_handle.fileno())
+            for entry in entries:
+                self.apply(entry)
+            self.log_entries += len(entries)
+            if self.log_entries >= self.compact_threshold:
+                self.compact_in_background()
+
+    # ---------------- الضغط ----------------
+
+    def compact_in_background(self):
+        """بدء ضغط السجل في خيط خلفي إن لم يكن جارياً"""
+        with self.lock:
+            if self.compaction_thread and self.compaction_thread.is_alive():
+                return
+            self.compaction_thread = threading.Thread(target=self.compact, kwargs={"blocking": False},
+                                                      daemon=True)
+            self.compaction_thread.start()
+
+    def compact(self, blocking=True):
+        """كتابة لقطة جديدة تجمع كل المحطات وتفريغ سجل هذه المحطة"""
+        try:
+            lock_region(self.locks_fd, COMPACTION_SLOT, blocking)
+        except OSError:
+            # محطة أخرى تضغط الآن: نعيد المحاولة بعد مزيد من العمليات
+            with self.lock:
+                self.log_entries = self.compact_threshold // 2
+            return
+        try:
+            with self.lock:
+                if self.log_handle is not None:
+                    self.log_handle.close()
+                    self.log_handle = None
+                if os.path.exists(self.log_file):
+                    if os.path.exists(self.rotated_log_file):
+                        # اللقطة التالية تحتوي محتوى السجلين معاً
+                        with open(self.rotated_log_file, 'ab') as rotated, open(self.log_file, 'rb') as current:
+                            rotated.write(current.read())
+                            rotated.flush()
+                            os.fsync(rotated.fileno())
+                        os.remove(self.log_file)
+                    else:
+                        os.replace(self.log_file, self.rotated_log_file)
+                # قراءة آخر لقطة وسجلات المحطات الأخرى حتى لا يضيع شيء منها
+                self.refresh()
+                snapshot = list(self.records.values()) + [
+                    {"child_id": child_id, "version": version, "deleted": True}
+                    for child_id, version in self.tombstones.items()
+                ]
+                self.log_entries = 0
+
+            # الكتابة خارج القفل حتى لا تتوقف عمليات الحفظ
+            self.write_snapshot(snapshot)
+            for path in (self.rotated_log_file, self.data_file + ".log", self.data_file + ".log.1"):
+                if os.path.exists(path):
+                    os.remove(path)
+            fsync_directory(self.data_file)
+        finally:
+            unlock_region(self.locks_fd, COMPACTION_SLOT)
+
+    def write_snapshot(self, children):
+        """كتابة اللقطة عبر ملف مؤقت واستبدال ذري"""
+        tmp_file = f"{self.data_file}.{self.writer_id}.tmp"
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            # كل طفل يُحوّل ويُكتب على حدة بدل بناء قائمة قواميس السجل كاملة في الذاكرة
+            f.write("[")
+            for number, child in enumerate(children):
+                if isinstance(child, Child):
+                    child = child.to_record()
+                f.write(("," if number else "") + encoder.encode(child))
+            f.write("]")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.data_file)
+        fsync_directory(self.data_file)
+        stat = os.stat(self.data_file)
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self.lock:
+            # اللقطة التي كتبناها لا تحتاج إعادة قراءة
+            self.snapshot_stamp = stamp
+        self.write_snapshot_cache(children, stamp)
+
+    def close(self):
+        """انتظار الضغط الجاري وإغلاق السجل وتحرير الأقفال"""
+        thread = self.compaction_thread
+        if thread and thread.is_alive():
+            thread.join()
+        with self.lock:
+            if self.log_handle is not None:
+                self.log_handle.close()
+                self.log_handle = None
+            if self.owner_fd is not None:
+                os.close(self.owner_fd)
+                os.close(self.locks_fd)
+                CLAIMED_LOGS.discard(os.path.abspath(self.owner_file))
+                self.owner_fd = None
+
+
+def fsync_directory(path):
+    """تثبيت عملية إعادة التسمية على القرص (غير مدعوم على ويندوز)"""
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,395 @@
+"""مزامنة السجلات بين المراكز بدون اتصال دائم: سجل تغييرات وحزم فروقات
+
+كل تعديل على طفل يُسجَّل كعمليات صغيرة (تعيين حقل، إضافة جرعة، حذف جرعة، حذف
+الطفل) برقم تسلسلي خاص بالمركز وساعة Lamport. المزامنة تنقل العمليات التي لم
+يستلمها الطرف الآخر فقط، فيتناسب حجمها وزمنها مع عدد التغييرات لا مع حجم السجل.
+
+حل التعارض حتمي: حالة الطفل هي نتيجة تطبيق جميع عملياته مرتبة حسب
+(ساعة Lamport، المركز، التسلسل)، فكل مركز يملك نفس العمليات يصل لنفس الحالة.
+"""
+import gzip
+import io
+import itertools
+import json
+import os
+import sqlite3
+import threading
+
+from storage import StorageError
+
+BUNDLE_FORMAT = 2
+# الصيغة 1 كانت تحذف الحقل عند تعيينه null؛ تُقرأ حزمها بتحويل ذلك إلى UNSET
+READABLE_FORMATS = (1, 2)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    site TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    lamport INTEGER NOT NULL,
+    child_id TEXT NOT NULL,
+    op TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (site, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_changes_child ON changes(child_id);
+CREATE TABLE IF NOT EXISTS peers (
+    peer TEXT NOT NULL,
+    site TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (peer, site)
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+# مفاتيح السجل التي لا تُزامن كحقول
+SKIPPED_KEYS = ("child_id", "version", "vaccinations")
+
+# فاصل أعمدة الجرعة في مفتاحها (لا يظهر في النصوص المدخلة)
+DOSE_SEPARATOR = "\x1f"
+
+# العمليات؛ PUT سجل كامل لطفل جديد (أو موجود قبل تفعيل المزامنة) بدل عملية لكل حقل،
+# وUNSET حذف حقل (SET بقيمة null يبقي الحقل بقيمة None)
+PUT, SET, UNSET, DOSE_ADD, DOSE_REMOVE, DELETE = "put", "set", "unset", "dose+", "dose-", "delete"
+
+# عدد العمليات المقروءة من الحزمة في كل دفعة إدخال
+APPLY_BATCH_SIZE = 1000
+
+
+def dose_key(row):
+    """هوية الجرعة: الصف كاملاً (تعديل الملاحظات = حذف وإضافة)"""
+    return DOSE_SEPARATOR.join([str(value) for value in row])
+
+
+def diff_child(before, after):
+    """عمليات (العملية، المفتاح، القيمة) التي تحوّل before إلى after"""
+    before = before or {}
+    ops = []
+    for key, value in after.items():
+        if key not in SKIPPED_KEYS and (key not in before or before[key] != value):
+            ops.append((SET, key, json.dumps(value, ensure_ascii=False)))
+    for key in before:
+        if key not in SKIPPED_KEYS and key not in after:
+            ops.append((UNSET, key, ""))
+    before_rows = {dose_key(row) for row in before.get("vaccinations", [])}
+    after_rows = {dose_key(row) for row in after.get("vaccinations", [])}
+    ops += [(DOSE_REMOVE, key, "") for key in sorted(before_rows - after_rows)]
+    ops += [(DOSE_ADD, key, "") for key in sorted(after_rows - before_rows)]
+    return ops
+
+
+def replay(child_id, changes):
+    """حالة الطفل من عملياته (مرتبة)، أو None إن كان آخر ما حدث له الحذف"""
+    fields = {}
+    doses = {}
+    deleted = False
+    for op, key, value in changes:
+        if op == PUT:
+            deleted = False
+            fields = json.loads(value)
+            doses = {dose_key(row): [str(item) for item in row] for row in fields.pop("vaccinations", [])}
+        elif op == SET:
+            deleted = False
+            fields[key] = json.loads(value)
+        elif op == UNSET:
+            deleted = False
+            fields.pop(key, None)
+        elif op == DOSE_ADD:
+            deleted = False
+            doses[key] = key.split(DOSE_SEPARATOR)
+        elif op == DOSE_REMOVE:
+            doses.pop(key, None)
+        elif op == DELETE:
+            deleted = True
+    if deleted or not fields:
+        return None
+    child = dict(fields, child_id=child_id)
+    child["vaccinations"] = sorted(doses.values(), key=lambda row: (row[0], row))
+    return child
+
+
+def legacy_row(row):
+    """عملية من حزمة بالصيغة 1: SET بقيمة null كانت تعني حذف الحقل"""
+    if row[4] == SET and row[6] == "null":
+        return row[:4] + (UNSET, row[5], "")
+    return row
+
+
+def comparable(child):
+    """السجل بدون رقم الإصدار وبقيم نصية للمقارنة بين المخازن"""
+    if child is None:
+        return None
+    result = {key: value for key, value in child.items() if key not in ("version", "vaccinations")}
+    result["vaccinations"] = sorted(dose_key(row) for row in child.get("vaccinations", []))
+    return result
+
+
+class SyncJournal:
+    """سجل تغييرات المركز (SQLite) مع ما يعرفه عن المراكز الأخرى"""
+
+    def __init__(self, db_file, site_id, journal_mode="WAL"):
+        self.db_file = db_file
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        # WAL لا يعمل على مجلد مشترك عبر الشبكة؛ DELETE يحتاج synchronous=FULL ليتحمل انقطاع الكهرباء
+        self.conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.conn.execute("PRAGMA synchronous=" + ("NORMAL" if journal_mode.upper() == "WAL" else "FULL"))
+        self.conn.executescript(SCHEMA)
+        # هوية المركز ثابتة من أول إنشاء حتى لو تغير اسم الجهاز
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('site', ?)", (site_id,))
+            self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('clock', '0')")
+            if self.meta("format") is None:
+                # سجل من إصدار سابق: SET بقيمة null المسجلة فيه كانت تعني حذف الحقل
+                self.conn.execute(
+                    "UPDATE changes SET op = ?, value = '' WHERE op = ? AND value = 'null'", (UNSET, SET))
+                self.set_meta("format", BUNDLE_FORMAT)
+        self.site = self.meta("site")
+
+    def meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    # ---------------- التسجيل المحلي ----------------
+
+    def record(self, items):
+        """تسجيل تغييرات محلية: أزواج (السجل قبل، السجل بعد أو None للحذف)"""
+        rows = []
+        for before, after in items:
+            if after is None:
+                if before is not None:
+                    rows.append((before["child_id"], DELETE, "", ""))
+                continue
+            if before is None:
+                record = {key: value for key, value in after.items() if key not in ("child_id", "version")}
+                rows.append((after["child_id"], PUT, "", json.dumps(record, ensure_ascii=False)))
+                continue
+            rows += [(after["child_id"], op, key, value) for op, key, value in diff_child(before, after)]
+        if not rows:
+            return 0
+        with self.lock, self.conn:
+            # قفل الكتابة حتى لا تأخذ محطتان تشاركان نفس المجلد نفس الأرقام
+            self.conn.execute("BEGIN IMMEDIATE")
+            seq = self.conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM changes WHERE site = ?", (self.site,)).fetchone()[0]
+            lamport = int(self.meta("clock")) + 1
+            self.conn.executemany(
+                "INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(self.site, seq + i, lamport, child_id, op, key, value)
+                 for i, (child_id, op, key, value) in enumerate(rows, 1)],
+            )
+            self.set_meta("clock", lamport)
+        return len(rows)
+
+    def initialize(self, store, batch_size=1000):
+        """تسجيل السجلات الموجودة قبل تفعيل المزامنة (مرة واحدة فقط)"""
+        if self.meta("initialized"):
+            return
+        batch = []
+        for child in store.iter_children():
+            batch.append((None, child))
+            if len(batch) >= batch_size:
+                self.record(batch)
+                batch = []
+        self.record(batch)
+        with self.lock, self.conn:
+            self.set_meta("initialized", "1")
+
+    # ---------------- الفروقات ----------------
+
+    def vector(self):
+        """أعلى تسلسل معروف لكل مركز"""
+        with self.lock:
+            return dict(self.conn.execute("SELECT site, MAX(seq) FROM changes GROUP BY site"))
+
+    def peers(self):
+        """المراكز المعروفة (التي استُلمت منها حزم أو أُرسلت لها)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT peer FROM peers UNION SELECT site FROM changes WHERE site != ?", (self.site,)).fetchall()
+        return sorted(row[0] for row in rows if row[0] != self.site)
+
+    def peer_vector(self, peer):
+        """ما أكّد المركز الآخر استلامه"""
+        with self.lock:
+            return dict(self.conn.execute("SELECT site, seq FROM peers WHERE peer = ?", (peer,)))
+
+    def changes_since(self, known):
+        """العمليات التي لا يملكها طرف يعرف التسلسلات known (عبر الفهرس الأساسي)"""
+        with self.lock:
+            sites = [row[0] for row in self.conn.execute("SELECT DISTINCT site FROM changes")]
+            rows = []
+            for site in sites:
+                rows += self.conn.execute(
+                    "SELECT site, seq, lamport, child_id, op, key, value FROM changes "
+                    "WHERE site = ? AND seq > ? ORDER BY seq", (site, known.get(site, 0))).fetchall()
+        return rows
+
+    def write_bundle(self, f, peer):
+        """كتابة حزمة الفروقات لمركز آخر في ملف مفتوح وإرجاع عدد العمليات"""
+        rows = self.changes_since(self.peer_vector(peer))
+        # مستوى ضغط متوسط: الحزمة الأولى كبيرة والمستوى الأعلى يضاعف الزمن بفرق حجم صغير
+        with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6) as out:
+            header = {"format": BUNDLE_FORMAT, "site": self.site, "to": peer, "vector": self.vector()}
+            out.write((json.dumps(header, ensure_ascii=False) + "\n").encode('utf-8'))
+            for start in range(0, len(rows), 1000):
+                lines = [json.dumps(row, ensure_ascii=False) + "\n" for row in rows[start:start + 1000]]
+                out.write("".join(lines).encode('utf-8'))
+        return len(rows)
+
+    def read_bundle(self, f, store):
+        """تطبيق حزمة من مركز آخر وإرجاع (العمليات الجديدة، الأطفال المتغيرون)"""
+        with gzip.GzipFile(fileobj=f, mode="rb") as source:
+            lines = iter(source)
+            header = json.loads(next(lines))
+            if header.get("format") not in READABLE_FORMATS:
+                raise StorageError(f"صيغة حزمة المزامنة غير مدعومة: {header.get('format')}")
+            rows = (tuple(json.loads(line)) for line in lines)
+            if header["format"] == 1:
+                rows = map(legacy_row, rows)
+            return self.apply(header, rows, store)
+
+    def apply(self, header, rows, store):
+        """إضافة العمليات الجديدة على دفعات ثم إعادة بناء الأطفال المتأثرين بها فقط"""
+        rows = iter(rows)
+        touched = set()
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            before = self.conn.total_changes
+            clock = int(self.meta("clock"))
+            for batch in iter(lambda: list(itertools.islice(rows, APPLY_BATCH_SIZE)), []):
+                self.conn.executemany("INSERT OR IGNORE INTO changes VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+                clock = max(clock, max(row[2] for row in batch))
+                touched.update(row[3] for row in batch)
+            added = self.conn.total_changes - before
+            self.set_meta("clock", clock)
+            # المرسل يملك كل ما في متجهه، فلا نرسله له مرة أخرى
+            self.conn.executemany(
+                "INSERT INTO peers VALUES (?, ?, ?) ON CONFLICT(peer, site) DO UPDATE SET seq = MAX(seq, excluded.seq)",
+                [(header["site"], site, seq) for site, seq in header["vector"].items()],
+            )
+        changed = self.materialize(sorted(touched), store)
+        return added, changed
+
+    def materialize(self, child_ids, store):
+        """كتابة حالة كل طفل كما تحددها عملياته؛ يعيد أزواج (المعرف، السجل أو None للمحذوف)"""
+        puts = []
+        deletes = []
+        for child_id in child_ids:
+            with self.lock:
+                changes = self.conn.execute(
+                    "SELECT op, key, value FROM changes WHERE child_id = ? ORDER BY lamport, site, seq",
+                    (child_id,)).fetchall()
+            state = replay(child_id, changes)
+            current = store.get(child_id)
+            if comparable(state) == comparable(current):
+                continue
+            if state is None:
+                deletes.append(child_id)
+            else:
+                puts.append(state)
+        # كتابة مباشرة بدون تسجيل: العمليات موجودة في السجل مسبقاً
+        if puts:
+            store.put_many(puts)
+        for child_id in deletes:
+            store.delete(child_id)
+        return ([(child["child_id"], store.get(child["child_id"])) for child in puts]
+                + [(child_id, None) for child_id in deletes])
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class SyncedStore:
+    """غلاف حول المخزن يسجل كل تعديل في سجل المزامنة بعد نجاح الكتابة"""
+
+    def __init__(self, store, journal):
+        self.store = store
+        self.journal = journal
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def __len__(self):
+        return len(self.store)
+
+    def save(self, child, base=None):
+        return self.save_many([(child, base)])[0]
+
+    def save_many(self, items):
+        befores = [self.store.get(child["child_id"]) if child.get("child_id") else None for child, base in items]
+        saved = self.store.save_many(items)
+        self.journal.record(zip(befores, saved))
+        return saved
+
+    def put(self, child):
+        return self.put_many([child])[0]
+
+    def put_many(self, children):
+        befores = [self.store.get(child["child_id"]) if child.get("child_id") else None for child in children]
+        ids = self.store.put_many(children)
+        self.journal.record([(before, self.store.get(child_id)) for before, child_id in zip(befores, ids)])
+        return ids
+
+    def delete(self, child_id):
+        before = self.store.get(child_id)
+        self.store.delete(child_id)
+        self.journal.record([(before, None)])
+
+    def replace_all(self, children):
+        befores = {child["child_id"]: child for child in self.store.iter_children()}
+        self.store.replace_all(children)
+        kept = set()
+        items = []
+        for child in children:
+            child_id = child.get("child_id")
+            if child_id:
+                kept.add(child_id)
+                items.append((befores.get(child_id), self.store.get(child_id)))
+        items += [(before, None) for child_id, before in befores.items() if child_id not in kept]
+        self.journal.record(items)
+
+    # ---------------- المزامنة ----------------
+
+    def export_bundle(self, path, peer):
+        """حزمة الفروقات لمركز آخر: (عدد العمليات، عدد البايتات)"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            count = self.journal.write_bundle(f, peer)
+            size = f.tell()
+        # الحزمة لا تظهر باسمها إلا بعد اكتمال كتابتها
+        os.replace(tmp_path, path)
+        return count, size
+
+    def import_bundle(self, path):
+        """تطبيق حزمة مستلمة: (العمليات الجديدة، الأطفال المتغيرون)"""
+        with open(path, 'rb') as f:
+            return self.journal.read_bundle(f, self.store)
+
+    def exchange(self, peer):
+        """مزامنة مباشرة مع مخزن مركز آخر متاح محلياً (مجلد مشترك) في الاتجاهين"""
+        results = []
+        for source, target in ((self, peer), (peer, self)):
+            buffer = io.BytesIO()
+            count = source.journal.write_bundle(buffer, target.journal.site)
+            size = buffer.tell()
+            buffer.seek(0)
+            added, changed = target.journal.read_bundle(buffer, target.store)
+            results.append((count, size, added, changed))
+        # تأكيد الاستلام: كل طرف يعرف الآن ما لدى الآخر
+        for source, target in ((self, peer), (peer, self)):
+            buffer = io.BytesIO()
+            with gzip.GzipFile(fileobj=buffer, mode="wb") as out:
+                header = {"format": BUNDLE_FORMAT, "site": source.journal.site, "vector": source.journal.vector()}
+                out.write((json.dumps(header, ensure_ascii=False) + "\n").encode('utf-8'))
+            buffer.seek(0)
+            target.journal.read_bundle(buffer, target.store)
+        return results
+
+    def close(self):
+        self.store.close()
+        self.journal.close()
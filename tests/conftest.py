@@ -0,0 +1,54 @@
+"""إعدادات الاختبارات المشتركة: الوحدات في جذر المستودع وبيانات أطفال للاختبار"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlite_store import SQLiteStore  # noqa: E402
+from storage import RecordStore  # noqa: E402
+
+
+def make_child(child_id, name="أحمد", **fields):
+    """سجل طفل صالح بجرعة واحدة"""
+    child = {
+        "child_id": child_id,
+        "entry_name": name,
+        "entry_surname": "الليبي",
+        "birth_date": "2024-01-01",
+        "entry_phone": "0911234567",
+        "vaccinations": [["2024-01-02", "B.C.G - بي سي جي", "جرعة وحيدة", "", "مكتمل", "حديثي الولادة"]],
+    }
+    child.update(fields)
+    return child
+
+
+@pytest.fixture
+def new_child():
+    return make_child
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    """فتح مخازن JSON في مجلد مؤقت وإغلاقها جميعاً بعد الاختبار"""
+    stores = []
+
+    def open_store(name="children_data.json", writer_id="test", **options):
+        store = RecordStore(str(tmp_path / name), writer_id=writer_id, refresh_interval=0, **options)
+        stores.append(store)
+        return store
+
+    yield open_store
+    for store in stores:
+        store.close()
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def any_store(request, open_store, tmp_path):
+    """نفس الاختبار على المخزنين"""
+    if request.param == "json":
+        return open_store()
+    store = SQLiteStore(str(tmp_path / "children.db"))
+    request.addfinalizer(store.close)
+    return store
@@ -0,0 +1,49 @@
+"""حساب العمر والفئة العمرية بساعة محقونة وذاكرة مؤقتة"""
+from datetime import date, datetime
+
+from age_service import AgeService, fixed_clock
+from rules import AGE_THRESHOLDS, OLDEST_AGE_CATEGORY
+
+
+def make_service(day=date(2025, 3, 15)):
+    return AgeService(AGE_THRESHOLDS, OLDEST_AGE_CATEGORY, clock=fixed_clock(day))
+
+
+def test_exact_age_uses_clock():
+    service = make_service()
+    assert service.today() == date(2025, 3, 15)
+    assert service.exact_age("2024-01-20") == (1, 1, 23)
+    assert service.exact_age("2025-03-15") == (0, 0, 0)
+    assert service.total_months("2023-03-16") == 23
+
+
+def test_explicit_reference_date_overrides_clock():
+    service = make_service()
+    assert service.exact_age("2024-01-31", date(2024, 3, 1)) == (0, 1, 1)
+    assert service.exact_age(date(2024, 1, 31), datetime(2024, 3, 1, 10, 30)) == (0, 1, 1)
+
+
+def test_invalid_birth_date_is_zero_age():
+    service = make_service()
+    assert service.exact_age("31/01/2024") == (0, 0, 0)
+    assert service.exact_age(None) == (0, 0, 0)
+
+
+def test_categories_follow_thresholds():
+    service = make_service()
+    assert service.category_for_months(0) == "حديثي الولادة"
+    assert service.category_for_months(2) == "عمر الشهرين"
+    assert service.category_for_months(143) == "عمر 12 سنة"
+    assert service.category_for_months(144) == OLDEST_AGE_CATEGORY
+    assert service.categories(["2025-03-01", "2024-12-15", "2010-01-01"]) == [
+        "حديثي الولادة", "عمر الشهرين", OLDEST_AGE_CATEGORY]
+
+
+def test_cache_is_keyed_by_reference_date():
+    """تغير الساعة يغير النتيجة رغم الذاكرة المؤقتة"""
+    today = [date(2025, 1, 1)]
+    service = AgeService(AGE_THRESHOLDS, OLDEST_AGE_CATEGORY, clock=lambda: today[0])
+    assert service.age_category("2024-12-01") == "حديثي الولادة"
+    today[0] = date(2025, 3, 1)
+    assert service.age_category("2024-12-01") == "عمر الشهرين"
+    assert service.cached_category.cache_info().currsize == 2
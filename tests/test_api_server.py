@@ -0,0 +1,101 @@
+"""خادم HTTP المحلي: البحث، الجرعات، الأخطاء وتحديث فهرس الأسماء"""
+import asyncio
+import json
+from datetime import date
+
+import pytest
+
+from age_service import fixed_clock
+from api_server import ApiServer, StorePool
+from rules import RuleTable
+
+
+@pytest.fixture
+def server(any_store, new_child):
+    any_store.put_many([
+        new_child("a", "أحمد", entry_national_id="123456789012", entry_passport="AB12"),
+        new_child("b", "فاطمة", birth_date="2025-01-01", vaccinations=[]),
+    ])
+    pool = StorePool([any_store])
+    server = ApiServer(pool, RuleTable(clock=fixed_clock(date(2025, 6, 1))))
+    asyncio.run(server.refresh_names())
+    yield server
+    pool.executor.shutdown(wait=True)
+
+
+def request(server, method, target, payload=None):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+    return asyncio.run(server.dispatch(method, target, body))
+
+
+def test_lookup_by_document_and_name(server):
+    status, payload = request(server, "GET", "/children?national_id=123456789012")
+    assert status == 200 and [child["child_id"] for child in payload["children"]] == ["a"]
+    status, payload = request(server, "GET", "/children?passport=ab12")
+    assert [child["child_id"] for child in payload["children"]] == ["a"]
+    status, payload = request(server, "GET", "/children?name=%D9%81%D8%A7%D8%B7%D9%85%D9%87")
+    assert [child["child_id"] for child in payload["children"]][:1] == ["b"]
+    assert request(server, "GET", "/children")[0] == 400
+
+
+def test_errors(server):
+    assert request(server, "GET", "/children/missing")[0] == 404
+    assert request(server, "GET", "/nothing")[0] == 404
+    assert request(server, "PUT", "/children/a")[0] == 405
+    assert request(server, "POST", "/children/a/vaccinations", [1, 2])[0] == 400
+    assert asyncio.run(server.dispatch("POST", "/children/a/vaccinations", b"{bad"))[0] == 400
+    status, payload = request(server, "POST", "/children/a/vaccinations", {"vaccine_code": "NOPE"})
+    assert status == 400 and "NOPE" in payload["error"]
+
+
+def test_add_and_delete_dose(server):
+    status, payload = request(server, "POST", "/children/b/vaccinations",
+                              {"vaccine_code": "ROTA", "dose": "الجرعة الأولى", "date": "2025-03-01"})
+    assert status == 201
+    assert payload["vaccinations"][0][:3] == ["2025-03-01", "ROTA - الروتا", "الجرعة الأولى"]
+    # الفترة بين الجرعات أقل من 28 يوماً
+    status, payload = request(server, "POST", "/children/b/vaccinations",
+                              {"vaccine_code": "ROTA", "dose": "الجرعة الثانية", "date": "2025-03-10"})
+    assert status == 409
+    status, payload = request(server, "DELETE", "/children/b/vaccinations/0")
+    assert status == 200 and payload["vaccinations"] == []
+    assert request(server, "DELETE", "/children/b/vaccinations/0")[0] == 404
+
+
+def test_due_uses_rules_clock(server):
+    status, payload = request(server, "GET", "/children/b/due")
+    assert status == 200
+    assert "HEXA" in [item["vaccine_code"] for item in payload["due"]]
+    status, payload = request(server, "GET", "/children/b/due?date=2025-01-02")
+    assert "HEXA" not in [item["vaccine_code"] for item in payload["due"]]
+
+
+def test_name_index_follows_other_writers(server, any_store, new_child):
+    """طفل أضافته محطة أخرى يظهر في البحث بالاسم بعد refresh_names"""
+    any_store.put(new_child("c", "خديجة"))
+    asyncio.run(server.refresh_names())
+    status, payload = request(server, "GET", "/children?name=%D8%AE%D8%AF%D9%8A%D8%AC%D8%A9")
+    assert [child["child_id"] for child in payload["children"]][:1] == ["c"]
+
+
+def test_http_round_trip(server):
+    """طلبان متتاليان على نفس الاتصال (keep-alive)"""
+    async def exchange():
+        listener = await server.start("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = []
+        for target in ("/children/a", "/children/missing"):
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(next(line for line in head.decode().split("\r\n")
+                              if line.lower().startswith("content-length")).split(":")[1])
+            responses.append((head.split(b" ")[1], json.loads(await reader.readexactly(length))))
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return responses
+
+    (first_status, first), (second_status, second) = asyncio.run(exchange())
+    assert first_status == b"200" and first["child_id"] == "a"
+    assert second_status == b"404"
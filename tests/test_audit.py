@@ -0,0 +1,49 @@
+"""تدقيق السجل: مشكلات طفل واحد، وفحص المخزن بعمليات منفصلة وكتابة التقرير"""
+import csv
+from datetime import date
+
+from age_service import fixed_clock
+from audit import (DOSE_BEFORE_BIRTH, FUTURE_DOSE, INVALID_DOSE_DATE, INVALID_FIELD, REPORT_HEADERS, RESTRICTED,
+                   SHORT_INTERVAL, audit_child, audit_registry)
+from schedules import ScheduleRules
+
+TODAY = date(2025, 6, 1)
+MMR = "M.M.R - المركب الفيروسي"
+
+
+def problem_child(new_child):
+    """طفل بكل أنواع المشكلات"""
+    return new_child("bad", entry_phone="09x", vaccinations=[
+        ["2023-12-01", "B.C.G - بي سي جي", "جرعة وحيدة", "", "مكتمل", ""],
+        ["غير معروف", MMR, "الجرعة الأولى", "", "مكتمل", ""],
+        ["2025-01-01", MMR, "الجرعة الأولى", "", "مكتمل", ""],
+        ["2025-02-01", MMR, "الجرعة الثانية", "", "مكتمل", ""],
+        ["2025-01-01", "Chicken pox - الجديري المائي", "الجرعة الأولى", "", "مكتمل", ""],
+        ["2026-01-01", "ROTA - الروتا", "الجرعة الأولى", "", "مكتمل", ""],
+    ])
+
+
+def test_audit_child_reports_each_kind(new_child):
+    rules = ScheduleRules(None, fixed_clock(TODAY))
+    assert audit_child(new_child("ok"), rules, TODAY) == []
+    kinds = [kind for kind, details in audit_child(problem_child(new_child), rules, TODAY)]
+    assert set(kinds) == {INVALID_FIELD, INVALID_DOSE_DATE, DOSE_BEFORE_BIRTH, FUTURE_DOSE, SHORT_INTERVAL, RESTRICTED}
+    # التعارض بين تطعيمين يُذكر مرة واحدة مهما تكررت جرعاتهما
+    assert kinds.count(RESTRICTED) == 1
+
+
+def test_audit_registry_writes_csv(open_store, new_child, tmp_path):
+    store = open_store()
+    store.put_many([new_child(str(number)) for number in range(5)] + [problem_child(new_child)])
+    path = str(tmp_path / "audit.csv")
+    seen = []
+    report = audit_registry(store, path, workers=1, shard_size=2, progress=seen.append, today=TODAY)
+
+    assert report.children == 6
+    assert seen[-1] == 6 and len(seen) == 3
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == REPORT_HEADERS
+    assert len(rows) - 1 == report.findings == sum(report.kinds.values())
+    assert {row[0] for row in rows[1:]} == {"bad"}
+    assert report.kinds[RESTRICTED] == 1
@@ -0,0 +1,64 @@
+"""وضع الحملة: البحث بالرقم الممسوح، فحص الأهلية والحفظ على دفعات"""
+from datetime import date
+
+import pytest
+
+from age_service import fixed_clock
+from campaign import CampaignSession
+from rules import RuleTable
+from storage import StorageError
+
+DAY = date(2025, 6, 1)
+
+
+@pytest.fixture
+def session(any_store, new_child):
+    any_store.put_many([
+        new_child("a", entry_national_id="123456789012", birth_date="2024-01-01", vaccinations=[]),
+        new_child("b", entry_passport="AB12", birth_date="2025-05-01", vaccinations=[]),
+        new_child("c", entry_registration_no="77", birth_date="2023-01-01",
+                  vaccinations=[["2024-01-01", "M.M.R - المركب الفيروسي", "الجرعة الأولى", "", "مكتمل", ""]]),
+    ])
+    return CampaignSession(any_store, RuleTable(clock=fixed_clock(DAY)), "M.M.R", "الجرعة الأولى", DAY,
+                           batch_size=2)
+
+
+def test_find_child_by_any_scanned_number(session):
+    assert [child["child_id"] for child in session.find_child(" 123456789012 ")] == ["a"]
+    assert [child["child_id"] for child in session.find_child("ab12")] == ["b"]
+    assert [child["child_id"] for child in session.find_child("77")] == ["c"]
+    assert session.find_child("000") == []
+
+
+def test_check_eligibility(session):
+    child = session.find_child("123456789012")[0]
+    assert session.check(child)[0] is True
+    assert session.check(session.find_child("AB12")[0]) == (False, "العمر أقل من 12 شهر")
+    allowed, message = session.check(session.find_child("77")[0])
+    assert not allowed and "2024-01-01" in message
+    session.record(child)
+    assert session.check(child) == (False, "تم تسجيل هذا الطفل في الحملة")
+
+
+def test_flush_saves_batch_and_merges_concurrent_edits(session, any_store):
+    child = session.find_child("123456789012")[0]
+    assert session.record(child) is False
+    # تعديل من محطة أخرى بعد تحميل الطفل في الحملة
+    any_store.save(dict(child, entry_phone="0920000000"), child)
+    assert session.record(session.find_child("77")[0]) is True
+    saved = {record["child_id"]: record for record in session.flush()}
+    assert session.pending_count() == 0 and session.saved_count == 2
+    record = any_store.get("a")
+    assert record["entry_phone"] == "0920000000"
+    assert record["vaccinations"][-1][:3] == ["2025-06-01", "M.M.R - المركب الفيروسي", "الجرعة الأولى"]
+    assert saved["c"]["vaccinations"][-1][0] == "2025-06-01"
+    assert session.flush() == []
+
+
+def test_failed_flush_keeps_doses_pending(session, any_store):
+    """طفل حذفته محطة أخرى يفشل الدفعة وتبقى جرعاتها للمحاولة التالية"""
+    session.record(session.find_child("123456789012")[0])
+    any_store.delete("a")
+    with pytest.raises(StorageError):
+        session.flush()
+    assert session.pending_count() == 1
@@ -0,0 +1,60 @@
+"""تقارير التغطية من جداول التجميع: نفس نتيجة العد المباشر مع التحديث لكل طفل"""
+from datetime import date
+
+import pytest
+
+from age_service import fixed_clock
+from coverage import OTHER_NATIONALITY, CoverageRollup
+from rules import RuleTable
+
+TODAY = date(2025, 6, 1)
+
+
+@pytest.fixture
+def rules():
+    return RuleTable(clock=fixed_clock(TODAY))
+
+
+def bcg(day="2024-01-02"):
+    return [day, "B.C.G - بي سي جي", "جرعة وحيدة", "", "مكتمل", ""]
+
+
+def rows_for(report, code, dose):
+    return {tuple(row[:-5]): row[-3:] for row in report if row[-5:-3] == [code, dose]}
+
+
+def test_counts_by_cohort_and_nationality(rules, new_child):
+    children = [
+        new_child("a", birth_date="2025-05-01", nationality="ليبيا", vaccinations=[bcg("2025-05-02")]),
+        new_child("b", birth_date="2025-05-10", nationality="مصر", vaccinations=[]),
+        new_child("c", birth_date="2024-01-01", nationality="ليبيا", vaccinations=[bcg(), bcg()]),
+        new_child("d", birth_date="غير معروف"),
+    ]
+    rollup = CoverageRollup(rules, ["ليبيا"])
+    rollup.build(children)
+
+    by_cohort = rows_for(rollup.coverage(), "B.C.G", "جرعة وحيدة")
+    assert by_cohort == {("حديثي الولادة",): [1, 2, 50.0], ("عمر 15 شهر",): [1, 1, 100.0]}
+    by_nationality = rows_for(rollup.coverage(("nationality",)), "B.C.G", "جرعة وحيدة")
+    assert by_nationality == {("ليبيا",): [2, 2, 100.0], (OTHER_NATIONALITY,): [0, 1, 0.0]}
+    assert {row[-5] for row in rollup.coverage(vaccine_code="ROTA")} == {"ROTA"}
+    # الفئة تُحسب بتاريخ التقرير لا بتاريخ البناء
+    later = rows_for(rollup.coverage(today=date(2025, 8, 1)), "B.C.G", "جرعة وحيدة")
+    assert ("عمر الشهرين",) in later
+
+
+def test_updates_match_rebuild(rules, new_child):
+    children = [new_child(str(number), birth_date="2025-01-01", vaccinations=[]) for number in range(4)]
+    rollup = CoverageRollup(rules, [])
+    rollup.build(children)
+    first = rollup.coverage()
+
+    children[0] = dict(children[0], vaccinations=[bcg("2025-01-02")])
+    rollup.update(children[0])
+    rollup.remove("3")
+    rebuilt = CoverageRollup(rules, [])
+    rebuilt.build(children[:3])
+
+    assert rollup.coverage() == rebuilt.coverage()
+    assert rollup.coverage() != first
+    assert rows_for(rollup.coverage(), "B.C.G", "جرعة وحيدة")[("عمر 4 أشهر",)] == [1, 3, 33.3]
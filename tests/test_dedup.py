@@ -0,0 +1,78 @@
+"""كشف التكرار: المجموعات، درجة التشابه، والدمج"""
+import pytest
+
+from dedup import LinkageEngine, mark_distinct, merge_duplicate, merge_records, mother_key
+from storage import StorageError
+
+
+def twins(new_child):
+    """نفس الطفل مسجل مرتين بكتابة مختلفة قليلاً"""
+    return (
+        new_child("a", entry_father_name="محمد", entry_mother_name="الفاطمة علي", gender="ذكر"),
+        new_child("b", entry_father_name="محمد", entry_mother_name="فاطمة", gender="ذكر",
+                  vaccinations=[["2024-03-01", "OPV - شلل الأطفال", "الجرعة الأولى", "", "مكتمل", ""]]),
+    )
+
+
+def test_mother_key_normalizes_first_name():
+    assert mother_key("الفاطمة علي") == "فاطمه"
+    assert mother_key("عبد الله") == "عبدالله"
+    assert mother_key("") == ""
+
+
+def test_blocks_by_mother_and_phone(new_child):
+    engine = LinkageEngine()
+    a, b = twins(new_child)
+    orphan = new_child("c", birth_date="")
+    blocks = engine.blocks([a, b, orphan])
+    assert [child["child_id"] for child in blocks[("2024-01-01", "mother", "فاطمه")]] == ["a", "b"]
+    assert [child["child_id"] for child in blocks[("2024-01-01", "phone", "0911234567")]] == ["a", "b"]
+    assert all(orphan not in block for block in blocks.values())
+
+
+def test_score_rewards_matches_and_penalizes_conflicts(new_child):
+    engine = LinkageEngine()
+    a, b = twins(new_child)
+    score, reasons = engine.score(engine.prepare(a), engine.prepare(b))
+    assert score >= engine.threshold
+    assert "entry_name" in reasons and "entry_phone" in reasons
+    girl = dict(b, gender="أنثى")
+    assert engine.score(engine.prepare(a), engine.prepare(girl))[0] < engine.threshold
+    other_id = dict(b, entry_national_id="2")
+    assert engine.score(engine.prepare(dict(a, entry_national_id="1")), engine.prepare(other_id))[0] < score
+
+
+def test_find_skips_distinct_and_large_blocks(new_child):
+    a, b = twins(new_child)
+    engine = LinkageEngine()
+    [candidate] = engine.find([a, b])
+    assert {candidate.child_a["child_id"], candidate.child_b["child_id"]} == {"a", "b"}
+    assert engine.find([dict(a, distinct_from=["b"]), b]) == []
+    small = LinkageEngine(max_block_size=1)
+    assert small.find([a, b]) == []
+    assert small.skipped_blocks == 2
+
+
+def test_merge_records_fills_fields_and_unions_doses(new_child):
+    a, b = twins(new_child)
+    merged = merge_records(dict(a, entry_father_name=""), dict(b, distinct_from=["x"]))
+    assert merged["entry_father_name"] == "محمد"
+    assert [row[0] for row in merged["vaccinations"]] == ["2024-01-02", "2024-03-01"]
+    assert merged["merged_ids"] == ["b"]
+    assert merged["distinct_from"] == ["x"]
+    assert "distinct_from" not in merge_records(a, b)
+
+
+def test_merge_duplicate_and_mark_distinct(any_store, new_child):
+    a, b = twins(new_child)
+    any_store.put_many([a, b, new_child("c")])
+    saved = merge_duplicate(any_store, "a", "b")
+    assert len(saved["vaccinations"]) == 2
+    assert any_store.get("b") is None
+    assert any_store.get("a")["merged_ids"] == ["b"]
+    with pytest.raises(StorageError):
+        merge_duplicate(any_store, "a", "b")
+    mark_distinct(any_store, "a", "c")
+    assert any_store.get("a")["distinct_from"] == ["c"]
+    with pytest.raises(StorageError):
+        mark_distinct(any_store, "b", "a")
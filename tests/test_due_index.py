@@ -0,0 +1,53 @@
+"""تقويم المواعيد: نفس نتائج next_due مرتبة حسب اليوم مع التحديث لكل طفل"""
+from datetime import date
+
+import pytest
+
+from age_service import fixed_clock
+from due_index import DueIndex
+from rules import RuleTable
+
+
+@pytest.fixture
+def rules():
+    return RuleTable(clock=fixed_clock(date(2025, 6, 1)))
+
+
+def expected_rows(rules, children, start=None, end=None):
+    rows = [
+        (due_date, child["child_id"], code, dose)
+        for child in children
+        for code, dose, due_date in rules.next_due(child["birth_date"], child["vaccinations"])
+        if (start is None or due_date >= start) and (end is None or due_date <= end)
+    ]
+    return sorted(rows)
+
+
+def test_range_queries_match_next_due(rules, new_child):
+    children = [new_child(str(number), birth_date=f"2024-{number:02d}-15") for number in range(1, 13)]
+    index = DueIndex(rules)
+    index.build(children)
+    assert index.due_between() == expected_rows(rules, children)
+    start, end = date(2024, 9, 1), date(2025, 3, 31)
+    assert index.due_between(start, end) == expected_rows(rules, children, start, end)
+    assert index.due_between(date(2040, 1, 1), date(2040, 12, 31)) == []
+    assert len(index) == len(expected_rows(rules, children))
+
+
+def test_update_and_remove(rules, new_child):
+    children = [new_child("a", birth_date="2024-01-01"), new_child("b", birth_date="2024-06-01")]
+    index = DueIndex(rules)
+    index.build(children)
+
+    updated = dict(children[0], vaccinations=children[0]["vaccinations"] + [
+        ["2025-05-01", "ROTA - الروتا", "الجرعة الأولى", "", "مكتمل", ""]])
+    index.update(updated)
+    assert ("ROTA", "الجرعة الثانية") in [(code, dose) for day, child_id, code, dose in index.due_between()
+                                          if child_id == "a"]
+    assert index.due_between() == expected_rows(rules, [updated, children[1]])
+
+    index.remove("b")
+    assert {child_id for day, child_id, code, dose in index.due_between()} == {"a"}
+    assert index.ordinals == sorted(index.days)
+    index.remove("a")
+    assert index.due_between() == [] and index.ordinals == []
@@ -0,0 +1,110 @@
+"""محرك الأهلية الدفعي: نفس نتائج next_due لكل طفل"""
+from datetime import date
+
+import numpy as np
+import pytest
+
+from age_service import fixed_clock
+from eligibility import COMPLETE, DUE, NO_DATE, NOT_ELIGIBLE, OVERDUE, RESTRICTED, BatchEligibility
+from rules import RuleTable
+
+TODAY = date(2025, 6, 1)
+
+
+@pytest.fixture
+def rules():
+    return RuleTable(clock=fixed_clock(TODAY))
+
+
+def dose(day, code, label):
+    return [day, code, label, "", "مكتمل", ""]
+
+
+def result_for(engine, children, **options):
+    registry = engine.load(children)
+    return registry, engine.evaluate(registry, **options)
+
+
+def test_matches_next_due(rules):
+    """كل تطعيم غير مكتمل أو ممنوع له نفس الجرعة وتاريخ الاستحقاق في المحركين"""
+    children = [
+        {"child_id": "a", "birth_date": "2024-01-31", "vaccinations": [
+            dose("2024-02-01", "B.C.G - بي سي جي", "جرعة وحيدة"),
+            dose("2024-04-01", "ROTA - الروتا", "الجرعة الأولى"),
+            dose("2025-01-15", "M.M.R - المركب الفيروسي", "الجرعة الأولى"),
+        ]},
+        {"child_id": "b", "birth_date": "2025-05-20", "vaccinations": []},
+    ]
+    engine = BatchEligibility(rules)
+    registry, result = result_for(engine, children)
+    for row, child in enumerate(children):
+        expected = {code: (dose_label, due) for code, dose_label, due in rules.next_due(
+            child["birth_date"], child["vaccinations"])}
+        for column, code in enumerate(engine.codes):
+            if result["status"][row, column] in (COMPLETE, RESTRICTED):
+                assert code not in expected
+                continue
+            label = engine.dose_labels[column][result["next_dose"][row, column]]
+            due = np.datetime64(int(result["due_date"][row, column]), "D").astype(date)
+            assert expected[code] == (label, due)
+
+
+def test_statuses(rules):
+    children = [{"child_id": "a", "birth_date": "2024-01-01", "vaccinations": [
+        dose("2024-01-02", "B.C.G - بي سي جي", "جرعة وحيدة"),
+        dose("2025-05-25", "ROTA - الروتا", "الجرعة الأولى"),
+        dose("2025-01-01", "Chicken pox - الجديري المائي", "الجرعة الأولى"),
+    ]}]
+    engine = BatchEligibility(rules)
+    registry, result = result_for(engine, children)
+    status = dict(zip(engine.codes, result["status"][0].tolist()))
+    assert status["B.C.G"] == COMPLETE
+    assert status["ROTA"] == NOT_ELIGIBLE
+    assert status["M.M.R"] == RESTRICTED
+    assert status["O.P.V"] == OVERDUE
+    assert status["Chicken pox"] == COMPLETE
+    result = engine.evaluate(registry, today=date(2024, 1, 2))
+    assert dict(zip(engine.codes, result["status"][0].tolist()))["O.P.V"] == DUE
+
+
+def test_duplicated_dose_rows_count_once(rules):
+    """تكرار نفس الجرعة في السجل لا يجعل التطعيم مكتملاً"""
+    children = [{"child_id": "a", "birth_date": "2024-01-01", "vaccinations": [
+        dose("2024-09-01", "Hep A - الالتهاب الكبدي الألفي", "الجرعة الأولى"),
+        dose("2024-09-01", "Hep A - الالتهاب الكبدي الألفي", "الجرعة الأولى"),
+    ]}]
+    engine = BatchEligibility(rules)
+    registry, result = result_for(engine, children)
+    column = engine.codes.index("Hep A")
+    assert result["taken"][0, column] == 1
+    assert result["status"][0, column] != COMPLETE
+    assert ("Hep A", "الجرعة الثانية") in [(code, label) for code, label, due in
+                                           rules.next_due("2024-01-01", children[0]["vaccinations"])]
+
+
+def test_invalid_dates_are_reported(rules):
+    children = [
+        {"child_id": "a", "birth_date": "2024-01-01", "vaccinations": [
+            dose("2024-13-01", "ROTA - الروتا", "الجرعة الأولى"),
+            dose("2024-03-01", "UNKNOWN - تطعيم", "الجرعة الأولى"),
+        ]},
+        {"child_id": "b", "birth_date": "غير معروف", "vaccinations": []},
+    ]
+    engine = BatchEligibility(rules)
+    registry, result = result_for(engine, children)
+    assert registry.rejected == [("a", "ROTA", "الجرعة الأولى", "2024-13-01")]
+    assert result["taken"][0].sum() == 0
+    assert (result["status"][1] == NOT_ELIGIBLE).all()
+    assert (result["due_date"][1] == NO_DATE).all()
+
+
+def test_recall_csv_uses_rules_clock(rules, tmp_path):
+    children = [{"child_id": "a", "birth_date": "2025-01-01", "vaccinations": []}]
+    path = str(tmp_path / "recall.csv")
+    count, rejected = BatchEligibility(rules).write_recall_csv(children, path)
+    assert rejected == []
+    with open(path, encoding="utf-8-sig") as f:
+        rows = f.read().splitlines()[1:]
+    assert len(rows) == count
+    # في 2025-06-01 عمر الطفل 5 أشهر: لا يُستدعى لتطعيمات عمر 9 أشهر
+    assert count and not any(",MENG.A+CY+W135," in row for row in rows)
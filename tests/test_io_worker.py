@@ -0,0 +1,79 @@
+"""الخيط العامل: الترتيب، دمج الطلبات المكررة وتسليم النتائج على خيط الواجهة"""
+import threading
+
+import pytest
+
+from io_worker import IOExecutor
+
+
+class FakeWindow:
+    """بديل window.after: الدوال المؤجلة تُنفذ عند استدعاء run_pending"""
+
+    def __init__(self):
+        self.scheduled = []
+        self.errors = []
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+    def report_callback_exception(self, kind, error, traceback):
+        self.errors.append(error)
+
+    def run_pending(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for callback in scheduled:
+            callback()
+
+
+@pytest.fixture
+def executor():
+    window = FakeWindow()
+    executor = IOExecutor(window)
+    yield executor
+    executor.shutdown()
+
+
+def drain(executor):
+    """انتظار الخيط العامل ثم تسليم جميع النتائج"""
+    done = threading.Event()
+    executor.submit(done.set)
+    assert done.wait(5)
+    while executor.outstanding:
+        executor.window.run_pending()
+
+
+def test_results_are_delivered_in_order(executor):
+    results = []
+    for number in range(5):
+        executor.submit(lambda n: n * 2, number, on_done=results.append)
+    drain(executor)
+    assert results == [0, 2, 4, 6, 8]
+    assert executor.outstanding == 0
+
+
+def test_merged_requests_run_once_with_latest_callbacks(executor):
+    """طلبات بنفس المفتاح لم تبدأ بعد تُنفذ مرة واحدة وبدوال آخر طلب فقط"""
+    gate = threading.Event()
+    executor.submit(gate.wait, 5)
+    calls = []
+    first, last = [], []
+    executor.submit(lambda value: calls.append(value) or value, "first", key="save", on_done=first.append)
+    executor.submit(lambda value: calls.append(value) or value, "last", key="save", on_done=last.append)
+    gate.set()
+    drain(executor)
+    assert calls == ["last"]
+    assert first == []
+    assert last == ["last"]
+
+
+def test_errors_go_to_error_callbacks(executor):
+    errors = []
+
+    def fail():
+        raise ValueError("خطأ")
+
+    executor.submit(fail, on_error=errors.append)
+    executor.submit(fail)
+    drain(executor)
+    assert [str(error) for error in errors] == ["خطأ"]
+    assert [str(error) for error in executor.window.errors] == ["خطأ"]
@@ -0,0 +1,80 @@
+"""النموذج المضغوط: التحويل من السجل وإليه دون فقد أي قيمة"""
+import marshal
+import threading
+
+from model import TABLES, Child, Interner
+
+
+def test_record_round_trip(new_child):
+    record = new_child("a", entry_national_id="123456789012", custom_field={"x": [1, 2]})
+    record["vaccinations"].append(["2024-03-01", "ROTA - الروتا", "الجرعة الأولى", "ملاحظة جديدة", "مكتمل", "عمر الشهرين"])
+    child = Child.from_record(record)
+
+    assert child.to_record() == record
+    assert child.get("birth_date") == "2024-01-01"
+    assert child["vaccinations"] == record["vaccinations"]
+    assert child.get("custom_field") == {"x": [1, 2]}
+    assert child.get("entry_passport", "") == ""
+    assert "entry_passport" not in child
+    assert "entry_name" in child
+
+
+def test_unusual_values_are_kept_as_is():
+    """قيم خارج الصيغة المعتادة (تاريخ غير صالح، None) تُحفظ كما هي"""
+    record = {"child_id": "a", "entry_name": None, "birth_date": "01/02/2024", "version": 3,
+              "vaccinations": [["غير معروف", "TEST - تطعيم", "الجرعة الأولى", "", "", ""]]}
+    assert Child.from_record(record).to_record() == record
+    record = {"child_id": "b", "birth_date": None}
+    assert Child.from_record(record).to_record() == record
+
+
+def test_state_round_trip_through_marshal(new_child):
+    """الصيغة الثنائية (state) تعيد نفس السجل بعد marshal"""
+    record = new_child("a", extra_note="ملاحظة")
+    state = marshal.loads(marshal.dumps(Child.from_record(record).state()))
+    assert Child.from_state(state).to_record() == record
+
+
+def test_record_without_vaccinations():
+    record = {"child_id": "a", "entry_name": "أحمد"}
+    child = Child.from_record(record)
+    assert child.to_record() == record
+    assert child.get("vaccinations") is None
+
+
+def test_notes_are_kept_outside_the_shared_tables(new_child):
+    """الملاحظات نص حر: لا تُضاف للجداول المشتركة وتبقى بعد marshal"""
+    note = "ملاحظة فريدة لا تتكرر"
+    record = new_child("a")
+    record["vaccinations"][0][3] = note
+    child = Child.from_record(record)
+    assert all(note not in table for table in TABLES)
+    assert Child.from_state(marshal.loads(marshal.dumps(child.state()))).to_record() == record
+    assert Child.from_record(new_child("b")).doses.__class__ is bytes
+    record["vaccinations"][0][3] = None
+    assert Child.from_record(record).to_record() == record
+
+
+def test_interner_merge_extends_compatible_tables():
+    table = Interner(["a", "b"])
+    assert table.merge(["a", "b", "c"])
+    assert table["c"] == 2
+    assert table.merge(["a"])
+    assert not table.merge(["b"])
+    assert table.values == ["a", "b", "c"]
+
+
+def test_interner_merge_keeps_numbers_with_concurrent_additions():
+    """القيم المضافة من خيط آخر أثناء الدمج لا تأخذ أرقام الجدول المحفوظ"""
+    table = Interner(["a"])
+    saved = ["a"] + [f"saved{number}" for number in range(2000)]
+    merged = []
+    threads = [threading.Thread(target=lambda: merged.append(table.merge(saved)))]
+    threads += [threading.Thread(target=table.__getitem__, args=(f"other{number}",)) for number in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if merged == [True]:
+        assert [table[value] for value in saved] == list(range(len(saved)))
+    assert len(table.values) == len(saved) + 50
@@ -0,0 +1,52 @@
+"""فهرس جرعات الطفل: آخر تاريخ لكل تطعيم بمطابقة الكود كاملاً"""
+from datetime import date
+
+from rules import DoseIndex, RuleTable, vaccine_code_of
+
+
+def dose(day, vaccine, label="الجرعة الأولى"):
+    return [day, vaccine, label, "", "مكتمل", ""]
+
+
+def test_codes_match_exactly_not_as_substrings():
+    """الكود المتضمن في نص تطعيم آخر لا يطابقه (Hep A و Hep A+B، B.C.G و B)"""
+    index = DoseIndex([
+        dose("2024-01-10", "Hep A+B - تطعيم مركب"),
+        dose("2024-02-10", "B.C.G - بي سي جي", "جرعة وحيدة"),
+    ])
+    assert vaccine_code_of("Hep A - الالتهاب الكبدي الألفي") == "Hep A"
+    assert index.last_date("Hep A") is None
+    assert index.last_date("B") is None
+    assert index.last_date("B.C.G") == date(2024, 2, 10)
+    assert index.codes() == {"Hep A+B", "B.C.G"}
+
+
+def test_last_date_compares_dates_not_text():
+    index = DoseIndex([dose("2024-9-01", "ROTA - الروتا"), dose("2024-10-01", "ROTA - الروتا", "الجرعة الثانية")])
+    assert index.last_date("ROTA") == date(2024, 10, 1)
+
+
+def test_add_and_remove_keep_index_current():
+    rows = [dose("2024-01-01", "ROTA - الروتا"), dose("2024-02-01", "ROTA - الروتا", "الجرعة الثانية"),
+            dose("غير معروف", "ROTA - الروتا", "الجرعة الثالثة")]
+    index = DoseIndex(rows)
+    assert index.dose_count("ROTA") == 3
+    index.remove(rows[1])
+    assert index.last_date("ROTA") == date(2024, 1, 1)
+    index.remove(rows[2])
+    index.remove(rows[0])
+    assert index.codes() == set()
+    index.add(dose("2024-05-01", "ROTA - الروتا"))
+    assert index.last_date("ROTA") == date(2024, 5, 1)
+    # إزالة جرعة غير موجودة لا تغير شيئاً
+    index.remove(dose("2023-01-01", "ROTA - الروتا"))
+    assert index.dose_count("ROTA") == 1
+
+
+def test_rule_table_uses_dose_index():
+    rules = RuleTable()
+    rows = [dose("2024-01-01", "M.M.R - المركب الفيروسي"), dose("2024-03-01", "Hep.B - الالتهاب الكبدي البائي")]
+    assert rules.get_last_vaccination_date(rows, "Hep.B") == date(2024, 3, 1)
+    assert rules.get_existing_vaccines(rows) == {"M.M.R", "Hep.B"}
+    assert rules.check_vaccine_restrictions("Chicken pox", rules.get_existing_vaccines(rows))[0] is False
+    assert rules.check_vaccine_restrictions("ROTA", rules.get_existing_vaccines(rows))[0] is True
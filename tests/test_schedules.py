@@ -0,0 +1,103 @@
+"""إصدارات جدول التطعيمات: اختيار الإصدار بالتاريخ، الوراثة، الملفات غير الصالحة وإعادة التحميل"""
+import json
+from datetime import date
+
+import pytest
+
+from age_service import fixed_clock
+from schedules import BUILTIN_VERSION, ScheduleError, ScheduleRules, write_schedule_template
+
+
+def write_json(path, definition):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(definition, f, ensure_ascii=False)
+
+
+@pytest.fixture
+def schedules_dir(tmp_path):
+    directory = tmp_path / "schedules"
+    directory.mkdir()
+    return directory
+
+
+def test_builtin_schedule_without_files(schedules_dir):
+    rules = ScheduleRules(str(schedules_dir), fixed_clock(date(2026, 3, 1)))
+    rules.reload_if_changed()
+    assert rules.reload_if_changed() is False
+    assert rules.versions() == [(BUILTIN_VERSION, None)]
+    assert rules.for_date(date(2020, 1, 1)).vaccines["ROTA"].interval == 28
+
+
+def test_version_is_chosen_by_date_and_inherits_sections(schedules_dir):
+    write_json(schedules_dir / "2026-01-01.json", {"effective_from": "2026-01-01", "intervals": {"ROTA": 35, "default": 21}})
+    write_json(schedules_dir / "2026-06-01.json", {"effective_from": "2026-06-01",
+                                                   "age_thresholds": [[2, "رضيع"], [24, "صغير"]]})
+    rules = ScheduleRules(str(schedules_dir), fixed_clock(date(2026, 3, 1)))
+    assert rules.reload_if_changed() is True
+
+    assert [version for version, start in rules.versions()] == [BUILTIN_VERSION, "2026-01-01", "2026-06-01"]
+    assert rules.for_date(date(2025, 12, 31)).version == BUILTIN_VERSION
+    assert rules.for_date(date(2026, 1, 1)).version == "2026-01-01"
+    assert rules.version == "2026-01-01"
+    # الإصدار الأخير يرث الفترات من السابق له والتطعيمات من المدمج
+    latest = rules.for_date(date(2026, 7, 1))
+    assert latest.vaccines["ROTA"].interval == 35
+    assert "B.C.G" in latest.vaccines
+    assert latest.age_categories == ["رضيع", "صغير", "عمر 15 سنة"]
+
+    # الفترة حسب الإصدار الساري يوم الجرعة: 28 يوماً قبل 2026 و35 بعدها
+    assert rules.check_vaccine_interval("ROTA", "الجرعة الثانية", "2025-11-01", date(2025, 11, 29))[0] is True
+    assert rules.check_vaccine_interval("ROTA", "الجرعة الثانية", "2026-01-01", date(2026, 1, 29))[0] is False
+    assert rules.calculate_age_category("2026-01-01", date(2026, 7, 1)) == "صغير"
+    assert rules.calculate_age_category("2026-01-01", date(2026, 5, 1)) == "عمر 4 أشهر"
+
+
+def test_invalid_file_keeps_previous_versions(schedules_dir):
+    path = schedules_dir / "2026-01-01.json"
+    write_json(path, {"effective_from": "2026-01-01", "intervals": {"ROTA": 35, "default": 21}})
+    rules = ScheduleRules(str(schedules_dir), fixed_clock(date(2026, 3, 1)))
+    rules.reload_if_changed()
+
+    write_json(path, {"effective_from": "2026-01-01", "intervals": {"ROTA": -1, "default": 21}})
+    with pytest.raises(ScheduleError):
+        rules.reload_if_changed()
+    assert rules.vaccines["ROTA"].interval == 35
+    # الخطأ يُرفع مرة واحدة حتى يتغير الملف
+    assert rules.reload_if_changed() is False
+
+    write_json(path, {"effective_from": "2026-01-01", "intervals": {"ROTA": 40, "default": 21}})
+    assert rules.reload_if_changed() is True
+    assert rules.vaccines["ROTA"].interval == 40
+
+
+@pytest.mark.parametrize("definition", [
+    ["not", "an", "object"],
+    {"effective_from": "01/01/2026"},
+    {"effective_from": "2026-01-01", "unknown_section": {}},
+    {"effective_from": "2026-01-01", "age_thresholds": [[24, "صغير"], [2, "رضيع"]]},
+    {"effective_from": "2026-01-01", "compensation": [[0, ["NOPE"]]]},
+])
+def test_invalid_definitions_are_rejected(schedules_dir, definition):
+    write_json(schedules_dir / "bad.json", definition)
+    with pytest.raises(ScheduleError):
+        ScheduleRules(str(schedules_dir)).reload_if_changed()
+
+
+def test_template_is_a_valid_version(schedules_dir):
+    write_schedule_template(str(schedules_dir / "2026-01-01.json"), "2026-01-01")
+    rules = ScheduleRules(str(schedules_dir), fixed_clock(date(2026, 3, 1)))
+    assert rules.reload_if_changed() is True
+    assert rules.age_categories == rules.for_date(date(2020, 1, 1)).age_categories
+    assert rules.check_vaccine_restrictions("M.M.R", {"Chicken pox"}, date(2026, 3, 1))[0] is False
+
+
+def test_restrictions_follow_the_dose_date_version(schedules_dir):
+    """إصدار يلغي قيد M.M.R مع الجديري: الجرعة قبله تُمنع وبعده تُقبل"""
+    write_json(schedules_dir / "2026-06-01.json", {"effective_from": "2026-06-01", "restrictions": {}})
+    rules = ScheduleRules(str(schedules_dir), fixed_clock(date(2026, 3, 1)))
+    rules.reload_if_changed()
+    assert rules.check_vaccine_restrictions("M.M.R", {"Chicken pox"}, date(2026, 5, 31))[0] is False
+    assert rules.check_vaccine_restrictions("M.M.R", {"Chicken pox"}, date(2026, 6, 1))[0] is True
+    vaccinations = [["2026-01-10", "M.M.R - المركب الفيروسي", "الجرعة الأولى", "", "مكتمل", ""]]
+    assert rules.get_existing_vaccines(vaccinations) == {"M.M.R"}
+    assert rules.get_last_vaccination_date(vaccinations, "M.M.R") == date(2026, 1, 10)
@@ -0,0 +1,33 @@
+"""البحث التقريبي بالأسماء العربية"""
+from search_index import NameIndex, normalize_arabic
+
+
+def test_normalize_arabic_unifies_letter_forms():
+    assert normalize_arabic("أَحْمَـــد") == "احمد"
+    assert normalize_arabic("فاطمة  مُصطفى") == "فاطمه مصطفي"
+    assert normalize_arabic(None) == ""
+
+
+def test_search_tolerates_spelling_variants(new_child):
+    index = NameIndex()
+    index.build([
+        new_child("a", "أحمد", entry_surname="الشريف"),
+        new_child("b", "فاطمة", entry_surname="المصراتي"),
+        new_child("c", "محمد", entry_surname="الشريف"),
+    ])
+    results = index.search("احمد الشريف")
+    assert results[0][0] == "a"
+    assert "b" not in [child_id for child_id, score in results]
+    assert index.search("فاطمه")[0][0] == "b"
+    assert index.search("") == []
+
+
+def test_update_and_remove_follow_edits(new_child):
+    index = NameIndex()
+    index.build([new_child("a", "أحمد"), new_child("b", "سالم")])
+    index.update(new_child("a", "خالد"))
+    assert "a" not in [child_id for child_id, score in index.search("أحمد")]
+    assert index.search("خالد")[0][0] == "a"
+    index.remove("b")
+    assert index.search("سالم") == []
+    assert all(index.postings.values())
@@ -0,0 +1,80 @@
+"""مخزن SQLite: نفس واجهة مخزن JSON، عداد التغييرات والترحيل من JSON"""
+import pytest
+
+from sqlite_store import SQLiteStore, migrate_json
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    store = SQLiteStore(str(tmp_path / "children.db"))
+    yield store
+    store.close()
+
+
+def test_put_get_delete(sqlite_store, new_child):
+    child = new_child("a", entry_passport=None, custom_field={"x": 1})
+    sqlite_store.put(child)
+    saved = sqlite_store.get("a")
+    assert saved["version"] == 1
+    assert saved["entry_passport"] == ""
+    assert saved["custom_field"] == {"x": 1}
+    assert saved["vaccinations"] == child["vaccinations"]
+    sqlite_store.delete("a")
+    assert sqlite_store.get("a") is None
+    assert len(sqlite_store) == 0
+
+
+def test_change_stamp_moves_on_every_write(sqlite_store, new_child):
+    """حذف طفل وإضافة آخر بنفس الإصدار يغير القيمة أيضاً"""
+    sqlite_store.put(new_child("a"))
+    stamps = [sqlite_store.change_stamp()]
+    sqlite_store.delete("a")
+    sqlite_store.put(new_child("b"))
+    stamps.append(sqlite_store.change_stamp())
+    sqlite_store.put(new_child("b", "سالم"))
+    stamps.append(sqlite_store.change_stamp())
+    assert stamps == sorted(set(stamps))
+
+
+def test_change_stamp_sees_other_connections(sqlite_store, new_child, tmp_path):
+    other = SQLiteStore(sqlite_store.db_file)
+    try:
+        stamp = sqlite_store.change_stamp()
+        other.put(new_child("a"))
+        assert sqlite_store.change_stamp() != stamp
+    finally:
+        other.close()
+
+
+def test_migrate_json_keeps_children_and_versions(open_store, new_child, tmp_path):
+    source = open_store()
+    source.put_many([new_child(str(number)) for number in range(5)])
+    child = source.get("2")
+    source.save(dict(child, entry_phone="0920000000"), child)
+    data_file = source.data_file
+    source.close()
+
+    db_file = str(tmp_path / "children.db")
+    assert migrate_json(data_file, db_file, batch_size=2) == 5
+    target = SQLiteStore(db_file)
+    try:
+        assert len(target) == 5
+        assert target.get("2")["version"] == 2
+        assert target.get("2")["entry_phone"] == "0920000000"
+        assert target.get("0")["version"] == 1
+    finally:
+        target.close()
+
+
+def test_find_uses_indexes_after_updates(any_store, new_child):
+    any_store.put_many([
+        new_child("a", entry_national_id="123456789012"),
+        new_child("b", entry_national_id="123456789012"),
+        new_child("c", entry_national_id="999999999999"),
+    ])
+    assert sorted(child["child_id"] for child in any_store.find("entry_national_id", "123456789012")) == ["a", "b"]
+    any_store.put(dict(any_store.get("a"), entry_national_id="111111111111"))
+    assert [child["child_id"] for child in any_store.find("entry_national_id", "123456789012")] == ["b"]
+    assert [child["child_id"] for child in any_store.find("entry_national_id", "111111111111")] == ["a"]
+    with pytest.raises(ValueError):
+        any_store.find("entry_name", "أحمد")
@@ -0,0 +1,174 @@
+"""مخزن JSON: إعادة تطبيق السجل، الاسترداد بعد الانقطاع، الضغط والحفظ من عدة محطات"""
+import json
+import os
+
+import pytest
+
+from sqlite_store import SQLiteStore
+from storage import ConflictError, RecordStore, StorageError, merge_child
+
+
+def test_saved_children_survive_reopen(open_store, new_child):
+    """الحفظ يُلحق بالسجل وإعادة الفتح تعيد تطبيقه"""
+    store = open_store()
+    saved = store.save(new_child("a"))
+    store.put_many([new_child("b", "سالم"), new_child("c", "علي")])
+    store.delete("c")
+    store.close()
+
+    store = open_store()
+    assert store.get("a") == saved
+    assert store.get("b")["entry_name"] == "سالم"
+    assert store.get("c") is None
+    assert len(store) == 2
+
+
+def test_torn_last_line_is_dropped_on_recovery(open_store, new_child):
+    """سطر مكتوب جزئياً في آخر السجل يُتجاهل ويُقتطع عند الفتح التالي"""
+    store = open_store()
+    store.put(new_child("a"))
+    log_file = store.log_file
+    store.close()
+    with open(log_file, "ab") as f:
+        f.write(json.dumps({"op": "put", "child": new_child("b")}).encode("utf-8")[:40])
+
+    store = open_store()
+    assert store.get("a") is not None
+    assert store.get("b") is None
+    store.put(new_child("c"))
+    store.close()
+
+    store = open_store()
+    assert sorted(child["child_id"] for child in store.iter_children()) == ["a", "c"]
+
+
+def test_corrupt_line_in_middle_of_log_raises(open_store, new_child):
+    """السطر التالف قبل آخر السجل خطأ لا يُتجاهل"""
+    store = open_store()
+    store.put(new_child("a"))
+    log_file = store.log_file
+    store.close()
+    with open(log_file, "ab") as f:
+        f.write(b"{not json\n")
+        f.write((json.dumps({"op": "put", "child": new_child("b")}) + "\n").encode("utf-8"))
+
+    with pytest.raises(StorageError):
+        open_store()
+
+
+def test_compact_writes_snapshot_and_clears_log(open_store, new_child):
+    store = open_store()
+    store.put_many([new_child(str(number)) for number in range(5)])
+    store.delete("3")
+    store.compact()
+    assert not os.path.exists(store.log_file)
+    store.close()
+
+    store = open_store()
+    assert sorted(child["child_id"] for child in store.iter_children()) == ["0", "1", "2", "4"]
+    # الحذف محفوظ في اللقطة فلا يعيده سجل أقدم
+    assert store.current_version("3") == 2
+
+
+def test_legacy_records_get_the_same_ids_on_every_station(tmp_path):
+    """سجلات الملف القديم بدون معرف تأخذ نفس المعرفات مهما كانت المحطة التي تفتحه"""
+    legacy = [{"entry_name": "أحمد", "birth_date": "2024-01-01"}, {"entry_name": "أحمد", "birth_date": "2024-01-01"}]
+    ids = []
+    for station in ("pc1", "pc2"):
+        directory = tmp_path / station
+        directory.mkdir()
+        with open(directory / "children_data.json", "w", encoding="utf-8") as f:
+            json.dump(legacy, f, ensure_ascii=False)
+        store = RecordStore(str(directory / "children_data.json"), writer_id=station)
+        ids.append(sorted(child["child_id"] for child in store.iter_children()))
+        store.close()
+    assert ids[0] == ids[1]
+    assert len(set(ids[0])) == 2
+
+
+def test_changes_from_another_writer_are_visible(open_store, new_child):
+    first = open_store(writer_id="pc1")
+    second = open_store(writer_id="pc2")
+    first.put(new_child("a"))
+    assert second.get("a")["entry_name"] == "أحمد"
+    second.delete("a")
+    assert first.get("a") is None
+
+
+def test_concurrent_edits_of_different_fields_merge(open_store, new_child):
+    """تعديل حقلين مختلفين من محطتين على نفس الإصدار يُدمج"""
+    first = open_store(writer_id="pc1")
+    second = open_store(writer_id="pc2")
+    first.put(new_child("a"))
+    base = second.get("a")
+
+    first.save(dict(base, entry_phone="0920000000"), base)
+    merged = second.save(dict(base, entry_surname="المصراتي"), base)
+
+    assert merged["entry_phone"] == "0920000000"
+    assert merged["entry_surname"] == "المصراتي"
+    assert merged["version"] == base["version"] + 2
+    assert first.get("a") == merged
+
+
+def test_concurrent_edits_of_same_field_conflict(open_store, new_child):
+    first = open_store(writer_id="pc1")
+    second = open_store(writer_id="pc2")
+    first.put(new_child("a"))
+    base = second.get("a")
+
+    first.save(dict(base, entry_phone="0920000000"), base)
+    with pytest.raises(ConflictError) as error:
+        second.save(dict(base, entry_phone="0930000000"), base)
+    assert error.value.fields == ["entry_phone"]
+    assert error.value.current["entry_phone"] == "0920000000"
+    assert second.get("a")["entry_phone"] == "0920000000"
+
+
+def test_saving_child_deleted_by_another_writer_fails(open_store, new_child):
+    first = open_store(writer_id="pc1")
+    second = open_store(writer_id="pc2")
+    first.put(new_child("a"))
+    base = second.get("a")
+    first.delete("a")
+    with pytest.raises(StorageError):
+        second.save(dict(base, entry_phone="0930000000"), base)
+
+
+def test_merge_child_combines_vaccination_changes():
+    """الجرعات تُدمج كمجموعات: إضافات وحذف كل طرف"""
+    first = ["2024-01-02", "B.C.G - بي سي جي", "جرعة وحيدة", "", "مكتمل", "حديثي الولادة"]
+    second = ["2024-03-01", "O.P.V - شلل الأطفال الفموي", "الجرعة الأولى", "", "مكتمل", "عمر الشهرين"]
+    third = ["2024-03-01", "ROTA - الروتا", "الجرعة الأولى", "", "مكتمل", "عمر الشهرين"]
+    base = {"child_id": "a", "entry_name": "أحمد", "vaccinations": [first, second]}
+    mine = dict(base, vaccinations=[first, second, third])
+    theirs = dict(base, entry_name="أحمد محمد", vaccinations=[first])
+
+    merged = merge_child(base, mine, theirs)
+    assert merged["entry_name"] == "أحمد محمد"
+    assert merged["vaccinations"] == [first, third]
+
+
+def test_merge_child_same_value_is_not_a_conflict():
+    base = {"child_id": "a", "entry_phone": "1"}
+    merged = merge_child(base, dict(base, entry_phone="2"), dict(base, entry_phone="2"))
+    assert merged["entry_phone"] == "2"
+
+
+def test_sqlite_save_checks_versions(tmp_path, new_child):
+    """نفس قواعد الإصدار والدمج في مخزن SQLite بين اتصالين"""
+    first = SQLiteStore(str(tmp_path / "children.db"))
+    second = SQLiteStore(str(tmp_path / "children.db"))
+    try:
+        base = first.save(new_child("a"), None)
+        first.save(dict(base, entry_phone="0920000000"), base)
+        merged = second.save(dict(base, entry_surname="المصراتي"), base)
+        assert (merged["entry_phone"], merged["entry_surname"], merged["version"]) == ("0920000000", "المصراتي", 3)
+        with pytest.raises(ConflictError):
+            second.save(dict(base, entry_phone="0930000000"), base)
+        first.delete("a")
+        with pytest.raises(StorageError):
+            second.save(merged, merged)
+    finally:
+        first.close()
+        second.close()
@@ -0,0 +1,175 @@
+"""المزامنة بين مركزين بحزم الفروقات: إعادة تطبيق العمليات والتقارب لنفس الحالة"""
+import gzip
+import io
+import json
+
+import pytest
+
+from sync import SyncJournal, SyncedStore, comparable, diff_child, replay
+
+
+@pytest.fixture
+def sites(open_store, tmp_path):
+    """مركزان بمخزنين وسجلي مزامنة منفصلين"""
+    opened = []
+
+    def open_site(site):
+        store = open_store(f"{site}.json", writer_id=site)
+        journal = SyncJournal(str(tmp_path / f"{site}.db"), site)
+        opened.append(journal)
+        return SyncedStore(store, journal)
+
+    yield open_site("clinicA"), open_site("clinicB")
+    for journal in opened:
+        journal.close()
+
+
+def send(source, target, tmp_path):
+    """نقل حزمة فروقات من مركز لآخر عبر ملف"""
+    path = str(tmp_path / f"{source.journal.site}-{target.journal.site}.gz")
+    count, size = source.export_bundle(path, target.journal.site)
+    target.import_bundle(path)
+    return count
+
+
+def assert_converged(first, second):
+    ids = {child["child_id"] for child in first.iter_children()} | {child["child_id"] for child in second.iter_children()}
+    for child_id in ids:
+        assert comparable(first.get(child_id)) == comparable(second.get(child_id)), child_id
+
+
+def test_existing_registry_is_sent_once(sites, new_child, tmp_path):
+    first, second = sites
+    first.store.put_many([new_child(str(number)) for number in range(10)])
+    first.journal.initialize(first.store)
+    first.journal.initialize(first.store)
+
+    assert send(first, second, tmp_path) == 10
+    assert len(second) == 10
+    assert_converged(first, second)
+    # بعد تأكيد الاستلام لا يُعاد إرسال شيء
+    send(second, first, tmp_path)
+    assert send(first, second, tmp_path) == 0
+
+
+def test_concurrent_edits_converge(sites, new_child, tmp_path):
+    first, second = sites
+    first.put_many([new_child("a"), new_child("b"), new_child("c")])
+    send(first, second, tmp_path)
+    send(second, first, tmp_path)
+
+    child = first.get("a")
+    first.save(dict(child, entry_phone="0911111111"), child)
+    child = second.get("a")
+    second.save(dict(child, entry_phone="0922222222", entry_surname="X"), child)
+
+    dose = ["2024-03-01", "ROTA - الروتا", "الجرعة الأولى", "", "مكتمل", "عمر الشهرين"]
+    child = first.get("b")
+    first.save(dict(child, vaccinations=child["vaccinations"] + [dose]), child)
+    child = second.get("b")
+    second.save(dict(child, vaccinations=[]), child)
+
+    second.delete("c")
+    new_id = second.put({"entry_name": "جديد", "birth_date": "2024-05-01"})
+
+    send(first, second, tmp_path)
+    send(second, first, tmp_path)
+
+    assert_converged(first, second)
+    assert first.get("a")["entry_surname"] == "X"
+    assert first.get("a")["entry_phone"] == second.get("a")["entry_phone"]
+    # حذف جرعة في مركز وإضافة أخرى في الآخر: تبقى الجرعة المضافة فقط
+    assert first.get("b")["vaccinations"] == [dose]
+    assert first.get("c") is None
+    assert first.get(new_id)["entry_name"] == "جديد"
+
+
+def test_bundle_import_is_idempotent(sites, new_child, tmp_path):
+    first, second = sites
+    first.put(new_child("a"))
+    path = str(tmp_path / "bundle.gz")
+    first.export_bundle(path, "clinicB")
+    assert second.import_bundle(path)[0] == 1
+    assert second.import_bundle(path) == (0, [])
+    assert len(second) == 1
+
+
+def test_exchange_converges_both_ways(sites, new_child):
+    first, second = sites
+    first.put(new_child("a"))
+    second.put(new_child("b", "سالم"))
+    first.exchange(second)
+    assert_converged(first, second)
+    assert len(first) == len(second) == 2
+
+
+def test_replay_orders_operations():
+    """آخر عملية في الترتيب تغلب، والحذف ثم التعديل يعيد الطفل"""
+    changes = [
+        ("put", "", '{"entry_name": "أحمد", "vaccinations": []}'),
+        ("set", "entry_name", '"سالم"'),
+        ("delete", "", ""),
+    ]
+    assert replay("a", changes) is None
+    child = replay("a", changes + [("set", "entry_phone", '"1"')])
+    assert child == {"child_id": "a", "entry_name": "سالم", "entry_phone": "1", "vaccinations": []}
+
+
+def test_null_field_is_kept_and_removed_field_is_dropped(sites, new_child, tmp_path):
+    first, second = sites
+    first.put(new_child("a", entry_passport="AB12", entry_national_id="1"))
+    send(first, second, tmp_path)
+    child = first.get("a")
+    edited = dict(child, entry_passport=None)
+    del edited["entry_national_id"]
+    assert ("set", "entry_passport", "null") in diff_child(child, edited)
+    assert ("unset", "entry_national_id", "") in diff_child(child, edited)
+    first.save(edited, child)
+    send(first, second, tmp_path)
+    child = second.get("a")
+    assert "entry_passport" in child and child["entry_passport"] is None
+    assert "entry_national_id" not in child
+
+
+def test_legacy_bundle_null_means_removal(sites, new_child):
+    first, second = sites
+    second.put(new_child("a", entry_passport="AB12"))
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb") as out:
+        rows = [{"format": 1, "site": "old", "vector": {"old": 1}},
+                ["old", 1, 99, "a", "set", "entry_passport", "null"]]
+        out.write("".join(json.dumps(row) + "\n" for row in rows).encode('utf-8'))
+    buffer.seek(0)
+    assert second.journal.read_bundle(buffer, second.store)[0] == 1
+    assert "entry_passport" not in second.get("a")
+
+
+def test_large_bundle_is_applied_in_batches(sites, new_child, tmp_path, monkeypatch):
+    first, second = sites
+    monkeypatch.setattr("sync.APPLY_BATCH_SIZE", 3)
+    first.put_many([new_child(str(number)) for number in range(10)])
+    assert send(first, second, tmp_path) == 10
+    assert_converged(first, second)
+    assert int(second.journal.meta("clock")) >= int(first.journal.meta("clock"))
+
+
+def test_journal_mode_for_shared_folders(tmp_path):
+    journal = SyncJournal(str(tmp_path / "shared.db"), "clinicA", journal_mode="DELETE")
+    try:
+        assert journal.conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    finally:
+        journal.close()
+
+
+def test_old_journal_null_sets_become_unset(tmp_path):
+    path = str(tmp_path / "old.db")
+    journal = SyncJournal(path, "clinicA")
+    with journal.conn:
+        journal.conn.execute("DELETE FROM meta WHERE key = 'format'")
+        journal.conn.execute("INSERT INTO changes VALUES ('clinicA', 1, 1, 'a', 'set', 'x', 'null')")
+    journal.close()
+    journal = SyncJournal(path, "clinicA")
+    try:
+        assert journal.conn.execute("SELECT op, value FROM changes").fetchall() == [("unset", "")]
+    finally:
+        journal.close()
@@ -0,0 +1,79 @@
+"""تصدير واستيراد JSON Lines"""
+import json
+
+import pytest
+
+from transfer import export_jsonl, import_jsonl
+
+
+def write_lines(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+def test_import_skips_invalid_and_duplicate_lines(open_store, new_child, tmp_path):
+    store = open_store()
+    store.put(new_child("existing", entry_national_id="111111111111"))
+    path = str(tmp_path / "children.jsonl")
+    write_lines(path, [
+        json.dumps(new_child("a", entry_passport="ab123"), ensure_ascii=False),
+        "{not json",
+        "[1, 2]",
+        "",
+        json.dumps(new_child("b", birth_date="2024-02-30"), ensure_ascii=False),
+        json.dumps(new_child("c", entry_national_id="111111111111"), ensure_ascii=False),
+        json.dumps(new_child("existing"), ensure_ascii=False),
+        json.dumps(new_child("d", entry_national_id="222222222222"), ensure_ascii=False),
+        json.dumps(new_child("e", entry_national_id="222222222222"), ensure_ascii=False),
+        json.dumps(new_child("f", entry_name=None), ensure_ascii=False),
+    ])
+
+    report = import_jsonl(store, path, batch_size=2)
+
+    assert report.imported == 2
+    assert report.duplicates == 3
+    assert report.invalid == 4
+    assert [line for line, message in report.errors] == [2, 3, 5, 10]
+    assert report.errors[3][1] == "اسم الطفل مفقود"
+    assert store.get("a")["entry_passport"] == "AB123"
+    assert store.get("d") is not None
+    assert store.get("e") is None
+    assert len(store) == 3
+
+
+def test_bad_encoding_and_repeated_ids_do_not_abort_or_double_count(open_store, new_child, tmp_path):
+    """سطر بترميز تالف يُسجل كخطأ وتُحفظ بقية الدفعة، والمعرف المكرر في نفس الملف يُحتسب مكرراً"""
+    store = open_store()
+    path = str(tmp_path / "children.jsonl")
+    with open(path, "wb") as f:
+        f.write((json.dumps(new_child("a"), ensure_ascii=False) + "\n").encode("utf-8"))
+        f.write(b'{"entry_name": "\xff\xfe"}\n')
+        f.write((json.dumps(new_child("a", "سالم"), ensure_ascii=False) + "\n").encode("utf-8"))
+        f.write((json.dumps(new_child("b"), ensure_ascii=False) + "\n").encode("utf-8"))
+
+    report = import_jsonl(store, path)
+
+    assert (report.imported, report.duplicates, report.invalid) == (2, 1, 1)
+    assert report.errors[0][0] == 2
+    assert len(store) == report.imported
+    assert store.get("a")["entry_name"] == "أحمد"
+
+
+@pytest.mark.parametrize("name", ["children.jsonl", "children.jsonl.gz"])
+def test_export_import_round_trip(open_store, new_child, tmp_path, name):
+    source = open_store("source.json")
+    source.put_many([new_child(str(number), entry_national_id=f"{number:012d}") for number in range(1, 6)])
+    path = str(tmp_path / name)
+    assert export_jsonl(source, path) == 5
+
+    target = open_store("target.json")
+    report = import_jsonl(target, path)
+    assert (report.imported, report.duplicates, report.invalid) == (5, 0, 0)
+    for child in source.iter_children():
+        imported = target.get(child["child_id"])
+        assert {key: value for key, value in imported.items() if key != "version"} == \
+            {key: value for key, value in child.items() if key != "version"}
+
+    # استيراد نفس الملف مرة ثانية لا يكرر الأطفال
+    assert import_jsonl(target, path).duplicates == 5
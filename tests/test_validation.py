@@ -0,0 +1,68 @@
+"""قواعد التحقق المشتركة والتحقق المؤجل أثناء الكتابة"""
+from form_validator import FormValidator
+from validation import validate_child, validate_field
+
+
+class FakeWidget:
+    """بديل after/after_cancel: الدوال المؤجلة لا تُنفذ إلا يدوياً"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.next_id = 0
+
+    def after(self, ms, callback):
+        self.next_id += 1
+        self.jobs[self.next_id] = callback
+        return self.next_id
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run(self):
+        jobs, self.jobs = self.jobs, {}
+        for callback in jobs.values():
+            callback()
+
+
+def test_field_rules():
+    assert validate_field("entry_name", " ") == "اسم الطفل مفقود"
+    assert validate_field("birth_date", "2024-02-30") == "تاريخ الميلاد غير صحيح"
+    assert validate_field("birth_date", "2024-02-29") is None
+    assert validate_field("entry_national_id", "") is None
+    assert validate_field("entry_national_id", "12345") == "الرقم الوطني غير صحيح"
+    assert validate_field("entry_passport", "ab1") == "جواز السفر غير صحيح"
+    assert validate_field("entry_phone", "09x") == "رقم الهاتف غير صحيح"
+    assert validate_field("entry_surname", "أي شيء") is None
+
+
+def test_validate_child_treats_null_as_empty(new_child):
+    assert validate_child(new_child("a")) == []
+    assert validate_child(new_child("a", entry_phone=None, entry_passport=None)) == []
+    errors = validate_child(new_child("a", entry_name=None, birth_date="x"))
+    assert errors == ["اسم الطفل مفقود", "تاريخ الميلاد غير صحيح: x"]
+
+
+def test_form_validator_debounces_and_skips_unchanged_values():
+    widget = FakeWidget()
+    values = {"entry_phone": "09", "entry_name": "أحمد"}
+    results = []
+    validator = FormValidator(widget, {field: (lambda f=field: values[f]) for field in values},
+                              lambda field, value, message: results.append((field, value, message)))
+    validator.changed("entry_phone")
+    values["entry_phone"] = "09x"
+    validator.changed("entry_phone")
+    assert len(widget.jobs) == 1 and results == []
+    widget.run()
+    assert results == [("entry_phone", "09x", "رقم الهاتف غير صحيح")]
+    assert validator.errors == {"entry_phone": "رقم الهاتف غير صحيح"}
+
+    validator.changed("entry_phone")
+    widget.run()
+    assert len(results) == 1
+
+    values["entry_phone"] = "091"
+    validator.changed("entry_phone")
+    assert validator.flush() == {}
+    assert widget.jobs == {}
+    assert results[-1] == ("entry_phone", "091", None)
+    assert validator.revalidate() == {} and len(results) == 4
@@ -0,0 +1,43 @@
+"""مصادر صفوف الجدول الافتراضي وترتيب صفحات المخزن (بدون واجهة رسومية)"""
+from virtual_table import ListSource, RegistrySource
+
+
+def test_list_source_sorts_display_order_only():
+    source = ListSource([["ب", 2], ["أ", 1], ["ج", 3]])
+    source.sort(0, descending=False)
+    assert source.fetch(0, 2) == [(1, ["أ", 1]), (0, ["ب", 2])]
+    # المفتاح هو الموقع الأصلي فيبقى صالحاً بعد الترتيب
+    assert source.row_for(2) == (2, ["ج", 3])
+    source.append(["آ", 0])
+    assert [key for key, row in source.fetch(0, 10)] == [3, 1, 0, 2]
+    source.remove([1])
+    assert [row[0] for key, row in source.fetch(0, 10)] == ["آ", "ب", "ج"]
+
+
+def test_registry_source_pages_by_child_id(any_store, new_child):
+    any_store.put_many([new_child(str(number), name) for number, name in enumerate(["د", "ب", "أ"])])
+    source = RegistrySource(any_store, ["entry_name", "birth_date"], "entry_name")
+    assert source.count() == 3
+    assert source.fetch(0, 2) == [("2", ["أ", "2024-01-01"]), ("1", ["ب", "2024-01-01"])]
+    source.sort(0, descending=True)
+    assert [key for key, row in source.fetch(0, 10)] == ["0", "1", "2"]
+    assert source.row_for("1")[1]["entry_name"] == "ب"
+    assert source.row_for("missing") == ("missing", None)
+
+
+def test_page_order_follows_writes(any_store, new_child):
+    """ترتيب الصفحات يبقى صحيحاً بعد الإضافة والتعديل والحذف"""
+    any_store.put_many([new_child(str(number), name) for number, name in enumerate(["د", "ب", "أ", "ج"])])
+    assert [child["entry_name"] for child in any_store.page(0, 10)] == ["أ", "ب", "ج", "د"]
+
+    any_store.put(dict(any_store.get("1"), entry_name="هـ"))
+    any_store.delete("2")
+    any_store.put(new_child("9", "آ"))
+
+    def names(offset, limit, descending=False):
+        return [child["entry_name"] for child in any_store.page(offset, limit, descending=descending)]
+
+    assert names(0, 10) == ["آ", "ج", "د", "هـ"]
+    assert names(1, 2) == ["ج", "د"]
+    assert names(0, 3, descending=True) == ["هـ", "د", "ج"]
+    assert names(3, 3, descending=True) == ["آ"]
@@ -0,0 +1,113 @@
+"""تصدير واستيراد السجل بصيغة JSON Lines (طفل في كل سطر) مع دعم gzip"""
+import gzip
+import json
+import os
+
+from validation import validate_child
+
+
+def export_jsonl(store, path, progress=None, progress_every=10000):
+    """كتابة جميع الأطفال سطراً سطراً وإرجاع عددهم"""
+    count = 0
+    tmp_path = path + ".tmp"
+    # الضغط يتحدد بامتداد الملف النهائي لا المؤقت
+    if path.endswith(".gz"):
+        output = gzip.open(tmp_path, "wt", encoding="utf-8")
+    else:
+        output = open(tmp_path, "w", encoding="utf-8")
+    with output as f:
+        for child in store.iter_children():
+            f.write(json.dumps(child, ensure_ascii=False, separators=(",", ":")))
+            f.write("\n")
+            count += 1
+            if progress and count % progress_every == 0:
+                progress(count, None)
+    # لا يظهر ملف التصدير إلا كاملاً
+    os.replace(tmp_path, path)
+    if progress:
+        progress(count, None)
+    return count
+
+
+class ImportReport:
+    """ملخص عملية الاستيراد"""
+
+    def __init__(self, max_errors=100):
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, line_number, message):
+        self.invalid += 1
+        # نحتفظ بأول الأخطاء فقط حتى لا تكبر الذاكرة مع حجم الملف
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line_number, message))
+
+
+def import_jsonl(store, path, batch_size=1000, progress=None, progress_every=10000):
+    """قراءة ملف JSON Lines والتحقق من كل طفل ثم حفظه على دفعات"""
+    report = ImportReport()
+    total_bytes = os.path.getsize(path)
+    batch = []
+    # الأرقام الوطنية ومعرفات الأطفال في الدفعة الحالية (لم تُحفظ بعد)
+    batch_ids = set()
+    batch_child_ids = set()
+
+    def flush():
+        if batch:
+            store.put_many(batch)
+            report.imported += len(batch)
+            batch.clear()
+            batch_ids.clear()
+            batch_child_ids.clear()
+
+    with open(path, "rb") as raw:
+        stream = gzip.GzipFile(fileobj=raw) if path.endswith(".gz") else raw
+        # القراءة بالبايتات وفك ترميز كل سطر على حدة: سطر بترميز تالف لا يوقف الاستيراد
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                child = json.loads(line.decode("utf-8"))
+            except UnicodeDecodeError:
+                report.add_error(line_number, "السطر ليس نصاً بترميز UTF-8")
+                continue
+            except ValueError as e:
+                report.add_error(line_number, f"سطر JSON غير صالح: {e}")
+                continue
+            if not isinstance(child, dict):
+                report.add_error(line_number, "السطر ليس سجل طفل (كائن JSON)")
+                continue
+
+            if isinstance(child.get("entry_passport"), str):
+                child["entry_passport"] = child["entry_passport"].upper()
+            errors = validate_child(child)
+            if errors:
+                report.add_error(line_number, "، ".join(errors))
+                continue
+
+            national_id = child.get("entry_national_id")
+            if national_id and (national_id in batch_ids or store.find("entry_national_id", national_id)):
+                report.duplicates += 1
+                continue
+            child_id = child.get("child_id")
+            if child_id and (child_id in batch_child_ids or store.get(child_id) is not None):
+                report.duplicates += 1
+                continue
+
+            batch.append(child)
+            if national_id:
+                batch_ids.add(national_id)
+            if child_id:
+                batch_child_ids.add(child_id)
+            if len(batch) >= batch_size:
+                flush()
+            if progress and line_number % progress_every == 0:
+                # موضع القراءة في الملف الأصلي (المضغوط إن وجد)
+                progress(line_number, raw.tell() / total_bytes if total_bytes else 1.0)
+    flush()
+    if progress:
+        progress(report.imported + report.duplicates + report.invalid, 1.0)
+    return report
@@ -0,0 +1,65 @@
+"""قواعد التحقق من بيانات الطفل بدون واجهة رسومية"""
+import re
+from datetime import datetime
+
+PASSPORT_PATTERN = re.compile("^[A-Z0-9]*$")
+
+
+def is_valid_date(day, month, year):
+    """التحقق من صحة التاريخ"""
+    try:
+        datetime(int(year), int(month), int(day))
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def is_valid_national_id(text):
+    """الرقم الوطني 12 رقماً"""
+    return text.isdigit() and len(text) == 12
+
+
+def is_valid_passport(text):
+    """جواز السفر أحرف إنجليزية كبيرة وأرقام فقط"""
+    return bool(PASSPORT_PATTERN.match(text))
+
+
+def is_valid_phone(text):
+    """رقم الهاتف أرقام فقط"""
+    return text == "" or text.isdigit()
+
+
+def is_valid_birth_date(text):
+    """تاريخ الميلاد بصيغة YYYY-MM-DD"""
+    parts = text.split("-")
+    return len(parts) == 3 and is_valid_date(parts[2], parts[1], parts[0])
+
+
+# الحقل ← قائمة (دالة التحقق، رسالة الخطأ) بالترتيب؛ نفس القواعد للنموذج والاستيراد
+FIELD_RULES = {
+    "entry_name": [(lambda text: bool(text.strip()), "اسم الطفل مفقود")],
+    "birth_date": [(is_valid_birth_date, "تاريخ الميلاد غير صحيح")],
+    "entry_national_id": [(lambda text: not text or is_valid_national_id(text), "الرقم الوطني غير صحيح")],
+    "entry_passport": [(lambda text: not text or is_valid_passport(text), "جواز السفر غير صحيح")],
+    "entry_phone": [(is_valid_phone, "رقم الهاتف غير صحيح")],
+}
+
+
+def validate_field(field, value):
+    """رسالة أول قاعدة لا يحققها الحقل، أو None إن كان صالحاً"""
+    text = str(value if value is not None else "")
+    for check, message in FIELD_RULES.get(field, ()):
+        if not check(text):
+            return message
+    return None
+
+
+def validate_child(child):
+    """قائمة أخطاء سجل طفل كامل (فارغة إن كان صالحاً)"""
+    errors = []
+    for field in FIELD_RULES:
+        value = str(child.get(field) or "")
+        message = validate_field(field, value)
+        if message:
+            errors.append(f"{message}: {value}" if value else message)
+    return errors
@@ -0,0 +1,251 @@
+"""جدول افتراضي: Treeview يعرض الصفوف الظاهرة فقط ويجلبها صفحةً صفحة من المصدر"""
+import tkinter as tk
+from tkinter import ttk
+
+
+class ListSource:
+    """مصدر صفوف من قائمة في الذاكرة مع ترتيب عرض منفصل عن ترتيب الحفظ"""
+
+    def __init__(self, rows=None):
+        self.set_rows(rows or [])
+
+    def set_rows(self, rows):
+        self.rows = [list(row) for row in rows]
+        self.order = list(range(len(self.rows)))
+        self.sort_column = None
+        self.descending = False
+
+    def count(self):
+        return len(self.rows)
+
+    def fetch(self, offset, limit):
+        """أزواج (الموقع الأصلي في القائمة، الصف) للعرض من offset بعدد limit"""
+        return [(i, self.rows[i]) for i in self.order[offset:offset + limit]]
+
+    def row_for(self, key):
+        """الصف بموقعه الأصلي في القائمة"""
+        return key, self.rows[key]
+
+    def sort(self, column, descending):
+        """إعادة ترتيب العرض فقط دون تغيير ترتيب الحفظ"""
+        self.sort_column = column
+        self.descending = descending
+        self.order.sort(key=lambda i: str(self.rows[i][column]), reverse=descending)
+
+    def append(self, row):
+        self.rows.append(list(row))
+        self.order.append(len(self.rows) - 1)
+        if self.sort_column is not None:
+            self.sort(self.sort_column, self.descending)
+
+    def remove(self, indexes):
+        """حذف صفوف حسب موقعها الأصلي"""
+        removed = set(indexes)
+        self.rows = [row for i, row in enumerate(self.rows) if i not in removed]
+        self.order = list(range(len(self.rows)))
+        if self.sort_column is not None:
+            self.sort(self.sort_column, self.descending)
+
+
+class RegistrySource:
+    """مصدر صفوف من مخزن السجل (RecordStore أو SQLiteStore) عبر store.page"""
+
+    def __init__(self, store, fields, order_by):
+        self.store = store
+        self.fields = fields
+        self.order_by = order_by
+        self.descending = False
+
+    def count(self):
+        return len(self.store)
+
+    def fetch(self, offset, limit):
+        children = self.store.page(offset, limit, self.order_by, self.descending)
+        return [(child["child_id"], [child.get(field, "") for field in self.fields]) for child in children]
+
+    def row_for(self, key):
+        return key, self.store.get(key)
+
+    def sort(self, column, descending):
+        self.order_by = self.fields[column]
+        self.descending = descending
+
+
+class VirtualTreeview(tk.Frame):
+    """Treeview بعدد ثابت من العناصر تُملأ من المصدر حسب موضع شريط التمرير
+
+    الاختيار محفوظ بمفاتيح المصدر (fetch يعيد أزواج المفتاح والصف) لا بالعناصر،
+    فيبقى بعد التمرير والترتيب، وأسهم لوحة المفاتيح عند حافة العرض تمرر الجدول.
+    """
+
+    def __init__(self, parent, columns, source, height=8, page_size=200, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.columns = columns
+        self.source = source
+        self.height = height
+        self.page_size = page_size
+        self.top = 0
+        self.pages = {}
+        self.sort_state = {}
+        # مفاتيح الصفوف المختارة بترتيب اختيارها، ومفتاح صف المؤشر
+        self.selected_keys = {}
+        self.focus_key = None
+
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", height=height,
+                                 selectmode="extended")
+        for index, col in enumerate(columns):
+            self.tree.heading(col, text=col, command=lambda i=index: self.sort_by(i))
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        # عناصر ثابتة يُعاد استخدامها بدلاً من إدراج صف لكل سجل
+        self.items = [self.tree.insert("", "end", values=()) for _ in range(height)]
+        # موضع العرض ومفتاح المصدر المقابلان لكل عنصر ظاهر
+        self.item_positions = {}
+        self.item_keys = {}
+
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+        self.tree.bind("<Next>", lambda event: self.scroll(self.height))
+        self.tree.bind("<Prior>", lambda event: self.scroll(-self.height))
+        self.tree.bind("<Up>", lambda event: self.move_cursor(-1, False))
+        self.tree.bind("<Down>", lambda event: self.move_cursor(1, False))
+        self.tree.bind("<Shift-Up>", lambda event: self.move_cursor(-1, True))
+        self.tree.bind("<Shift-Down>", lambda event: self.move_cursor(1, True))
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.refresh()
+
+    def column(self, col, **kwargs):
+        self.tree.column(col, **kwargs)
+
+    def bind_rows(self, sequence, callback):
+        self.tree.bind(sequence, callback)
+
+    # ---------------- الجلب والعرض ----------------
+
+    def row(self, position):
+        """(المفتاح، الصف) من ذاكرة الصفحات أو من المصدر"""
+        page_number = position // self.page_size
+        page = self.pages.get(page_number)
+        if page is None:
+            if len(self.pages) > 8:
+                # الإبقاء على عدد محدود من الصفحات في الذاكرة
+                self.pages.pop(next(iter(self.pages)))
+            page = self.source.fetch(page_number * self.page_size, self.page_size)
+            self.pages[page_number] = page
+        index = position - page_number * self.page_size
+        return page[index] if index < len(page) else None
+
+    def refresh(self, keep_position=True, keep_selection=False):
+        """إعادة جلب الصفوف بعد تغيير المصدر (تغير البيانات يلغي الاختيار إلا إن بقيت المفاتيح صالحة)"""
+        self.pages = {}
+        if not keep_position:
+            self.top = 0
+        if not keep_selection:
+            self.selected_keys = {}
+            self.focus_key = None
+        self.render()
+
+    def render(self):
+        total = self.source.count()
+        self.top = max(0, min(self.top, total - self.height))
+        self.item_positions = {}
+        self.item_keys = {}
+        selection = []
+        focus = None
+        for offset, item in enumerate(self.items):
+            position = self.top + offset
+            entry = self.row(position) if position < total else None
+            if entry is None:
+                self.tree.detach(item)
+                continue
+            key, values = entry
+            self.tree.reattach(item, "", offset)
+            self.tree.item(item, values=[str(value) for value in values])
+            self.item_positions[item] = position
+            self.item_keys[item] = key
+            if key in self.selected_keys:
+                selection.append(item)
+            if key == self.focus_key:
+                focus = item
+        # العناصر نفسها تعرض صفوفاً أخرى بعد التمرير: الاختيار يُعاد من المفاتيح
+        self.tree.selection_set(selection)
+        if focus:
+            self.tree.focus(focus)
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.height) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    # ---------------- التمرير ----------------
+
+    def yview(self, *args):
+        """أوامر شريط التمرير: moveto أو scroll"""
+        total = self.source.count()
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = self.height if args[2] == "pages" else 1
+            self.top += int(args[1]) * step
+        self.render()
+
+    def scroll(self, rows):
+        self.top += rows
+        self.render()
+
+    def on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def move_cursor(self, delta, extend):
+        """السهم عند أول أو آخر صف ظاهر يمرر الجدول وينقل المؤشر للصف التالي من المصدر"""
+        position = self.item_positions.get(self.tree.focus())
+        if position is None:
+            return None
+        target = position + delta
+        if self.top <= target < self.top + self.height:
+            # داخل العرض: سلوك Treeview المعتاد
+            return None
+        if not 0 <= target < self.source.count():
+            return "break"
+        self.top += delta
+        self.render()
+        item = next(item for item, item_position in self.item_positions.items() if item_position == target)
+        key = self.item_keys[item]
+        if not extend:
+            self.selected_keys = {}
+        self.selected_keys[key] = True
+        self.focus_key = key
+        self.tree.selection_set(self.selected_items())
+        self.tree.focus(item)
+        return "break"
+
+    def selected_items(self):
+        return [item for item, key in self.item_keys.items() if key in self.selected_keys]
+
+    def on_select(self, event=None):
+        """مزامنة المفاتيح المختارة مع اختيار العناصر الظاهرة (الصفوف المخفية تبقى كما هي)"""
+        visible = set(self.item_keys.values())
+        chosen = [self.item_keys[item] for item in self.tree.selection() if item in self.item_keys]
+        self.selected_keys = {key: True for key in self.selected_keys if key not in visible}
+        self.selected_keys.update((key, True) for key in chosen)
+        self.focus_key = self.item_keys.get(self.tree.focus(), self.focus_key)
+
+    # ---------------- الترتيب والاختيار ----------------
+
+    def sort_by(self, column):
+        """ترتيب حسب العمود عند الضغط على العنوان (الضغط مرة أخرى يعكس الترتيب)"""
+        descending = not self.sort_state.get(column, True)
+        self.sort_state = {column: descending}
+        self.source.sort(column, descending)
+        for index, col in enumerate(self.columns):
+            arrow = (" ▼" if descending else " ▲") if index == column else ""
+            self.tree.heading(col, text=col + arrow)
+        # مفاتيح المصدر لا تتغير بالترتيب فيبقى الاختيار
+        self.refresh(keep_position=False, keep_selection=True)
+
+    def selected_rows(self):
+        """الصفوف المختارة كأزواج (المعرف في المصدر، الصف) بما فيها المخفية بالتمرير"""
+        rows = [self.source.row_for(key) for key in self.selected_keys]
+        return [(key, row) for key, row in rows if row is not None]